@@ -0,0 +1,254 @@
+# api/idempotencia.py
+# Cabecera Idempotency-Key para los endpoints de la API. El sistema de
+# facturación reintenta las peticiones que le vencen; con la misma clave,
+# el reintento recibe la respuesta de la primera petición (o la espera si
+# aún está en curso) en lugar de volver a operar sobre los equipos.
+
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import ClaveIdempotencia
+
+CABECERA = 'HTTP_IDEMPOTENCY_KEY'
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+# Cabeceras que se guardan para repetir la respuesta igual (p. ej. el Location de un 202).
+CABECERAS_GUARDADAS = ('Content-Type', 'Location', 'Retry-After')
+
+_ultima_purga = 0
+
+
+def _huella(request):
+    # Misma clave con otra petición es un error del cliente, no un reintento.
+    huella = hashlib.sha256()
+    for parte in (request.method.encode(), request.get_full_path().encode(), request.body):
+        huella.update(parte)
+        huella.update(b'\0')
+    return huella.hexdigest()
+
+
+def purgar():
+    """
+    Borra las claves vencidas. Devuelve cuántas se borraron.
+    """
+    borradas, _ = ClaveIdempotencia.objects.filter(expira__lte=timezone.now()).delete()
+    return borradas
+
+
+def _purgar_si_toca():
+    # Como mucho una purga por hora y proceso, aprovechando las peticiones.
+    global _ultima_purga
+    if time.monotonic() - _ultima_purga >= 3600:
+        _ultima_purga = time.monotonic()
+        purgar()
+
+
+def _reservar(clave, huella):
+    """
+    Reserva la clave para esta petición. Devuelve (registro, True) si la
+    reservó, o (registro existente, False); el registro puede ser None si
+    otra petición la liberó entre medias.
+    """
+    ahora = timezone.now()
+    registro = ClaveIdempotencia.objects.filter(clave=clave).first()
+    if registro is not None and registro.expira > ahora:
+        return registro, False
+    if registro is not None:
+        # Vencida, o reservada por una petición que nunca terminó (proceso caído).
+        ClaveIdempotencia.objects.filter(pk=registro.pk, expira__lte=ahora).delete()
+    _purgar_si_toca()
+    try:
+        with transaction.atomic():
+            registro = ClaveIdempotencia.objects.create(
+                clave=clave,
+                huella=huella,
+                expira=ahora + timedelta(seconds=getattr(settings, 'IDEMPOTENCIA_EN_CURSO_MAX', 600)),
+            )
+        return registro, True
+    except IntegrityError:
+        return ClaveIdempotencia.objects.filter(clave=clave).first(), False
+
+
+def _guardar(registro, respuesta):
+    # Los 5xx no se guardan: la operación no se hizo (o se revirtió) y el
+    # reintento debe volver a intentarla.
+    if respuesta.status_code >= 500:
+        ClaveIdempotencia.objects.filter(pk=registro.pk).delete()
+        return
+    if respuesta.streaming:
+        _guardar_al_terminar(registro, respuesta)
+        return
+    _completar(registro, respuesta, respuesta.content)
+
+
+def _completar(registro, respuesta, contenido):
+    ClaveIdempotencia.objects.filter(pk=registro.pk).update(
+        estado=ClaveIdempotencia.COMPLETADA,
+        status=respuesta.status_code,
+        contenido=contenido.decode(respuesta.charset, errors='replace'),
+        cabeceras={nombre: respuesta[nombre] for nombre in CABECERAS_GUARDADAS if respuesta.has_header(nombre)},
+        expira=timezone.now() + timedelta(seconds=getattr(settings, 'IDEMPOTENCIA_TTL', 86400)),
+    )
+
+
+def _guardar_al_terminar(registro, respuesta):
+    """
+    En una respuesta en streaming (p. ej. el NDJSON de crear_lote) la clave
+    sigue en curso mientras se envía, así un reintento espera en lugar de
+    repetir el lote; al terminar se guarda el contenido completo para
+    repetirlo. Si el envío se corta a medias se libera la clave.
+    """
+    partes = []
+    contenido = respuesta.streaming_content
+
+    def terminar(completo):
+        if completo:
+            _completar(registro, respuesta, b''.join(partes))
+        else:
+            _liberar(registro)
+
+    if respuesta.is_async:
+        async def envolver():
+            completo = False
+            try:
+                async for parte in contenido:
+                    partes.append(parte)
+                    yield parte
+                completo = True
+            finally:
+                await sync_to_async(terminar)(completo)
+    else:
+        def envolver():
+            completo = False
+            try:
+                for parte in contenido:
+                    partes.append(parte)
+                    yield parte
+                completo = True
+            finally:
+                terminar(completo)
+
+    respuesta.streaming_content = envolver()
+
+
+def _liberar(registro):
+    ClaveIdempotencia.objects.filter(pk=registro.pk).delete()
+
+
+def _repetir(registro):
+    respuesta = HttpResponse(registro.contenido, status=registro.status)
+    for nombre, valor in registro.cabeceras.items():
+        respuesta[nombre] = valor
+    respuesta['Idempotent-Replayed'] = 'true'
+    return respuesta
+
+
+def _respuesta_existente(registro, huella, vencido):
+    """
+    Respuesta para una clave que ya tiene otra petición: la guardada, 422 si
+    el cuerpo no coincide, 409 si la original sigue en curso tras esperarla,
+    o None si hay que seguir esperando.
+    """
+    if registro.huella != huella:
+        return JsonResponse({
+            'success': False,
+            'message': 'La clave de idempotencia ya se usó con otra petición.',
+        }, status=422)
+    if registro.estado == ClaveIdempotencia.COMPLETADA:
+        logging.info(f'Idempotency-Key {registro.clave}: se repite la respuesta guardada.')
+        return _repetir(registro)
+    if vencido:
+        response = JsonResponse({
+            'success': False,
+            'message': 'Una petición con la misma clave de idempotencia sigue en curso.',
+        }, status=409)
+        response['Retry-After'] = '5'
+        return response
+    return None
+
+
+def _clave(request):
+    if request.method in METODOS_SEGUROS:
+        return None
+    return request.META.get(CABECERA, '').strip() or None
+
+
+def _clave_invalida():
+    return JsonResponse({'success': False, 'message': 'La clave de idempotencia es demasiado larga.'}, status=400)
+
+
+def idempotente(vista):
+    """
+    Decorador para los endpoints de la API que admiten Idempotency-Key. Una
+    petición con una clave ya usada y el mismo cuerpo recibe la respuesta
+    guardada; si la original sigue en curso, espera a que termine (hasta
+    IDEMPOTENCIA_ESPERA segundos). Sin la cabecera, o en GET, no cambia
+    nada. Sirve para vistas síncronas y asíncronas.
+    """
+    if asyncio.iscoroutinefunction(vista):
+        @wraps(vista)
+        async def envoltorio_async(request, *args, **kwargs):
+            clave = _clave(request)
+            if clave is None:
+                return await vista(request, *args, **kwargs)
+            if len(clave) > 255:
+                return _clave_invalida()
+            huella = _huella(request)
+            limite = time.monotonic() + getattr(settings, 'IDEMPOTENCIA_ESPERA', 30)
+            pausa = 0.05
+            while True:
+                registro, reservada = await sync_to_async(_reservar)(clave, huella)
+                if reservada:
+                    break
+                if registro is not None:
+                    respuesta = _respuesta_existente(registro, huella, time.monotonic() >= limite)
+                    if respuesta is not None:
+                        return respuesta
+                await asyncio.sleep(pausa)
+                pausa = min(pausa * 2, 0.5)
+            try:
+                respuesta = await vista(request, *args, **kwargs)
+            except BaseException:
+                await sync_to_async(_liberar)(registro)
+                raise
+            await sync_to_async(_guardar)(registro, respuesta)
+            return respuesta
+        return envoltorio_async
+
+    @wraps(vista)
+    def envoltorio(request, *args, **kwargs):
+        clave = _clave(request)
+        if clave is None:
+            return vista(request, *args, **kwargs)
+        if len(clave) > 255:
+            return _clave_invalida()
+        huella = _huella(request)
+        limite = time.monotonic() + getattr(settings, 'IDEMPOTENCIA_ESPERA', 30)
+        pausa = 0.05
+        while True:
+            registro, reservada = _reservar(clave, huella)
+            if reservada:
+                break
+            if registro is not None:
+                respuesta = _respuesta_existente(registro, huella, time.monotonic() >= limite)
+                if respuesta is not None:
+                    return respuesta
+            time.sleep(pausa)
+            pausa = min(pausa * 2, 0.5)
+        try:
+            respuesta = vista(request, *args, **kwargs)
+        except BaseException:
+            _liberar(registro)
+            raise
+        _guardar(registro, respuesta)
+        return respuesta
+    return envoltorio
@@ -0,0 +1,184 @@
+# api/lotes.py
+
+import csv
+import io
+import json
+import logging
+import queue
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from librouteros.exceptions import TrapError
+
+from clientes.models import Dispositivo
+from gestion_red.connect import connect_mikrotik, connect_olt, execute_olt_script
+from gestion_red.operaciones import INTERFAZ_PON_POR_DEFECTO
+from gestion_red.pool import LOTE, con_prioridad
+from gestion_red.secrets_ppp import iniciar_espejo
+
+CAMPOS_REQUERIDOS = ('nombre', 'onu_sn', 'plan_servicio')
+
+
+def leer_lote(contenido, formato):
+    """
+    Convierte el contenido de un lote (texto CSV con cabecera, o JSON con una
+    lista de objetos o {"clientes": [...]}) en una lista de diccionarios.
+    """
+    if formato == 'csv':
+        return [dict(fila) for fila in csv.DictReader(io.StringIO(contenido))]
+    data = json.loads(contenido)
+    if isinstance(data, dict):
+        data = data.get('clientes', [])
+    if not isinstance(data, list):
+        raise ValueError('El lote debe ser una lista de clientes.')
+    return data
+
+
+def _resultado(indice, fila, success, message):
+    return {
+        'fila': indice,
+        'nombre': fila.get('nombre'),
+        'onu_sn': fila.get('onu_sn'),
+        'success': success,
+        'message': message,
+    }
+
+
+def _retirar_onus(tn, interfaz, fallidas, salida):
+    # Quita, en un solo script y con la misma sesión, las ONUs de las filas
+    # cuyo secret no se pudo crear para no dejarlas huérfanas en la OLT.
+    logging.info(f"Retirando {len(fallidas)} ONU(s) sin secret de {interfaz}...")
+    try:
+        resultados = execute_olt_script(tn, [
+            "configure terminal",
+            *(f"no onu {fila['onu_sn']}" for _, fila, _ in fallidas),
+            "exit",
+        ], check=False)
+        errores = [resultado.error for resultado in resultados[1:]]
+    except Exception as e:
+        errores = [str(e)] * len(fallidas)
+    for (indice, fila, mensaje), error in zip(fallidas, errores):
+        if error:
+            logging.error(f"La ONU {fila['onu_sn']} quedó pre-configurada en {interfaz}: {error}")
+            mensaje = f'{mensaje} La ONU quedó pre-configurada en la OLT: {error}'
+        else:
+            mensaje = f'{mensaje} La ONU se retiró de la OLT.'
+        salida.put(_resultado(indice, fila, False, mensaje))
+
+
+def _aprovisionar_olt(olt, por_interfaz, salida):
+    # Procesa todas las filas de una OLT con una única sesión y deja el
+    # resultado de cada fila en la cola `salida`.
+    try:
+        tn = connect_olt(olt)
+    except Exception as e:
+        for grupo in por_interfaz.values():
+            for indice, fila, _ in grupo:
+                salida.put(_resultado(indice, fila, False, f'Error en la OLT: {e}'))
+        return
+
+    apis = {}  # una conexión por router
+    try:
+        for interfaz, grupo in por_interfaz.items():
+            logging.info(f"Pre-configurando {len(grupo)} ONU(s) en {interfaz} de {olt or 'la OLT'}...")
+            pendientes = []
+            try:
+                resultados = execute_olt_script(tn, [
+                    "configure terminal",
+                    f"interface {interfaz}",
+                    *(f"onu pre-config-mode serial-number {fila['onu_sn']}" for _, fila, _ in grupo),
+                    "exit",
+                    "exit",
+                ], check=False)
+                error_interfaz = resultados[1].error
+                for (indice, fila, router), resultado in zip(grupo, resultados[2:]):
+                    error = error_interfaz or resultado.error
+                    if error:
+                        salida.put(_resultado(indice, fila, False, f'Error en la OLT: {error}'))
+                    else:
+                        pendientes.append((indice, fila, router))
+            except Exception as e:
+                for indice, fila, _ in grupo:
+                    salida.put(_resultado(indice, fila, False, f'Error en la OLT: {e}'))
+                continue
+
+            fallidas = []  # (indice, fila, mensaje): su ONU quedó pre-configurada
+            for indice, fila, router in pendientes:
+                try:
+                    if router not in apis:
+                        apis[router] = connect_mikrotik(router)
+                    secret_id = apis[router].path('ppp', 'secret').add(
+                        name=fila['nombre'],
+                        password=fila.get('pppoe_password') or 'password_generada',
+                        service='pppoe',
+                        profile=fila['plan_servicio']
+                    )
+                    iniciar_espejo(router).registrar(secret_id, fila['nombre'], fila['plan_servicio'], 'pppoe')
+                except TrapError as e:
+                    fallidas.append((indice, fila, f'Error en MikroTik: {e}'))
+                except Exception as e:
+                    # Conexión perdida: la siguiente fila abrirá otra.
+                    api = apis.pop(router, None)
+                    if api is not None:
+                        api.close()
+                    fallidas.append((indice, fila, f'Error en MikroTik: {e}'))
+                else:
+                    salida.put(_resultado(indice, fila, True, 'Cliente creado y aprovisionado con éxito.'))
+            if fallidas:
+                _retirar_onus(tn, interfaz, fallidas, salida)
+    finally:
+        for api in apis.values():
+            api.close()
+        tn.close()
+
+
+def aprovisionar_lote(filas):
+    """
+    Aprovisiona un lote de clientes y va devolviendo (generador) el resultado
+    de cada fila. Cada fila puede indicar por nombre su "olt" y su "router"
+    (por defecto, los equipos de settings). Las OLTs se procesan en paralelo;
+    en cada una, todo el lote usa una única sesión, las pre-configuraciones
+    de ONU de un mismo puerto gpon_olt se envían como un solo script y se
+    abre una única conexión por router. Un fallo en una fila no detiene el
+    resto; si falla su secret, su ONU se retira de la OLT.
+    """
+    dispositivos = {(d.tipo, d.nombre): d for d in Dispositivo.objects.filter(activo=True)}
+    por_olt = defaultdict(lambda: defaultdict(list))
+    for indice, fila in enumerate(filas, start=1):
+        if not isinstance(fila, dict) or not all(fila.get(campo) for campo in CAMPOS_REQUERIDOS):
+            yield _resultado(indice, fila if isinstance(fila, dict) else {}, False, 'Faltan parámetros requeridos.')
+            continue
+        olt = dispositivos.get((Dispositivo.OLT, fila['olt'])) if fila.get('olt') else None
+        router = dispositivos.get((Dispositivo.MIKROTIK, fila['router'])) if fila.get('router') else None
+        if (fila.get('olt') and olt is None) or (fila.get('router') and router is None):
+            yield _resultado(indice, fila, False, 'Dispositivo desconocido.')
+            continue
+        interfaz = fila.get('interfaz') or INTERFAZ_PON_POR_DEFECTO
+        por_olt[olt][interfaz].append((indice, fila, router))
+
+    if not por_olt:
+        return
+
+    salida = queue.Queue()
+    fin = object()
+
+    def procesar(olt, por_interfaz):
+        try:
+            _aprovisionar_olt(olt, por_interfaz, salida)
+        finally:
+            salida.put(fin)
+
+    executor = ThreadPoolExecutor(max_workers=len(por_olt), thread_name_prefix='lote')
+    try:
+        for olt, por_interfaz in por_olt.items():
+            # Los lotes ceden los equipos a las operaciones interactivas.
+            executor.submit(con_prioridad(LOTE, procesar), olt, por_interfaz)
+        pendientes = len(por_olt)
+        while pendientes:
+            resultado = salida.get()
+            if resultado is fin:
+                pendientes -= 1
+            else:
+                yield resultado
+    finally:
+        executor.shutdown(wait=False)
@@ -0,0 +1,261 @@
+import asyncio
+import json
+import logging
+import math
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from api.models import Trabajo
+from gestion_red.connect import connect_mikrotik, connect_olt, pools
+from gestion_red.connect_async import pools_async
+from gestion_red.sesiones_ppp import iniciar_indice
+from gestion_red.simuladores import SimuladorMikrotik, SimuladorOlt
+
+# `datos(i)` arma la petición número i. Cada escenario trabaja sobre los
+# clientes que dejó el anterior (crear -> desactivar -> reconectar...), por
+# eso se ejecutan siempre en este orden.
+Escenario = namedtuple('Escenario', ['nombre', 'url', 'metodo', 'asincrono', 'datos'])
+
+
+def _cliente(prefijo, i):
+    return {'nombre': f'{prefijo}-{i}', 'onu_sn': f'{prefijo[:4].upper()}{i:08X}'}
+
+
+def _escenarios(peticiones):
+    escenarios = []
+    for prefijo, asincrono in (('bench', False), ('abench', True)):
+        sufijo = '_async_api' if asincrono else '_api'
+        escenarios += [
+            Escenario(f'{prefijo}:crear', f'crear_cliente{sufijo}', 'post', asincrono,
+                      lambda i, p=prefijo: {**_cliente(p, i), 'plan_servicio': 'bench', 'pppoe_password': 'bench'}),
+            Escenario(f'{prefijo}:desactivar', f'desactivar_cliente{sufijo}', 'post', asincrono,
+                      lambda i, p=prefijo: _cliente(p, i)),
+            Escenario(f'{prefijo}:reconectar', f'reconectar_cliente{sufijo}', 'post', asincrono,
+                      lambda i, p=prefijo: _cliente(p, i)),
+            Escenario(f'{prefijo}:cambiar_puerto', f'cambiar_puerto_olt{sufijo}', 'post', asincrono,
+                      lambda i, p=prefijo: {'onu_sn': _cliente(p, i)['onu_sn'], 'nuevo_puerto': f'gpon-olt_1/1/{2 + i % 3}'}),
+        ]
+    # El estado se responde desde el índice de sesiones PPP, sin tocar los equipos.
+    escenarios.insert(1, Escenario(
+        'bench:estado', 'estado_clientes_api', 'get', False,
+        lambda i: {'nombres': ','.join(f'bench-{(i + j) % peticiones}' for j in range(20))},
+    ))
+    return escenarios
+
+
+def _percentil(latencias, p):
+    # Rango más cercano sobre las latencias ordenadas.
+    return latencias[max(0, math.ceil(p * len(latencias)) - 1)]
+
+
+def _resumen(resultados, duracion):
+    latencias = sorted(latencia for latencia, _ in resultados)
+    return {
+        'peticiones': len(resultados),
+        'errores': sum(1 for _, ok in resultados if not ok),
+        'rps': round(len(resultados) / duracion, 2),
+        'p50': round(_percentil(latencias, 0.50) * 1000, 2),
+        'p99': round(_percentil(latencias, 0.99) * 1000, 2),
+    }
+
+
+def _esperar_trabajo(pk, timeout=120):
+    # Las vistas síncronas encolan (202): la operación termina con el trabajo.
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        estado = Trabajo.objects.filter(pk=pk).values_list('estado', flat=True).first()
+        if estado in (Trabajo.COMPLETADO, Trabajo.FALLIDO):
+            return estado == Trabajo.COMPLETADO
+        time.sleep(0.005)
+    return False
+
+
+def _peticion(escenario, i):
+    cliente = Client()
+    inicio = time.perf_counter()
+    try:
+        if escenario.metodo == 'get':
+            respuesta = cliente.get(reverse(escenario.url), escenario.datos(i))
+        else:
+            respuesta = cliente.post(reverse(escenario.url), json.dumps(escenario.datos(i)), content_type='application/json')
+        ok = respuesta.status_code in (200, 202)
+        if respuesta.status_code == 202:
+            ok = _esperar_trabajo(respuesta.json()['job_id'])
+        return time.perf_counter() - inicio, ok
+    finally:
+        close_old_connections()
+
+
+async def _peticion_async(cliente, escenario, i, semaforo):
+    async with semaforo:
+        inicio = time.perf_counter()
+        respuesta = await cliente.post(
+            reverse(escenario.url), json.dumps(escenario.datos(i)), content_type='application/json',
+        )
+        return time.perf_counter() - inicio, respuesta.status_code == 200
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide los endpoints de aprovisionamiento de la API contra un MikroTik y una OLT simulados: '
+        'peticiones por segundo y latencias p50/p99 por endpoint. Compara con una base guardada '
+        'y falla si hay una regresión.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=100, help='Peticiones por escenario.')
+        parser.add_argument('--concurrencia', type=int, default=10, help='Peticiones simultáneas.')
+        parser.add_argument('--escenarios', default='',
+                            help='Escenarios a ejecutar, separados por comas (por defecto, todos).')
+        parser.add_argument('--latencia', type=float, default=20, help='Milisegundos de demora por comando en los equipos.')
+        parser.add_argument('--variacion', type=float, default=5, help='Milisegundos extra al azar por comando.')
+        parser.add_argument('--errores', type=float, default=0, help='Probabilidad (0-1) de que un comando falle.')
+        parser.add_argument('--cortes', type=float, default=0, help='Probabilidad (0-1) de cortar la conexión.')
+        parser.add_argument('--base', default=str(Path(settings.BASE_DIR) / 'benchmark_base.json'),
+                            help='Archivo JSON con la base con la que comparar.')
+        parser.add_argument('--guardar-base', action='store_true', help='Guardar los resultados como nueva base.')
+        parser.add_argument('--tolerancia', type=float, default=0.2,
+                            help='Empeoramiento relativo admitido frente a la base (0.2 = 20%%).')
+
+    def handle(self, *args, **options):
+        escenarios = _escenarios(options['peticiones'])
+        if options['escenarios']:
+            pedidos = set(options['escenarios'].split(','))
+            desconocidos = pedidos - {e.nombre for e in escenarios}
+            if desconocidos:
+                raise CommandError(f'Escenarios desconocidos: {", ".join(sorted(desconocidos))}')
+            escenarios = [e for e in escenarios if e.nombre in pedidos]
+
+        parametros = {
+            clave: options[clave] for clave in ('peticiones', 'concurrencia', 'latencia', 'variacion', 'errores', 'cortes')
+        }
+        resultados = self._medir(escenarios, parametros)
+        self._mostrar(resultados)
+
+        base = Path(options['base'])
+        if options['guardar_base']:
+            base.write_text(json.dumps({'parametros': parametros, 'escenarios': resultados}, indent=2), encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f'Base guardada en {base}.'))
+        elif base.exists():
+            self._comparar(json.loads(base.read_text(encoding='utf-8')), parametros, resultados, options['tolerancia'])
+        else:
+            # Sin base no se puede comprobar nada: la comprobación falla en lugar de pasar siempre.
+            raise CommandError(f'No hay base en {base}; use --guardar-base para crearla.')
+
+    def _medir(self, escenarios, parametros):
+        comunes = {
+            'latencia': parametros['latencia'] / 1000,
+            'variacion': parametros['variacion'] / 1000,
+            'prob_error': parametros['errores'],
+            'prob_corte': parametros['cortes'],
+            'semilla': 0,
+        }
+        mikrotik = SimuladorMikrotik(usuario='bench', password='bench', **comunes)
+        olt = SimuladorOlt(usuario='bench', password='bench', **comunes)
+        mikrotik.iniciar()
+        olt.iniciar()
+
+        # Base de datos de prueba, como en los tests: el benchmark no toca los datos reales.
+        setup_test_environment()
+        nombre_bd = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        logging.disable(logging.INFO)
+        try:
+            with override_settings(
+                MIKROTIK_IP='127.0.0.1', MIKROTIK_PORT=mikrotik.puerto, MIKROTIK_USER='bench', MIKROTIK_PASSWORD='bench',
+                OLT_IP='127.0.0.1', OLT_PORT=olt.puerto, OLT_USER='bench', OLT_PASSWORD='bench',
+                TRABAJOS_EN_PROCESO=True,
+            ):
+                return self._ejecutar(escenarios, parametros)
+        finally:
+            for pool in pools():
+                pool.close_all()
+            logging.disable(logging.NOTSET)
+            connection.creation.destroy_test_db(nombre_bd, verbosity=0)
+            teardown_test_environment()
+            mikrotik.detener()
+            olt.detener()
+
+    def _ejecutar(self, escenarios, parametros):
+        peticiones, concurrencia = parametros['peticiones'], parametros['concurrencia']
+        # Las conexiones se abren antes de medir y el índice de sesiones PPP
+        # tiene que estar sincronizado para el escenario de estado.
+        with connect_mikrotik():
+            pass
+        with connect_olt():
+            pass
+        indice = iniciar_indice()
+        limite = time.monotonic() + 10
+        while not indice.sincronizado and time.monotonic() < limite:
+            time.sleep(0.05)
+
+        resultados = {}
+        with ThreadPoolExecutor(max_workers=concurrencia, thread_name_prefix='benchmark') as executor:
+            for escenario in (e for e in escenarios if not e.asincrono):
+                inicio = time.perf_counter()
+                filas = list(executor.map(lambda i, e=escenario: _peticion(e, i), range(peticiones)))
+                resultados[escenario.nombre] = _resumen(filas, time.perf_counter() - inicio)
+                self.stdout.write(f'{escenario.nombre}: {resultados[escenario.nombre]}')
+
+        asincronos = [e for e in escenarios if e.asincrono]
+        if asincronos:
+            resultados.update(asyncio.run(self._ejecutar_async(asincronos, peticiones, concurrencia)))
+        return resultados
+
+    async def _ejecutar_async(self, escenarios, peticiones, concurrencia):
+        cliente = AsyncClient()
+        semaforo = asyncio.Semaphore(concurrencia)
+        resultados = {}
+        try:
+            for escenario in escenarios:
+                inicio = time.perf_counter()
+                filas = await asyncio.gather(*(
+                    _peticion_async(cliente, escenario, i, semaforo) for i in range(peticiones)
+                ))
+                resultados[escenario.nombre] = _resumen(filas, time.perf_counter() - inicio)
+                self.stdout.write(f'{escenario.nombre}: {resultados[escenario.nombre]}')
+        finally:
+            for pool in pools_async():
+                await pool.close_all()
+        return resultados
+
+    def _mostrar(self, resultados):
+        self.stdout.write('')
+        self.stdout.write(f'{"escenario":<24}{"peticiones":>11}{"errores":>9}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}')
+        for nombre, r in resultados.items():
+            self.stdout.write(
+                f'{nombre:<24}{r["peticiones"]:>11}{r["errores"]:>9}{r["rps"]:>10.1f}{r["p50"]:>10.1f}{r["p99"]:>10.1f}'
+            )
+
+    def _comparar(self, base, parametros, resultados, tolerancia):
+        if base.get('parametros') != parametros:
+            raise CommandError(
+                f'La base se midió con otros parámetros ({base.get("parametros")}); '
+                f'repita con esos parámetros o guarde una base nueva con --guardar-base.'
+            )
+
+        regresiones = []
+        for nombre, actual in resultados.items():
+            anterior = base['escenarios'].get(nombre)
+            if anterior is None:
+                continue
+            if actual['rps'] < anterior['rps'] * (1 - tolerancia):
+                regresiones.append(f'{nombre}: {actual["rps"]} req/s (base {anterior["rps"]})')
+            for campo in ('p50', 'p99'):
+                if actual[campo] > anterior[campo] * (1 + tolerancia):
+                    regresiones.append(f'{nombre}: {campo} {actual[campo]} ms (base {anterior[campo]} ms)')
+            if actual['errores'] / actual['peticiones'] > anterior['errores'] / anterior['peticiones'] + 0.01:
+                regresiones.append(f'{nombre}: {actual["errores"]} errores (base {anterior["errores"]})')
+
+        if regresiones:
+            raise CommandError('Regresión frente a la base:\n' + '\n'.join(regresiones))
+        self.stdout.write(self.style.SUCCESS(f'Sin regresiones frente a la base (tolerancia {tolerancia:.0%}).'))
@@ -0,0 +1,30 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.lotes import aprovisionar_lote, leer_lote
+
+
+class Command(BaseCommand):
+    help = 'Aprovisiona en OLT y MikroTik un lote de clientes leído de un archivo CSV o JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Archivo .csv (con cabecera) o .json con los clientes.')
+
+    def handle(self, *args, **options):
+        archivo = Path(options['archivo'])
+        formato = 'csv' if archivo.suffix.lower() == '.csv' else 'json'
+        try:
+            filas = leer_lote(archivo.read_text(encoding='utf-8'), formato)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'No se pudo leer el lote: {e}')
+
+        fallidas = 0
+        for resultado in aprovisionar_lote(filas):
+            if not resultado['success']:
+                fallidas += 1
+            self.stdout.write(json.dumps(resultado, ensure_ascii=False))
+
+        resumen = f'{len(filas) - fallidas} de {len(filas)} cliente(s) aprovisionado(s).'
+        self.stdout.write(self.style.SUCCESS(resumen) if not fallidas else self.style.WARNING(resumen))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.trabajos import reanudar_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta los trabajos pendientes (y los abandonados por un proceso caído).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true',
+                            help='Seguir esperando trabajos nuevos en lugar de terminar.')
+        parser.add_argument('--intervalo', type=float, default=2,
+                            help='Segundos entre consultas a la cola en modo continuo.')
+
+    def handle(self, *args, **options):
+        while True:
+            procesados = reanudar_pendientes()
+            if procesados:
+                self.stdout.write(f'{procesados} trabajo(s) procesado(s).')
+            if not options['continuo']:
+                break
+            time.sleep(options['intervalo'])
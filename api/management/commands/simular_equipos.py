@@ -0,0 +1,57 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gestion_red.simuladores import SimuladorMikrotik, SimuladorOlt
+
+
+class Command(BaseCommand):
+    help = 'Levanta un MikroTik y una OLT ZTE simulados para desarrollo, con latencia y fallos configurables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Dirección en la que escuchan los simuladores.')
+        parser.add_argument('--puerto-mikrotik', type=int, default=18728, help='Puerto de la API de RouterOS.')
+        parser.add_argument('--puerto-olt', type=int, default=2323, help='Puerto Telnet de la OLT.')
+        parser.add_argument('--latencia', type=float, default=20, help='Milisegundos de demora por comando.')
+        parser.add_argument('--variacion', type=float, default=0, help='Milisegundos extra al azar por comando.')
+        parser.add_argument('--errores', type=float, default=0, help='Probabilidad (0-1) de que un comando falle.')
+        parser.add_argument('--cortes', type=float, default=0, help='Probabilidad (0-1) de cortar la conexión.')
+        parser.add_argument('--onus', type=int, default=0, help='ONUs precargadas en la OLT, repartidas en 4 puertos.')
+
+    def handle(self, *args, **options):
+        comunes = {
+            'host': options['host'],
+            'latencia': options['latencia'] / 1000,
+            'variacion': options['variacion'] / 1000,
+            'prob_error': options['errores'],
+            'prob_corte': options['cortes'],
+        }
+        # Con las credenciales de settings solo hay que cambiar IP y puerto para usarlos.
+        mikrotik = SimuladorMikrotik(
+            puerto=options['puerto_mikrotik'], usuario=settings.MIKROTIK_USER,
+            password=settings.MIKROTIK_PASSWORD, **comunes,
+        )
+        olt = SimuladorOlt(
+            puerto=options['puerto_olt'], usuario=settings.OLT_USER, password=settings.OLT_PASSWORD, **comunes,
+        )
+        for i in range(options['onus']):
+            olt.agregar_onu(f'SIMU{i:08X}', f'1/1/{i % 4 + 1}')
+
+        mikrotik.iniciar()
+        olt.iniciar()
+        self.stdout.write(self.style.SUCCESS(
+            f'MikroTik simulado en {options["host"]}:{mikrotik.puerto}, OLT simulada en {options["host"]}:{olt.puerto}.'
+        ))
+        self.stdout.write(
+            f'Para usarlos: MIKROTIK_IP = OLT_IP = {options["host"]!r}, '
+            f'MIKROTIK_PORT = {mikrotik.puerto}, OLT_PORT = {olt.puerto}. Ctrl+C para terminar.'
+        )
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            mikrotik.detener()
+            olt.detener()
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trabajo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50)),
+                ('datos', models.JSONField(default=dict)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_curso', 'En curso'), ('completado', 'Completado'), ('fallido', 'Fallido')], db_index=True, default='pendiente', max_length=20)),
+                ('pasos', models.JSONField(default=list)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('iniciado', models.DateTimeField(blank=True, null=True)),
+                ('finalizado', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
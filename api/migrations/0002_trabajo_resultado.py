@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="trabajo",
+            name="resultado",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
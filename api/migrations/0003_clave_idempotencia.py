@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0002_trabajo_resultado"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ClaveIdempotencia",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("clave", models.CharField(max_length=255, unique=True)),
+                ("huella", models.CharField(max_length=64)),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("en_curso", "En curso"),
+                            ("completada", "Completada"),
+                        ],
+                        default="en_curso",
+                        max_length=20,
+                    ),
+                ),
+                ("status", models.PositiveSmallIntegerField(blank=True, null=True)),
+                ("contenido", models.TextField(blank=True, default="")),
+                ("cabeceras", models.JSONField(default=dict)),
+                ("creado", models.DateTimeField(auto_now_add=True)),
+                ("expira", models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
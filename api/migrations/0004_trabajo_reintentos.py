@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_clave_idempotencia"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="trabajo",
+            name="intentos",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="trabajo",
+            name="reintentar_en",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:00
+
+from django.db import migrations, models
+
+
+def latido_desde_iniciado(apps, schema_editor):
+    # Los trabajos en curso al migrar conservan el criterio anterior.
+    Trabajo = apps.get_model("api", "Trabajo")
+    Trabajo.objects.filter(estado="en_curso").update(latido=models.F("iniciado"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_trabajo_reintentos"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="trabajo",
+            name="latido",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(latido_desde_iniciado, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,70 @@
 from django.db import models
 
-# Create your models here.
+
+class Trabajo(models.Model):
+    """
+    Operación sobre los equipos que se ejecuta en segundo plano.
+    La tabla hace de cola: no hace falta un broker externo.
+
+    También es el diario de la operación: cada paso (y cada tramo de un
+    paso en paralelo) se anota en `pasos` antes de ejecutarse y al
+    terminar, para reanudarla tras una caída sin repetir lo ya hecho. Si un
+    equipo no está disponible el trabajo vuelve a la cola con `reintentar_en`.
+
+    Mientras corre, el worker renueva `latido`; un trabajo en curso sin
+    latido reciente se da por abandonado. `iniciado` identifica cada toma:
+    el worker solo guarda mientras siga siendo el de la última.
+    """
+    PENDIENTE = 'pendiente'
+    EN_CURSO = 'en_curso'
+    COMPLETADO = 'completado'
+    FALLIDO = 'fallido'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_CURSO, 'En curso'),
+        (COMPLETADO, 'Completado'),
+        (FALLIDO, 'Fallido'),
+    ]
+
+    tipo = models.CharField(max_length=50)
+    datos = models.JSONField(default=dict)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE, db_index=True)
+    pasos = models.JSONField(default=list)  # [{nombre, estado, inicio, duracion, error}]
+    error = models.TextField(blank=True, null=True)
+    resultado = models.JSONField(blank=True, null=True)
+    intentos = models.PositiveIntegerField(default=0)  # reintentos por equipos no disponibles
+    reintentar_en = models.DateTimeField(blank=True, null=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(blank=True, null=True)
+    latido = models.DateTimeField(blank=True, null=True)
+    finalizado = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.estado})"
+
+
+class ClaveIdempotencia(models.Model):
+    """
+    Respuesta guardada de una petición con cabecera Idempotency-Key. Un
+    reintento con la misma clave y el mismo cuerpo recibe esta respuesta
+    en lugar de repetir la operación; mientras la primera sigue en curso,
+    el reintento la espera.
+    """
+    EN_CURSO = 'en_curso'
+    COMPLETADA = 'completada'
+    ESTADOS = [
+        (EN_CURSO, 'En curso'),
+        (COMPLETADA, 'Completada'),
+    ]
+
+    clave = models.CharField(max_length=255, unique=True)
+    huella = models.CharField(max_length=64)  # sha256 de método, ruta y cuerpo
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=EN_CURSO)
+    status = models.PositiveSmallIntegerField(blank=True, null=True)
+    contenido = models.TextField(blank=True, default='')
+    cabeceras = models.JSONField(default=dict)
+    creado = models.DateTimeField(auto_now_add=True)
+    expira = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.clave} ({self.estado})"
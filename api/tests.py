@@ -1,3 +1,450 @@
-from django.test import TestCase
+import json
+import socket
+import threading
+import time
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from clientes.models import Dispositivo
+from gestion_red.circuito import ABIERTO, CERRADO, SEMIABIERTO, Circuito
+from gestion_red.connect import get_mikrotik_pool, pools
+from gestion_red.olt import ERROR_LOGIN, PROMPT_LOGIN
+from gestion_red.pool import (
+    INTERACTIVA, LOTE, NOMBRES_PRIORIDAD, CircuitoAbierto, ConnectionPool, PlazoAgotado, PoolSaturado, PoolTimeout,
+)
+from gestion_red.secrets_ppp import iniciar_espejo
+from gestion_red.simuladores import SimuladorMikrotik, SimuladorOlt
+from gestion_red.telnet import _buscar
+
+from .models import ClaveIdempotencia, Trabajo
+from .trabajos import TrabajoPerdido, _guardar, encolar, ejecutar_trabajo
+
+
+def _puerto_cerrado():
+    # Un puerto en el que no escucha nadie: el equipo no responde.
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class TrabajosTests(TestCase):
+    """
+    Trabajos de la API contra un MikroTik y una OLT simulados. Los trabajos
+    se ejecutan en el hilo del test (TRABAJOS_EN_PROCESO=False).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.mikrotik = cls.enterClassContext(SimuladorMikrotik())
+        cls.olt = cls.enterClassContext(SimuladorOlt())
+        cls.enterClassContext(override_settings(
+            MIKROTIK_IP='127.0.0.1', MIKROTIK_PORT=cls.mikrotik.puerto,
+            MIKROTIK_USER='admin', MIKROTIK_PASSWORD='admin',
+            OLT_IP='127.0.0.1', OLT_PORT=cls.olt.puerto, OLT_USER='admin', OLT_PASSWORD='admin',
+            TRABAJOS_EN_PROCESO=False,
+        ))
+        cls.addClassCleanup(lambda: [pool.close_all() for pool in pools()])
+
+    def _post(self, url, datos):
+        respuesta = self.client.post(reverse(url), json.dumps(datos), content_type='application/json')
+        self.assertEqual(respuesta.status_code, 202)
+        return Trabajo.objects.get(pk=respuesta.json()['job_id'])
+
+    def _ejecutar(self, trabajo):
+        ejecutar_trabajo(trabajo.pk)
+        trabajo.refresh_from_db()
+        return trabajo
+
+    def _secret(self, nombre):
+        return next(s for s in self.mikrotik._tablas['/ppp/secret'].values() if s['name'] == nombre)
+
+    def test_crear_y_desactivar_cliente(self):
+        cliente = {'nombre': 'ana', 'onu_sn': 'ZTEG00000001'}
+        trabajo = self._ejecutar(self._post('crear_cliente_api', {**cliente, 'plan_servicio': '10M'}))
+        self.assertEqual(trabajo.estado, Trabajo.COMPLETADO, trabajo.error)
+        self.assertEqual(self._secret('ana')['profile'], '10M')
+        self.assertTrue(self.olt.onus['ZTEG00000001']['servicio'])
+
+        trabajo = self._ejecutar(self._post('desactivar_cliente_api', cliente))
+        self.assertEqual(trabajo.estado, Trabajo.COMPLETADO, trabajo.error)
+        self.assertEqual(self._secret('ana')['disabled'], 'true')
+        self.assertFalse(self.olt.onus['ZTEG00000001']['servicio'])
+
+        # Los dos trabajos usaron conexiones del pool en lugar de abrir una cada vez.
+        stats = get_mikrotik_pool().stats()
+        self.assertGreater(stats['prestadas'], stats['abiertas'])
+
+    def test_reintento_cuando_el_router_no_responde(self):
+        router = Dispositivo.objects.create(
+            nombre='r1', tipo=Dispositivo.MIKROTIK, host='127.0.0.1', puerto=_puerto_cerrado(),
+            usuario='admin', password='admin',
+        )
+        trabajo = self._ejecutar(self._post('crear_cliente_api', {
+            'nombre': 'bob', 'onu_sn': 'ZTEG00000002', 'plan_servicio': '10M', 'router': 'r1',
+        }))
+        self.assertEqual(trabajo.estado, Trabajo.PENDIENTE)
+        self.assertEqual(trabajo.intentos, 1)
+        self.assertIsNotNone(trabajo.reintentar_en)
+        tramos = trabajo.pasos[0]['tramos']
+        self.assertEqual(tramos['olt']['estado'], 'completado')
+        self.assertEqual(tramos['mikrotik']['estado'], 'fallido')
+        # La ONU no se quita mientras se espera al router.
+        self.assertIn('ZTEG00000002', self.olt.onus)
+
+        # Vuelve el router: el reintento solo hace lo que faltaba.
+        Dispositivo.objects.filter(pk=router.pk).update(puerto=self.mikrotik.puerto)
+        comandos_olt = sum(self.olt.comandos.values())
+        trabajo = self._ejecutar(trabajo)
+        self.assertEqual(trabajo.estado, Trabajo.COMPLETADO, trabajo.error)
+        self.assertEqual(self._secret('bob')['profile'], '10M')
+        self.assertEqual(sum(self.olt.comandos.values()), comandos_olt)
+
+    def test_lote_retira_las_onus_sin_secret(self):
+        Dispositivo.objects.create(
+            nombre='caido', tipo=Dispositivo.MIKROTIK, host='127.0.0.1', puerto=_puerto_cerrado(),
+            usuario='admin', password='admin',
+        )
+        lote = [
+            {'nombre': 'lote1', 'onu_sn': 'ZTEG00000101', 'plan_servicio': '10M'},
+            {'nombre': 'lote2', 'onu_sn': 'ZTEG00000102', 'plan_servicio': '10M', 'router': 'caido'},
+            {'nombre': 'lote3', 'onu_sn': 'ZTEG00000103', 'plan_servicio': '10M', 'router': 'caido'},
+        ]
+        respuesta = self.client.post(reverse('crear_lote_api'), json.dumps(lote), content_type='application/json')
+        filas = {r['fila']: r for r in map(json.loads, b''.join(respuesta.streaming_content).splitlines())}
+        self.assertEqual(sorted(filas), [1, 2, 3])
+        self.assertTrue(filas[1]['success'], filas[1]['message'])
+        self.assertEqual(self._secret('lote1')['profile'], '10M')
+        self.assertIn('ZTEG00000101', self.olt.onus)
+        for fila in (2, 3):
+            self.assertFalse(filas[fila]['success'])
+            self.assertIn('se retiró de la OLT', filas[fila]['message'])
+        self.assertNotIn('ZTEG00000102', self.olt.onus)
+        self.assertNotIn('ZTEG00000103', self.olt.onus)
+
+    def test_lote_csv_informa_cada_fila(self):
+        self.olt.agregar_onu('ZTEG00000114')
+        lote = (
+            'nombre,onu_sn,plan_servicio,router,interfaz\n'
+            'lote11,ZTEG00000111,10M,,\n'
+            'lote12,ZTEG00000112,,,\n'             # sin plan
+            'lote13,ZTEG00000113,10M,nadie,\n'     # router desconocido
+            'lote14,ZTEG00000114,10M,,\n'          # la OLT ya tiene la ONU
+            'lote15,ZTEG00000115,20M,,gpon_olt-1/1/3\n'
+        )
+        respuesta = self.client.post(reverse('crear_lote_api'), lote, content_type='text/csv')
+        filas = {r['fila']: r for r in map(json.loads, b''.join(respuesta.streaming_content).splitlines())}
+        self.assertEqual([fila for fila, r in sorted(filas.items()) if r['success']], [1, 5])
+        self.assertEqual(filas[2]['message'], 'Faltan parámetros requeridos.')
+        self.assertEqual(filas[3]['message'], 'Dispositivo desconocido.')
+        self.assertIn('Error en la OLT', filas[4]['message'])
+        self.assertNotIn('lote14', [s['name'] for s in self.mikrotik._tablas['/ppp/secret'].values()])
+        self.assertEqual(self.olt.onus['ZTEG00000115']['puerto'], '1/1/3')
+        self.assertEqual(self._secret('lote15')['profile'], '20M')
+
+    async def _post_async(self, url, datos, status):
+        respuesta = await self.async_client.post(reverse(url), json.dumps(datos), content_type='application/json')
+        self.assertEqual(respuesta.status_code, status, respuesta.content)
+        return await Trabajo.objects.aget(pk=respuesta.json()['job_id'])
+
+    async def test_asincrono_anota_el_diario_del_trabajo(self):
+        cliente = {'nombre': 'carla', 'onu_sn': 'ZTEG00000003'}
+        trabajo = await self._post_async('crear_cliente_async_api', {**cliente, 'plan_servicio': '20M'}, 200)
+        self.assertEqual((trabajo.tipo, trabajo.estado), ('crear_cliente', Trabajo.COMPLETADO))
+        tramos = trabajo.pasos[0]['tramos']
+        self.assertEqual({tramos['olt']['estado'], tramos['mikrotik']['estado']}, {'completado'})
+        self.assertEqual(self._secret('carla')['profile'], '20M')
+
+        trabajo = await self._post_async('desactivar_cliente_async_api', cliente, 200)
+        self.assertEqual(trabajo.estado, Trabajo.COMPLETADO)
+        self.assertEqual(self._secret('carla')['disabled'], 'true')
+        self.assertFalse(self.olt.onus['ZTEG00000003']['servicio'])
+
+    async def test_asincrono_sin_router_lo_termina_la_cola(self):
+        router = await Dispositivo.objects.acreate(
+            nombre='r2', tipo=Dispositivo.MIKROTIK, host='127.0.0.1', puerto=_puerto_cerrado(),
+            usuario='admin', password='admin',
+        )
+        trabajo = await self._post_async('crear_cliente_async_api', {
+            'nombre': 'dani', 'onu_sn': 'ZTEG00000004', 'plan_servicio': '10M', 'router': 'r2',
+        }, 202)
+        self.assertEqual((trabajo.estado, trabajo.intentos), (Trabajo.PENDIENTE, 1))
+        self.assertEqual(trabajo.pasos[0]['tramos']['olt']['estado'], 'completado')
+        self.assertIn('ZTEG00000004', self.olt.onus)
+
+        # El worker sigue desde el diario de la petición: la OLT no se repite.
+        await Dispositivo.objects.filter(pk=router.pk).aupdate(puerto=self.mikrotik.puerto)
+        comandos_olt = sum(self.olt.comandos.values())
+        trabajo = await sync_to_async(self._ejecutar)(trabajo)
+        self.assertEqual(trabajo.estado, Trabajo.COMPLETADO, trabajo.error)
+        self.assertEqual(self._secret('dani')['profile'], '10M')
+        self.assertEqual(sum(self.olt.comandos.values()), comandos_olt)
+
+    def test_baja_revertida_restaura_la_onu_en_su_interfaz(self):
+        self.olt.agregar_onu('ZTEG00000005', puerto='1/1/2')
+        # Un router que rechaza todo: la baja del secret falla y se revierte la de la ONU.
+        with SimuladorMikrotik(prob_error=1.0) as rechazo:
+            router = Dispositivo.objects.create(
+                nombre='r3', tipo=Dispositivo.MIKROTIK, host='127.0.0.1', puerto=rechazo.puerto,
+                usuario='admin', password='admin',
+            )
+            trabajo = self._ejecutar(encolar(
+                'eliminar_cliente', nombre='eva', onu_sn='ZTEG00000005', olt=None, router=router.pk,
+            ))
+            self.assertEqual(trabajo.estado, Trabajo.FALLIDO)
+            tramo = trabajo.pasos[0]['tramos']['olt']
+            self.assertEqual(tramo['datos'], {'interfaz': 'gpon_olt-1/1/2'})
+            self.assertEqual(tramo['compensacion'], 'ok')
+            self.assertEqual(self.olt.onus['ZTEG00000005']['puerto'], '1/1/2')
+
+            # Reanudado en otro proceso: la interfaz sale del diario.
+            trabajo = self._ejecutar(Trabajo.objects.create(
+                tipo='eliminar_cliente',
+                datos={'nombre': 'flor', 'onu_sn': 'ZTEG00000006', 'olt': None, 'router': router.pk},
+                pasos=[{'nombre': 'olt+mikrotik', 'estado': 'en_curso', 'tramos': {
+                    'olt': {'estado': 'completado', 'duracion': 0.1, 'datos': {'interfaz': 'gpon_olt-1/1/3'}},
+                }}],
+            ))
+        self.assertEqual(trabajo.estado, Trabajo.FALLIDO)
+        self.assertEqual(trabajo.pasos[0]['tramos']['olt']['compensacion'], 'ok')
+        self.assertEqual(self.olt.onus['ZTEG00000006']['puerto'], '1/1/3')
+
+    def test_un_worker_que_perdio_el_trabajo_no_lo_pisa(self):
+        iniciado = timezone.now() - timedelta(minutes=10)
+        trabajo = Trabajo.objects.create(tipo='reconciliar', estado=Trabajo.EN_CURSO, iniciado=iniciado)
+        # Otro worker lo dio por abandonado y lo tomó de nuevo.
+        Trabajo.objects.filter(pk=trabajo.pk).update(iniciado=timezone.now(), resultado={'worker': 2})
+
+        trabajo.resultado = {'worker': 1}
+        with self.assertRaises(TrabajoPerdido):
+            _guardar(trabajo, 'resultado')
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.resultado, {'worker': 2})
+
+
+@override_settings(TRABAJOS_EN_PROCESO=False, IDEMPOTENCIA_ESPERA=0.2)
+class IdempotenciaTests(TestCase):
+
+    CLIENTE = {'nombre': 'ana', 'onu_sn': 'ZTEG00000001', 'plan_servicio': '10M'}
+
+    def _post(self, datos, clave='factura-1'):
+        return self.client.post(
+            reverse('crear_cliente_api'), json.dumps(datos), content_type='application/json',
+            HTTP_IDEMPOTENCY_KEY=clave,
+        )
+
+    def test_el_reintento_recibe_la_misma_respuesta(self):
+        primera = self._post(self.CLIENTE)
+        self.assertEqual(primera.status_code, 202)
+        segunda = self._post(self.CLIENTE)
+        self.assertEqual((segunda.status_code, segunda.json()), (202, primera.json()))
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertEqual(segunda['Location'], primera['Location'])
+        self.assertEqual(Trabajo.objects.count(), 1)
+
+    def test_misma_clave_con_otro_cuerpo(self):
+        self._post(self.CLIENTE)
+        respuesta = self._post({**self.CLIENTE, 'plan_servicio': '20M'})
+        self.assertEqual(respuesta.status_code, 422)
+        self.assertEqual(Trabajo.objects.count(), 1)
+
+    def test_original_en_curso(self):
+        self._post(self.CLIENTE)
+        # Como si la primera petición siguiera ejecutándose en otro proceso.
+        ClaveIdempotencia.objects.update(
+            estado=ClaveIdempotencia.EN_CURSO, expira=timezone.now() + timedelta(minutes=5),
+        )
+        respuesta = self._post(self.CLIENTE)
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(respuesta['Retry-After'], '5')
+        self.assertEqual(Trabajo.objects.count(), 1)
+
+        # El proceso cayó y la reserva venció: el reintento vuelve a operar.
+        ClaveIdempotencia.objects.update(expira=timezone.now())
+        respuesta = self._post(self.CLIENTE)
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertNotIn('Idempotent-Replayed', respuesta)
+        self.assertEqual(Trabajo.objects.count(), 2)
+        self.assertEqual(ClaveIdempotencia.objects.get().estado, ClaveIdempotencia.COMPLETADA)
+
+    def test_sin_clave_no_se_guarda_nada(self):
+        self._post(self.CLIENTE, clave='')
+        self._post(self.CLIENTE, clave='')
+        self.assertEqual(Trabajo.objects.count(), 2)
+        self.assertFalse(ClaveIdempotencia.objects.exists())
+
+
+class PoolTests(SimpleTestCase):
+
+    def _pool(self, **kwargs):
+        self.cerradas = []
+        return ConnectionPool(crear=object, validar=bool, cerrar=self.cerradas.append, **kwargs)
+
+    def _esperar(self, pool, prioridad, resultados):
+        # Pide una conexión desde otro hilo y anota (prioridad, conexión o error).
+        def pedir():
+            try:
+                resultados.append((prioridad, pool.acquire(timeout=5, prioridad=prioridad)))
+            except PoolTimeout as e:
+                resultados.append((prioridad, e))
+        def en_espera():
+            return pool.stats()['en_espera_por_prioridad'][NOMBRES_PRIORIDAD[prioridad]]
+        hilo = threading.Thread(target=pedir)
+        antes = en_espera()
+        hilo.start()
+        limite = time.monotonic() + 5
+        while en_espera() == antes and hilo.is_alive() and time.monotonic() < limite:
+            time.sleep(0.01)
+        self.addCleanup(hilo.join)
+        return hilo
+
+    def test_limite_de_conexiones(self):
+        pool = self._pool(tamano=2)
+        pool.acquire(), pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(timeout=0.05)
+        stats = pool.stats()
+        self.assertEqual((stats['abiertas'], stats['en_uso'], stats['agotadas']), (2, 2, 1))
+
+    def test_la_prioridad_pasa_antes_que_el_orden_de_llegada(self):
+        pool = self._pool(tamano=1)
+        conexion = pool.acquire()
+        resultados = []
+        lote = self._esperar(pool, LOTE, resultados)
+        interactiva = self._esperar(pool, INTERACTIVA, resultados)
+        self.assertEqual(pool.stats()['en_espera_por_prioridad']['lote'], 1)
+
+        pool.release(conexion)
+        interactiva.join(5)
+        self.assertEqual(resultados, [(INTERACTIVA, conexion)])
+        pool.release(conexion)
+        lote.join(5)
+        self.assertEqual(resultados[1], (LOTE, conexion))
+        self.assertEqual(pool.stats()['esperas'], 2)
+
+    def test_cola_llena_rechaza_la_menos_prioritaria(self):
+        pool = self._pool(tamano=1, cola_maxima=1)
+        conexion = pool.acquire()
+        resultados = []
+        lote = self._esperar(pool, LOTE, resultados)
+        # Llega una interactiva con la cola llena: desplaza al lote.
+        interactiva = self._esperar(pool, INTERACTIVA, resultados)
+        lote.join(5)
+        self.assertEqual(resultados[0][0], LOTE)
+        self.assertIsInstance(resultados[0][1], PoolSaturado)
+        # Otro lote ya no entra: la espera en la cola es más prioritaria.
+        with self.assertRaises(PoolSaturado):
+            pool.acquire(prioridad=LOTE)
+
+        pool.release(conexion)
+        interactiva.join(5)
+        self.assertEqual(resultados[1], (INTERACTIVA, conexion))
+        self.assertEqual(pool.stats()['rechazadas'], 2)
+
+    def test_conexion_devuelta_a_un_pool_cerrado(self):
+        # Como cuando se reemplaza el pool porque cambiaron las credenciales.
+        pool = self._pool()
+        libre, prestada = pool.acquire(), pool.acquire()
+        pool.release(libre)
+        pool.close_all()
+        self.assertEqual(self.cerradas, [libre])
+        pool.release(prestada)
+        self.assertEqual(self.cerradas, [libre, prestada])
+        self.assertEqual(pool.stats()['abiertas'], 0)
+
+
+class CircuitoTests(SimpleTestCase):
+
+    def test_se_abre_tras_el_umbral_de_fallas_seguidas(self):
+        circuito = Circuito('olt', umbral=2, espera=60)
+        circuito.fallo(OSError('a'))
+        circuito.exito()
+        circuito.fallo(OSError('b'))
+        circuito.permitir()
+        self.assertEqual(circuito.estado, CERRADO)
+
+        circuito.fallo(OSError('c'))
+        self.assertEqual(circuito.estado, ABIERTO)
+        with self.assertRaisesMessage(CircuitoAbierto, 'OSError: c'):
+            circuito.permitir()
+        stats = circuito.stats()
+        self.assertEqual((stats['aperturas'], stats['rechazadas'], stats['fallas_seguidas']), (1, 1, 2))
+
+    def test_semiabierto_deja_pasar_una_sola_prueba(self):
+        circuito = Circuito('olt', umbral=1, espera=0.05)
+        circuito.fallo()
+        time.sleep(0.06)
+        self.assertEqual(circuito.estado, SEMIABIERTO)
+        circuito.permitir()
+        with self.assertRaises(CircuitoAbierto):
+            circuito.permitir()
+
+        # La prueba falla: se vuelve a abrir sin contar una apertura nueva.
+        circuito.fallo()
+        self.assertEqual(circuito.estado, ABIERTO)
+        time.sleep(0.06)
+        circuito.permitir()
+        circuito.exito()
+        self.assertEqual(circuito.estado, CERRADO)
+        circuito.permitir()
+        self.assertEqual(circuito.stats()['aperturas'], 1)
+
+    def test_el_pool_falla_al_instante_con_el_circuito_abierto(self):
+        intentos = []
+
+        def crear():
+            intentos.append(1)
+            raise OSError('sin respuesta')
+        pool = ConnectionPool(crear=crear, validar=bool, cerrar=lambda c: None, circuito=Circuito('olt', umbral=2))
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                pool.acquire()
+        with self.assertRaises(CircuitoAbierto):
+            pool.acquire()
+        self.assertEqual(len(intentos), 2)
+        self.assertEqual(pool.stats()['circuito']['estado'], ABIERTO)
+
+    def test_un_plazo_agotado_no_cuenta_como_falla(self):
+        circuito = Circuito('olt', umbral=1)
+        pool = ConnectionPool(crear=object, validar=bool, cerrar=lambda c: None, circuito=circuito)
+        pool.release(pool.acquire(), rota=True, error=PlazoAgotado())
+        self.assertEqual(circuito.estado, CERRADO)
+        pool.release(pool.acquire(), rota=True, error=OSError())
+        self.assertEqual(circuito.estado, ABIERTO)
+
+
+class TelnetTests(SimpleTestCase):
+
+    def test_gana_el_patron_que_aparece_antes(self):
+        indice, match = _buscar(b'uno dos', [b'dos', b'uno'])
+        self.assertEqual((indice, match.group()), (1, b'uno'))
+        self.assertEqual(_buscar(b'uno', [b'u', b'uno'])[0], 0)
+        self.assertEqual(_buscar(b'tres', [b'uno'])[0], -1)
+
+    def test_login_con_banner_que_menciona_un_fallo(self):
+        patrones = [PROMPT_LOGIN, ERROR_LOGIN]
+        self.assertEqual(_buscar(b'\r\nWelcome to ZXAN\r\nLast login failed: 0 times\r\nZXAN#', patrones)[0], 0)
+        self.assertEqual(_buscar(b'\r\n%Error 20016: Username or password invalid.\r\nZXAN#', patrones)[0], 1)
+        self.assertEqual(_buscar(b'\r\nUsername:', patrones)[0], 1)
+
+
+class TablasRouterosTests(TransactionTestCase):
+
+    @override_settings(PPP_INDICE_REINTENTO=0.05)
+    def test_el_hilo_sigue_al_router_si_cambia_su_puerto(self):
+        with SimuladorMikrotik() as mikrotik:
+            mikrotik._guardar('/ppp/secret', {'.id': mikrotik._nuevo_id(), 'name': 'gina', 'profile': '10M'})
+            router = Dispositivo.objects.create(
+                nombre='r4', tipo=Dispositivo.MIKROTIK, host='127.0.0.1', puerto=_puerto_cerrado(),
+                usuario='admin', password='admin',
+            )
+            espejo = iniciar_espejo(router)
+            Dispositivo.objects.filter(pk=router.pk).update(puerto=mikrotik.puerto)
+            limite = time.monotonic() + 5
+            while espejo.secret('gina') is None and time.monotonic() < limite:
+                time.sleep(0.05)
+            self.assertEqual(espejo.secret('gina')['perfil'], '10M')
@@ -0,0 +1,505 @@
+# api/trabajos.py
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from clientes import cortes, reconciliacion
+from clientes.models import Cliente, Dispositivo
+from gestion_red import orquestacion
+from gestion_red.orquestacion import EquiposNoDisponibles, OperacionFallida
+from gestion_red.pool import SEGUNDO_PLANO, prioridad
+
+from .models import Trabajo
+
+MANEJADORES = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_despachador = None
+_despachador_pid = None
+_despachador_lock = threading.Lock()
+
+
+class TrabajoPerdido(Exception):
+    """
+    El trabajo se dio por abandonado y otro worker lo retomó: esta ejecución
+    ya no es su dueña y no debe guardar nada más.
+    """
+
+
+def manejador(tipo):
+    """
+    Registra la función que ejecuta los trabajos de un tipo. La función
+    recibe el `Trabajo` y sus `datos` como argumentos con nombre; lo que
+    devuelva se guarda en `Trabajo.resultado`.
+    """
+    def registrar(funcion):
+        MANEJADORES[tipo] = funcion
+        return funcion
+    return registrar
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'TRABAJOS_MAX_WORKERS', 4),
+                thread_name_prefix='trabajos',
+            )
+        return _executor
+
+
+def _validar_tipo(tipo):
+    if tipo not in MANEJADORES:
+        raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+
+
+def encolar(tipo, **datos):
+    """
+    Guarda un trabajo pendiente y, si los trabajos se ejecutan dentro del
+    proceso web, lo envía al pool de workers cuando se confirme la
+    transacción. Devuelve el `Trabajo` creado.
+    """
+    _validar_tipo(tipo)
+    trabajo = Trabajo.objects.create(tipo=tipo, datos=datos)
+    if getattr(settings, 'TRABAJOS_EN_PROCESO', True):
+        iniciar_despachador()
+        transaction.on_commit(lambda: _get_executor().submit(ejecutar_trabajo, trabajo.pk))
+    return trabajo
+
+
+def tomar(tipo, **datos):
+    """
+    Guarda un trabajo ya en curso, tomado por quien lo crea, para ejecutarlo
+    en la propia petición con ejecutar_en_peticion() en lugar de encolarlo.
+    """
+    _validar_tipo(tipo)
+    ahora = timezone.now()
+    trabajo = Trabajo.objects.create(tipo=tipo, datos=datos, estado=Trabajo.EN_CURSO, iniciado=ahora, latido=ahora)
+    if getattr(settings, 'TRABAJOS_EN_PROCESO', True):
+        # Si queda en la cola o el proceso muere, lo retoma el despachador.
+        iniciar_despachador()
+    return trabajo
+
+
+def _abrir_paso(trabajo, nombre):
+    registro = next((r for r in trabajo.pasos if r['nombre'] == nombre), None)
+    if registro is None:
+        registro = {'nombre': nombre}
+        trabajo.pasos.append(registro)
+    registro.pop('error', None)
+    registro.update(estado=Trabajo.EN_CURSO, inicio=timezone.now().isoformat())
+    _guardar(trabajo, 'pasos')
+    return registro
+
+
+def _cerrar_paso(trabajo, registro, inicio, error=None):
+    if error is None:
+        registro['estado'] = Trabajo.COMPLETADO
+    else:
+        registro['estado'] = Trabajo.FALLIDO
+        registro['error'] = str(error)
+    registro['duracion'] = round(time.monotonic() - inicio, 3)
+    _guardar(trabajo, 'pasos')
+
+
+@contextmanager
+def paso(trabajo, nombre):
+    """
+    Registra en `trabajo.pasos` la duración y el resultado del bloque. El
+    paso se guarda en curso antes de ejecutarlo; si el trabajo se reanuda,
+    se reutiliza su registro (con el diario de sus tramos).
+    """
+    registro = _abrir_paso(trabajo, nombre)
+    inicio = time.monotonic()
+    try:
+        yield registro
+    except TrabajoPerdido:
+        raise
+    except Exception as e:
+        _cerrar_paso(trabajo, registro, inicio, e)
+        raise
+    _cerrar_paso(trabajo, registro, inicio)
+
+
+def _guardar(trabajo, *campos):
+    """
+    Guarda esos campos del trabajo y renueva su latido, solo si esta
+    ejecución sigue siendo la dueña (la toma se identifica por `iniciado`).
+    Si el trabajo se dio por abandonado y otro worker lo retomó, lanza
+    TrabajoPerdido en lugar de pisar su estado.
+    """
+    trabajo.latido = timezone.now()
+    guardados = Trabajo.objects.filter(
+        pk=trabajo.pk, estado=Trabajo.EN_CURSO, iniciado=trabajo.iniciado
+    ).update(latido=trabajo.latido, **{campo: getattr(trabajo, campo) for campo in campos})
+    if not guardados:
+        raise TrabajoPerdido(f'Trabajo {trabajo.pk}: retomado por otro worker')
+
+
+@contextmanager
+def _latiendo(trabajo):
+    """
+    Renueva el latido del trabajo cada TRABAJOS_LATIDO segundos mientras
+    dura el bloque, aunque un paso tarde mucho sin guardar nada. Solo deja
+    de latir si el proceso muere o si perdió el trabajo.
+    """
+    intervalo = getattr(settings, 'TRABAJOS_LATIDO', 20)
+    parar = threading.Event()
+
+    def latir():
+        try:
+            while not parar.wait(intervalo):
+                if not Trabajo.objects.filter(
+                    pk=trabajo.pk, estado=Trabajo.EN_CURSO, iniciado=trabajo.iniciado
+                ).update(latido=timezone.now()):
+                    return
+        except Exception as e:
+            logging.error(f'Trabajo {trabajo.pk}: error al renovar el latido: {e}')
+        finally:
+            connection.close()
+
+    hilo = threading.Thread(target=latir, name=f'trabajo-{trabajo.pk}-latido', daemon=True)
+    hilo.start()
+    try:
+        yield
+    finally:
+        parar.set()
+        hilo.join()
+
+
+def ejecutar_trabajo(pk):
+    """
+    Ejecuta un trabajo pendiente. Si otro worker ya lo tomó no hace nada.
+    """
+    try:
+        ahora = timezone.now()
+        tomado = Trabajo.objects.filter(pk=pk, estado=Trabajo.PENDIENTE).update(
+            estado=Trabajo.EN_CURSO, iniciado=ahora, latido=ahora
+        )
+        if not tomado:
+            return
+        trabajo = Trabajo.objects.get(pk=pk)
+        try:
+            with _latiendo(trabajo), prioridad(SEGUNDO_PLANO):
+                trabajo.resultado = MANEJADORES[trabajo.tipo](trabajo, **trabajo.datos)
+        except TrabajoPerdido as e:
+            logging.warning(f'{e}; se abandona esta ejecución.')
+            return
+        except Exception as e:
+            _finalizar(trabajo, e)
+        else:
+            _finalizar(trabajo)
+    except TrabajoPerdido as e:
+        logging.warning(f'{e}; se descarta el resultado de esta ejecución.')
+    finally:
+        # Cada hilo del pool tiene su propia conexión a la base de datos.
+        close_old_connections()
+
+
+def _finalizar(trabajo, error=None):
+    """
+    Guarda el final de una ejecución: completado, fallido o, si un equipo
+    no estaba disponible, de vuelta a la cola.
+    """
+    if isinstance(error, EquiposNoDisponibles):
+        if _reprogramar(trabajo, error):
+            return
+        logging.error(f'Trabajo {trabajo} fallido tras {trabajo.intentos} reintentos: {error}')
+    elif error is not None:
+        logging.error(f'Trabajo {trabajo} fallido: {error}')
+    trabajo.estado = Trabajo.FALLIDO if error is not None else Trabajo.COMPLETADO
+    trabajo.error = str(error) if error is not None else None  # el de un reintento anterior
+    trabajo.finalizado = timezone.now()
+    _guardar(trabajo, 'estado', 'error', 'resultado', 'finalizado')
+
+
+def _reprogramar(trabajo, error):
+    """
+    Devuelve a la cola un trabajo cuyo equipo no estaba disponible, con una
+    espera que se duplica en cada reintento. Lo ya hecho quedó anotado en
+    el diario y no se repetirá. Devuelve False si se agotaron los reintentos.
+    """
+    if trabajo.intentos >= getattr(settings, 'TRABAJOS_REINTENTOS_MAX', 50):
+        return False
+    espera = min(
+        getattr(settings, 'TRABAJOS_REINTENTO_ESPERA', 15) * 2 ** trabajo.intentos,
+        getattr(settings, 'TRABAJOS_REINTENTO_ESPERA_MAX', 600),
+    )
+    trabajo.intentos += 1
+    trabajo.estado = Trabajo.PENDIENTE
+    trabajo.error = str(error)
+    trabajo.reintentar_en = timezone.now() + timedelta(seconds=espera)
+    _guardar(trabajo, 'estado', 'error', 'intentos', 'reintentar_en')
+    logging.warning(f'Trabajo {trabajo}: equipo no disponible, reintento {trabajo.intentos} en {espera}s: {error}')
+    return True
+
+
+def reanudar_pendientes(abandonados_tras=None):
+    """
+    Devuelve a la cola los trabajos en curso que dejaron de latir (p. ej.
+    porque el proceso murió) y ejecuta los pendientes cuyo reintento ya
+    toca. Devuelve cuántos trabajos se procesaron.
+    """
+    abandonados_tras = abandonados_tras or getattr(settings, 'TRABAJOS_ABANDONADOS_TRAS', 120)
+    ahora = timezone.now()
+    limite = ahora - timedelta(seconds=abandonados_tras)
+    # Un solo UPDATE condicional: si varios procesos lo intentan a la vez,
+    # cada trabajo vuelve a la cola una vez, y ejecutar_trabajo() deja que
+    # solo uno lo tome.
+    Trabajo.objects.filter(estado=Trabajo.EN_CURSO, latido__lt=limite).update(
+        estado=Trabajo.PENDIENTE
+    )
+    pendientes = list(
+        Trabajo.objects.filter(estado=Trabajo.PENDIENTE)
+        .filter(Q(reintentar_en__isnull=True) | Q(reintentar_en__lte=ahora))
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    list(_get_executor().map(ejecutar_trabajo, pendientes))
+    return len(pendientes)
+
+
+def _despachar(intervalo):
+    while True:
+        try:
+            reanudar_pendientes()
+        except Exception as e:
+            logging.error(f'Error al reanudar los trabajos pendientes: {e}')
+        finally:
+            close_old_connections()
+        time.sleep(intervalo)
+
+
+def iniciar_despachador():
+    """
+    Arranca (una vez por proceso) el hilo que cada TRABAJOS_INTERVALO
+    segundos ejecuta los trabajos pendientes: los que esperan a que vuelva
+    su equipo y los que dejó a medias un proceso caído. Se llama al
+    arrancar el servidor (gestion_red.wsgi / asgi), así lo pendiente se
+    reanuda sin esperar a que llegue un trabajo nuevo.
+    """
+    global _despachador, _despachador_pid
+    with _despachador_lock:
+        if _despachador is None or _despachador_pid != os.getpid():
+            _despachador = threading.Thread(
+                target=_despachar,
+                args=(getattr(settings, 'TRABAJOS_INTERVALO', 5),),
+                name='trabajos-despachador',
+                daemon=True,
+            )
+            _despachador.start()
+            _despachador_pid = os.getpid()
+
+
+def serializar(trabajo):
+    return {
+        'id': trabajo.pk,
+        'tipo': trabajo.tipo,
+        'estado': trabajo.estado,
+        'pasos': trabajo.pasos,
+        'error': trabajo.error,
+        'resultado': trabajo.resultado,
+        'intentos': trabajo.intentos,
+        'reintentar_en': trabajo.reintentar_en.isoformat() if trabajo.reintentar_en else None,
+        'creado': trabajo.creado.isoformat() if trabajo.creado else None,
+        'iniciado': trabajo.iniciado.isoformat() if trabajo.iniciado else None,
+        'latido': trabajo.latido.isoformat() if trabajo.latido else None,
+        'finalizado': trabajo.finalizado.isoformat() if trabajo.finalizado else None,
+    }
+
+
+# --- Manejadores ---
+
+def _dispositivo(pk):
+    # En `datos` los equipos se guardan por pk; None es el equipo de settings.
+    return Dispositivo.objects.get(pk=pk) if pk is not None else None
+
+
+class _Diario:
+    """
+    Diario de los tramos de un paso en `registro['tramos']`: cada anotación
+    se guarda en la base de datos en el momento (ver
+    orquestacion.ejecutar_en_paralelo).
+    """
+
+    def __init__(self, trabajo, registro):
+        self._trabajo = trabajo
+        self._tramos = registro.setdefault('tramos', {})
+
+    def registro(self, nombre):
+        return self._tramos.get(nombre)
+
+    def anotar(self, informes):
+        self._tramos.update(informes)
+        _guardar(self._trabajo, 'pasos')
+
+
+def _en_paralelo(trabajo, nombre, operacion, *args, **kwargs):
+    # Los tramos corren a la vez; se registra la duración de cada uno.
+    with paso(trabajo, nombre) as registro:
+        try:
+            registro['tramos'] = operacion(*args, diario=_Diario(trabajo, registro), **kwargs)
+        except OperacionFallida as e:
+            registro['tramos'] = e.tramos
+            raise
+
+
+class _DiarioAsync(_Diario):
+    # Para las operaciones de orquestacion_async, que esperan una corrutina.
+
+    async def anotar(self, informes):
+        self._tramos.update(informes)
+        await sync_to_async(_guardar)(self._trabajo, 'pasos')
+
+
+async def ejecutar_en_peticion(trabajo, nombre, operacion, *args, al_completar=None, **kwargs):
+    """
+    Ejecuta dentro de una petición asíncrona un trabajo creado con tomar().
+    `operacion` es la versión de orquestacion_async de la que usa el
+    manejador del tipo, y su diario se anota en el mismo paso `nombre`: si
+    un equipo no está disponible el trabajo vuelve a la cola, y si el
+    proceso muere a mitad deja de latir y reanudar_pendientes() lo retoma;
+    en ambos casos el manejador sigue desde el diario sin repetir lo hecho.
+    El plazo de la operación (OPERACION_TIMEOUT) es bastante menor que
+    TRABAJOS_ABANDONADOS_TRAS, así que no hace falta un latido aparte.
+
+    `al_completar` (opcional, síncrona) aplica en la base de datos lo que
+    el manejador hace tras la operación y devuelve el resultado del trabajo.
+    Devuelve el informe por tramo o lanza la excepción de la operación
+    (EquiposNoDisponibles si el trabajo quedó en la cola).
+    """
+    registro = await sync_to_async(_abrir_paso)(trabajo, nombre)
+    inicio = time.monotonic()
+    try:
+        registro['tramos'] = await operacion(*args, diario=_DiarioAsync(trabajo, registro), **kwargs)
+    except TrabajoPerdido:
+        raise
+    except Exception as e:
+        if isinstance(e, OperacionFallida):
+            registro['tramos'] = e.tramos
+        await sync_to_async(_cerrar_paso)(trabajo, registro, inicio, e)
+        await sync_to_async(_finalizar)(trabajo, e)
+        raise
+    await sync_to_async(_cerrar_paso)(trabajo, registro, inicio)
+    try:
+        if al_completar is not None:
+            trabajo.resultado = await sync_to_async(al_completar)()
+    except Exception as e:
+        await sync_to_async(_finalizar)(trabajo, e)
+        raise
+    await sync_to_async(_finalizar)(trabajo)
+    return registro['tramos']
+
+
+@manejador('crear_cliente')
+def _crear_cliente(trabajo, nombre, onu_sn, plan_servicio, pppoe_password, olt=None, router=None, cliente=None):
+    # `cliente`: el Cliente ya guardado por la vista web; si los equipos
+    # rechazan el alta se borra, como hacía la vista al aprovisionar en línea.
+    try:
+        _en_paralelo(
+            trabajo, 'olt+mikrotik', orquestacion.aprovisionar_cliente,
+            nombre, onu_sn, plan_servicio, pppoe_password,
+            olt=_dispositivo(olt), router=_dispositivo(router),
+        )
+    except OperacionFallida as e:
+        if cliente is not None and not isinstance(e, EquiposNoDisponibles):
+            Cliente.objects.filter(pk=cliente).delete()
+            logging.error(f'Alta de {nombre} rechazada por los equipos, cliente eliminado: {e}')
+        raise
+    logging.info(f"Cliente {nombre} aprovisionado en OLT y MikroTik.")
+
+
+@manejador('desactivar_cliente')
+def _desactivar_cliente(trabajo, nombre, onu_sn, olt=None, router=None, cliente=None):
+    # `cliente`: el Cliente de la vista web, que se marca inactivo cuando
+    # los equipos lo confirman.
+    _en_paralelo(
+        trabajo, 'olt+mikrotik', orquestacion.desactivar_cliente,
+        nombre, onu_sn, olt=_dispositivo(olt), router=_dispositivo(router),
+    )
+    if cliente is not None:
+        Cliente.objects.filter(pk=cliente).update(
+            activo=False, fecha_desactivacion=timezone.localdate(), actualizado=timezone.now(),
+        )
+    logging.info(f"Cliente {nombre} desactivado en MikroTik y OLT.")
+
+
+@manejador('reconectar_cliente')
+def _reconectar_cliente(trabajo, nombre, onu_sn, olt=None, router=None):
+    _en_paralelo(
+        trabajo, 'olt+mikrotik', orquestacion.reconectar_cliente,
+        nombre, onu_sn, olt=_dispositivo(olt), router=_dispositivo(router),
+    )
+    logging.info(f"Cliente {nombre} reconectado en MikroTik y OLT a través de la API.")
+
+
+@manejador('eliminar_cliente')
+def _eliminar_cliente(trabajo, nombre, onu_sn, olt=None, router=None, cliente=None):
+    # El Cliente se borra solo cuando los equipos confirman la baja.
+    _en_paralelo(
+        trabajo, 'olt+mikrotik', orquestacion.eliminar_cliente,
+        nombre, onu_sn, olt=_dispositivo(olt), router=_dispositivo(router),
+    )
+    if cliente is not None:
+        Cliente.objects.filter(pk=cliente).delete()
+    logging.info(f"Cliente {nombre} eliminado de MikroTik y OLT.")
+
+
+@manejador('migrar_olt')
+def _migrar_olt(trabajo, cliente, olt_destino, interfaz):
+    cliente = Cliente.objects.select_related('olt').get(pk=cliente)
+    destino = _dispositivo(olt_destino)
+    _en_paralelo(
+        trabajo, 'olt_origen+olt_destino', orquestacion.migrar_onu,
+        cliente.onu_sn, cliente.olt, destino, interfaz,
+    )
+    return aplicar_migracion(cliente, destino)
+
+
+def aplicar_migracion(cliente, destino):
+    """
+    Pasa el cliente a la OLT `destino` una vez migrada su ONU y devuelve el
+    resultado del trabajo migrar_olt.
+    """
+    Cliente.objects.filter(pk=cliente.pk).update(olt=destino, actualizado=timezone.now())
+    logging.info(f"ONU {cliente.onu_sn} migrada de {cliente.olt or 'la OLT por defecto'} a {destino}.")
+    return {
+        'cliente': cliente.pk,
+        'olt_origen': str(cliente.olt) if cliente.olt else None,
+        'olt_destino': str(destino),
+    }
+
+
+@manejador('corte_masivo')
+def _corte_masivo(trabajo, accion, ids):
+    # El progreso se guarda tras cada lote para poder seguirlo desde la API.
+    # Si el proceso muere, el trabajo se reanuda y solo procesa lo que faltaba.
+    with paso(trabajo, accion) as registro:
+        def progreso(informe):
+            registro['progreso'] = {
+                clave: informe[clave] for clave in ('total', 'procesados', 'completados', 'fallidos')
+            }
+            _guardar(trabajo, 'pasos')
+        return cortes.ejecutar_corte(accion, ids, progreso)
+
+
+@manejador('reconciliar')
+def _reconciliar(trabajo, categorias):
+    with paso(trabajo, 'comparar'):
+        informe, contexto = reconciliacion.comparar()
+    with paso(trabajo, 'aplicar'):
+        informe['corregidos'] = reconciliacion.aplicar(contexto, categorias)
+    return informe
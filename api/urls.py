@@ -1,12 +1,25 @@
 # api/urls.py
 
 from django.urls import path
-from . import views
+from . import views, views_async
 
 urlpatterns = [
     path('crear/', views.crear_cliente_api, name='crear_cliente_api'),
+    path('crear_lote/', views.crear_lote_api, name='crear_lote_api'),
     path('desactivar/', views.desactivar_cliente_api, name='desactivar_cliente_api'),
     path('reconectar/', views.reconectar_cliente_api, name='reconectar_cliente_api'),
+    path('corte/', views.corte_masivo_api, name='corte_masivo_api'),
     path('cambiar_puerto/', views.cambiar_puerto_olt_api, name='cambiar_puerto_olt_api'),
     path('migrar_olt/', views.migrar_cliente_olt_api, name='migrar_cliente_olt_api'),
+    path('reconciliar/', views.reconciliar_api, name='reconciliar_api'),
+    path('estado/', views.estado_clientes_api, name='estado_clientes_api'),
+    path('colas/', views.colas_equipos_api, name='colas_equipos_api'),
+    path('salud/', views.salud_equipos_api, name='salud_equipos_api'),
+    path('jobs/<int:pk>/', views.estado_trabajo_api, name='estado_trabajo_api'),
+    # Versiones asíncronas (ASGI): operan durante la petición y responden al terminar.
+    path('async/crear/', views_async.crear_cliente_async_api, name='crear_cliente_async_api'),
+    path('async/desactivar/', views_async.desactivar_cliente_async_api, name='desactivar_cliente_async_api'),
+    path('async/reconectar/', views_async.reconectar_cliente_async_api, name='reconectar_cliente_async_api'),
+    path('async/cambiar_puerto/', views_async.cambiar_puerto_olt_async_api, name='cambiar_puerto_olt_async_api'),
+    path('async/migrar_olt/', views_async.migrar_cliente_olt_async_api, name='migrar_cliente_olt_async_api'),
 ]
\ No newline at end of file
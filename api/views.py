@@ -1,23 +1,93 @@
 # api/views.py
 
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
 from django.views.decorators.csrf import csrf_exempt
+from collections import defaultdict
 import json
-from gestion_red.connect import connect_mikrotik, connect_olt, execute_olt_command
-from librouteros.query import Key
+from clientes.cortes import ACCIONES as ACCIONES_CORTE
+from clientes.models import Cliente, Dispositivo
+from clientes.reconciliacion import CATEGORIAS, reconciliar
+from gestion_red import metricas
+from gestion_red.circuito import circuitos
+from gestion_red.connect import connect_olt, execute_olt_script, pools
+from gestion_red.operaciones import INTERFAZ_PON_POR_DEFECTO
+from gestion_red.pool import CircuitoAbierto, PlazoAgotado, PoolTimeout
+from gestion_red.sesiones_ppp import estados_sesiones
+
+from .idempotencia import idempotente
+from .lotes import aprovisionar_lote, leer_lote
+from .models import Trabajo
+from .trabajos import encolar, serializar
 
 from django.conf import settings 
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+def _respuesta_trabajo(request, trabajo, message):
+    """
+    Respuesta 202 para una operación encolada, con la URL donde consultar su estado.
+    """
+    url = request.build_absolute_uri(reverse('estado_trabajo_api', args=[trabajo.pk]))
+    response = JsonResponse({
+        'success': True,
+        'message': message,
+        'job_id': trabajo.pk,
+        'status_url': url,
+    }, status=202)
+    response['Location'] = url
+    return response
+
+
+def _respuesta_ocupado(error):
+    """
+    Respuesta 503 cuando el equipo tiene todas sus sesiones ocupadas y la
+    petición no obtuvo turno, o cuando su circuito está abierto porque
+    viene fallando; 504 si se agotó el plazo de la petición.
+    """
+    if isinstance(error, PlazoAgotado):
+        return JsonResponse({
+            'success': False,
+            'message': f'El equipo no respondió a tiempo: {error}',
+        }, status=504)
+    if isinstance(error, CircuitoAbierto):
+        message = f'Equipo no disponible, reintente más tarde: {error}'
+        reintento = getattr(settings, 'CIRCUITO_ESPERA', 30)
+    else:
+        message = f'Equipo ocupado, reintente en unos segundos: {error}'
+        reintento = 5
+    response = JsonResponse({'success': False, 'message': message}, status=503)
+    response['Retry-After'] = str(reintento)
+    return response
+
+
+def _dispositivos(data, onu_sn):
+    """
+    Devuelve los pk de (olt, router) para una operación: los indicados por
+    nombre en el JSON ("olt", "router") o, si no, los del cliente con esa
+    ONU. None significa el equipo configurado en settings. Lanza
+    Dispositivo.DoesNotExist si se indica un equipo que no existe.
+    """
+    cliente = Cliente.objects.filter(onu_sn=onu_sn).values('olt', 'router').first() or {}
+    pks = []
+    for campo, tipo in (('olt', Dispositivo.OLT), ('router', Dispositivo.MIKROTIK)):
+        if data.get(campo):
+            pks.append(Dispositivo.objects.get(nombre=data[campo], tipo=tipo).pk)
+        else:
+            pks.append(cliente.get(campo))
+    return pks
+
+
 @csrf_exempt
 @require_POST
+@idempotente
 def crear_cliente_api(request):
     """
     Endpoint para crear un cliente en MikroTik y OLT a través de la API.
-    Recibe datos en formato JSON.
+    Recibe datos en formato JSON. El aprovisionamiento se ejecuta en segundo
+    plano; la respuesta (202) incluye el id del trabajo.
     """
     try:
         data = json.loads(request.body)
@@ -29,54 +99,34 @@ def crear_cliente_api(request):
         if not all([nombre, onu_sn, plan_servicio]):
             return JsonResponse({'success': False, 'message': 'Faltan parámetros requeridos.'}, status=400)
 
-        api = None
-        tn = None
-        try:
-            # Configuración en la OLT (REAL)
-            logging.info("Iniciando aprovisionamiento en OLT...")
-            tn = connect_olt()
-            
-            # Comandos de ejemplo para la OLT ZTE
-            execute_olt_command(tn, "configure terminal")
-            execute_olt_command(tn, "interface gpon_olt-1/1/1")
-            execute_olt_command(tn, f"onu pre-config-mode serial-number {onu_sn}")
-            execute_olt_command(tn, "exit")
-            
-            logging.info(f"ONU {onu_sn} pre-configurada en OLT.")
-
-            # Configuración en el MikroTik
-            api = connect_mikrotik()
-            secrets = api.path('ppp', 'secret')
-            secrets.add(
-                name=nombre, 
-                password=pppoe_password, 
-                service='pppoe', 
-                profile=plan_servicio
-            )
-            logging.info(f"Cliente {nombre} creado en MikroTik a través de la API.")
+        olt, router = _dispositivos(data, onu_sn)
 
-        except Exception as e:
-            logging.error(f'Error al configurar equipos para {nombre}: {e}')
-            return JsonResponse({'success': False, 'message': f'Error al configurar equipos: {e}'}, status=500)
-
-        finally:
-            if api:
-                api.close()
-            if tn:
-                tn.close()
-
-        return JsonResponse({'success': True, 'message': 'Cliente creado y aprovisionado con éxito.'})
+        logging.info(f"Encolando aprovisionamiento del cliente {nombre}...")
+        trabajo = encolar(
+            'crear_cliente',
+            nombre=nombre,
+            onu_sn=onu_sn,
+            plan_servicio=plan_servicio,
+            pppoe_password=pppoe_password,
+            olt=olt,
+            router=router,
+        )
+        return _respuesta_trabajo(request, trabajo, 'Aprovisionamiento del cliente en curso.')
 
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'message': 'JSON inválido.'}, status=400)
+    except Dispositivo.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Dispositivo desconocido.'}, status=400)
     except Exception as e:
         return JsonResponse({'success': False, 'message': f'Error inesperado: {e}'}, status=500)
 
 @csrf_exempt
 @require_POST
+@idempotente
 def desactivar_cliente_api(request):
     """
     Endpoint para desactivar un cliente en MikroTik y OLT a través de la API.
+    La desactivación se ejecuta en segundo plano (respuesta 202).
     """
     try:
         data = json.loads(request.body)
@@ -86,47 +136,25 @@ def desactivar_cliente_api(request):
         if not all([nombre, onu_sn]):
             return JsonResponse({'success': False, 'message': 'Faltan parámetros requeridos.'}, status=400)
 
-        api = None
-        tn = None
-        try:
-            # Desactivar en MikroTik
-            api = connect_mikrotik()
-            secrets = api.path('ppp', 'secret')
-            user = secrets.get(query={Key('name'): nombre})
-            if user:
-                secrets.disable(user[0]['.id'])
-            logging.info(f"Cliente {nombre} desactivado en MikroTik a través de la API.")
-
-            # Desactivar en la OLT
-            logging.info(f"Iniciando desactivación en OLT para cliente {nombre}...")
-            tn = connect_olt()
-            execute_olt_command(tn, "configure terminal")
-            execute_olt_command(tn, f"no onu service {onu_sn}")
-            execute_olt_command(tn, "exit")
-            logging.info(f"Servicio de ONU {onu_sn} desactivado en OLT.")
-
-        except Exception as e:
-            logging.error(f'Error al desactivar cliente {nombre}: {e}')
-            return JsonResponse({'success': False, 'message': f'Error al desactivar cliente: {e}'}, status=500)
-        
-        finally:
-            if api:
-                api.close()
-            if tn:
-                tn.close()
-
-        return JsonResponse({'success': True, 'message': 'Cliente desactivado con éxito.'})
+        logging.info(f"Encolando desactivación del cliente {nombre}...")
+        olt, router = _dispositivos(data, onu_sn)
+        trabajo = encolar('desactivar_cliente', nombre=nombre, onu_sn=onu_sn, olt=olt, router=router)
+        return _respuesta_trabajo(request, trabajo, 'Desactivación del cliente en curso.')
 
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'message': 'JSON inválido.'}, status=400)
+    except Dispositivo.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Dispositivo desconocido.'}, status=400)
     except Exception as e:
         return JsonResponse({'success': False, 'message': f'Error inesperado: {e}'}, status=500)
 
 @csrf_exempt
 @require_POST
+@idempotente
 def reconectar_cliente_api(request):
     """
     Endpoint para reconectar un cliente en MikroTik y OLT a través de la API.
+    La reconexión se ejecuta en segundo plano (respuesta 202).
     """
     try:
         data = json.loads(request.body)
@@ -136,36 +164,42 @@ def reconectar_cliente_api(request):
         if not all([nombre, onu_sn]):
             return JsonResponse({'success': False, 'message': 'Faltan parámetros requeridos.'}, status=400)
 
-        api = None
-        tn = None
-        try:
-            # Reconectar en MikroTik
-            api = connect_mikrotik()
-            secrets = api.path('ppp', 'secret')
-            user = secrets.get(query={Key('name'): nombre})
-            if user:
-                secrets.enable(user[0]['.id'])
-            logging.info(f"Cliente {nombre} reconectado en MikroTik a través de la API.")
-
-            # Reconectar en la OLT
-            logging.info(f"Iniciando reconexión en OLT para cliente {nombre}...")
-            tn = connect_olt()
-            execute_olt_command(tn, "configure terminal")
-            execute_olt_command(tn, f"onu service {onu_sn}")
-            execute_olt_command(tn, "exit")
-            logging.info(f"Servicio de ONU {onu_sn} reconectado en OLT.")
+        logging.info(f"Encolando reconexión del cliente {nombre}...")
+        olt, router = _dispositivos(data, onu_sn)
+        trabajo = encolar('reconectar_cliente', nombre=nombre, onu_sn=onu_sn, olt=olt, router=router)
+        return _respuesta_trabajo(request, trabajo, 'Reconexión del cliente en curso.')
 
-        except Exception as e:
-            logging.error(f'Error al reconectar cliente {nombre}: {e}')
-            return JsonResponse({'success': False, 'message': f'Error al reconectar cliente: {e}'}, status=500)
-        
-        finally:
-            if api:
-                api.close()
-            if tn:
-                tn.close()
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'JSON inválido.'}, status=400)
+    except Dispositivo.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Dispositivo desconocido.'}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'message': f'Error inesperado: {e}'}, status=500)
+
+
+@csrf_exempt
+@require_POST
+@idempotente
+def corte_masivo_api(request):
+    """
+    Endpoint para suspender o reconectar muchos clientes a la vez (p. ej. el
+    día de corte). Recibe {"accion": "suspender"|"reconectar", "ids": [...]}
+    y encola el corte (respuesta 202); el progreso se consulta en la URL del
+    trabajo.
+    """
+    try:
+        data = json.loads(request.body)
+        accion = data.get('accion')
+        ids = data.get('ids')
 
-        return JsonResponse({'success': True, 'message': 'Cliente reconectado con éxito.'})
+        if accion not in ACCIONES_CORTE or not isinstance(ids, list) or not ids:
+            return JsonResponse({'success': False, 'message': 'Faltan parámetros requeridos.'}, status=400)
+        if not all(isinstance(pk, int) for pk in ids):
+            return JsonResponse({'success': False, 'message': 'Los ids deben ser números enteros.'}, status=400)
+
+        logging.info(f"Encolando corte masivo ({accion}) de {len(ids)} cliente(s)...")
+        trabajo = encolar('corte_masivo', accion=accion, ids=ids)
+        return _respuesta_trabajo(request, trabajo, f'Corte masivo ({accion}) de {len(ids)} cliente(s) en curso.')
 
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'message': 'JSON inválido.'}, status=400)
@@ -175,6 +209,168 @@ def reconectar_cliente_api(request):
 
 @csrf_exempt
 @require_POST
+@idempotente
+def crear_lote_api(request):
+    """
+    Endpoint para aprovisionar un lote de clientes. Recibe una lista JSON o un
+    CSV (Content-Type: text/csv) con las mismas columnas que crear/ y devuelve
+    en streaming (NDJSON) el resultado de cada fila a medida que se procesa.
+    """
+    formato = 'csv' if request.content_type == 'text/csv' else 'json'
+    try:
+        filas = leer_lote(request.body.decode('utf-8'), formato)
+    except (ValueError, UnicodeDecodeError) as e:
+        return JsonResponse({'success': False, 'message': f'Lote inválido: {e}'}, status=400)
+
+    logging.info(f"Aprovisionando lote de {len(filas)} cliente(s) a través de la API.")
+    resultados = (json.dumps(resultado) + '\n' for resultado in aprovisionar_lote(filas))
+    return StreamingHttpResponse(resultados, content_type='application/x-ndjson')
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+def estado_clientes_api(request):
+    """
+    Endpoint para consultar si varios clientes están en línea. Recibe
+    {"nombres": [...]} por POST o ?nombres=a,b,c por GET y responde desde el
+    índice de sesiones PPP, sin consultar al router.
+    """
+    try:
+        if request.method == 'POST':
+            nombres = json.loads(request.body).get('nombres') or []
+        else:
+            nombres = [n for n in request.GET.get('nombres', '').split(',') if n]
+
+        if not isinstance(nombres, list):
+            return JsonResponse({'success': False, 'message': 'Faltan parámetros requeridos.'}, status=400)
+
+        # Cada router tiene su propio índice; los nombres sin cliente van al de settings.
+        routers = {
+            cliente.nombre: cliente.router
+            for cliente in Cliente.objects.filter(nombre__in=nombres).select_related('router').only('nombre', 'router')
+        }
+        por_router = defaultdict(list)
+        for nombre in nombres:
+            por_router[routers.get(nombre)].append(nombre)
+
+        estados = {}
+        for router, grupo in por_router.items():
+            estados_router = estados_sesiones(grupo, router)
+            if not estados_router:
+                return JsonResponse({'success': False, 'message': 'El índice de sesiones aún no está sincronizado.'}, status=503)
+            estados.update(estados_router)
+
+        return JsonResponse({'success': True, 'clientes': estados})
+
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'JSON inválido.'}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'message': f'Error inesperado: {e}'}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+@idempotente
+def reconciliar_api(request):
+    """
+    Endpoint de reconciliación entre clientes, secrets de MikroTik y ONUs de
+    la OLT. GET devuelve el informe de diferencias. POST con
+    {"aplicar": [categorías]} encola la corrección y responde 202.
+    """
+    try:
+        if request.method == 'GET':
+            return JsonResponse({'success': True, 'informe': reconciliar()})
+
+        categorias = json.loads(request.body).get('aplicar') or []
+        if not isinstance(categorias, list) or not categorias or not set(categorias) <= set(CATEGORIAS):
+            return JsonResponse({
+                'success': False,
+                'message': f'Indique en "aplicar" una o más categorías: {", ".join(CATEGORIAS)}.'
+            }, status=400)
+
+        trabajo = encolar('reconciliar', categorias=categorias)
+        return _respuesta_trabajo(request, trabajo, 'Reconciliación en curso.')
+
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'JSON inválido.'}, status=400)
+    except (PoolTimeout, PlazoAgotado) as e:
+        return _respuesta_ocupado(e)
+    except Exception as e:
+        return JsonResponse({'success': False, 'message': f'Error inesperado: {e}'}, status=500)
+
+
+@require_GET
+def colas_equipos_api(request):
+    """
+    Endpoint con el estado de los pools de conexiones de este proceso: por
+    equipo, sesiones abiertas y en uso, peticiones esperando (por
+    prioridad), tiempos de espera y peticiones rechazadas.
+    """
+    return JsonResponse({'success': True, 'equipos': [pool.stats() for pool in pools()]})
+
+
+@require_GET
+def metricas_api(request):
+    """
+    Endpoint /metrics en formato Prometheus: latencia, errores y llamadas en
+    curso por equipo y tipo de operación, y el estado de los pools de este
+    proceso.
+    """
+    permitidas = getattr(settings, 'METRICAS_IPS_PERMITIDAS', None)
+    if permitidas is not None and request.META.get('REMOTE_ADDR') not in permitidas:
+        return HttpResponse(status=403)
+    return HttpResponse(
+        metricas.exportar(pools(), circuitos().values()), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+@require_GET
+def salud_equipos_api(request):
+    """
+    Endpoint con la salud de cada equipo que este proceso ha usado: estado
+    de su circuito (cerrado, semiabierto, abierto), fallas seguidas, último
+    error y el estado de su pool.
+    """
+    nombres = {
+        (d.tipo, d.host, d.puerto): d.nombre
+        for d in Dispositivo.objects.only('nombre', 'tipo', 'host', 'puerto')
+    }
+    por_circuito = defaultdict(list)
+    for pool in pools():
+        if pool.circuito is not None:
+            stats = pool.stats()
+            del stats['circuito']
+            por_circuito[pool.circuito].append(stats)
+    equipos = []
+    for (tipo, host, puerto), circuito in sorted(circuitos().items()):
+        stats = circuito.stats()
+        equipos.append({
+            'tipo': tipo,
+            'host': host,
+            'puerto': puerto,
+            'dispositivo': nombres.get((tipo, host, puerto)),
+            'disponible': stats['estado'] != 'abierto',
+            'circuito': stats,
+            'pools': por_circuito[circuito],
+        })
+    return JsonResponse({'success': True, 'equipos': equipos})
+
+
+@require_GET
+def estado_trabajo_api(request, pk):
+    """
+    Endpoint para consultar el estado, los tiempos de cada paso y los errores
+    de un trabajo encolado por la API.
+    """
+    trabajo = Trabajo.objects.filter(pk=pk).first()
+    if trabajo is None:
+        return JsonResponse({'success': False, 'message': 'Trabajo no encontrado.'}, status=404)
+    return JsonResponse({'success': True, 'job': serializar(trabajo)})
+
+
+@csrf_exempt
+@require_POST
+@idempotente
 def cambiar_puerto_olt_api(request):
     """
     Endpoint para cambiar un cliente de puerto PON en la OLT.
@@ -187,24 +383,26 @@ def cambiar_puerto_olt_api(request):
         if not all([onu_sn, nuevo_puerto]):
             return JsonResponse({'success': False, 'message': 'Faltan parámetros requeridos.'}, status=400)
             
-        tn = None
         try:
             logging.info(f"Iniciando cambio de puerto para la ONU {onu_sn} al puerto {nuevo_puerto} a través de la API.")
-            tn = connect_olt()
             # Comando de ejemplo para cambiar de puerto. Debe adaptarse al modelo de tu OLT.
             comando = f'pon port change onu {onu_sn} to {nuevo_puerto}'
-            execute_olt_command(tn, "configure terminal")
-            execute_olt_command(tn, comando)
-            execute_olt_command(tn, "exit")
+            cliente = Cliente.objects.select_related('olt').filter(onu_sn=onu_sn).first()
+            with connect_olt(cliente.olt if cliente else None) as tn:
+                execute_olt_script(tn, [
+                    "configure terminal",
+                    comando,
+                    "exit",
+                ])
             
             logging.info(f"ONU {onu_sn} migrada al puerto {nuevo_puerto} con éxito.")
+        except (PoolTimeout, PlazoAgotado) as e:
+            logging.warning(f'OLT ocupada o sin respuesta, no se cambió de puerto la ONU {onu_sn}: {e}')
+            return _respuesta_ocupado(e)
         except Exception as e:
             logging.error(f'Error al cambiar de puerto en la OLT para {onu_sn}: {e}')
             return JsonResponse({'success': False, 'message': f'Error en la OLT: {e}'}, status=500)
-        finally:
-            if tn:
-                tn.close()
-                
+
         return JsonResponse({'success': True, 'message': f'ONU {onu_sn} cambiada al puerto {nuevo_puerto} con éxito.'})
 
     except json.JSONDecodeError:
@@ -214,28 +412,43 @@ def cambiar_puerto_olt_api(request):
 
 @csrf_exempt
 @require_POST
+@idempotente
 def migrar_cliente_olt_api(request):
     """
-    Endpoint para migrar un cliente entre diferentes OLTs.
+    Endpoint para migrar un cliente entre diferentes OLTs. Recibe el
+    "onu_sn" del cliente y la OLT de destino por nombre ("olt_destino") o por
+    IP ("nueva_olt_ip"), y opcionalmente la "interfaz" PON de destino. La
+    baja en la OLT de origen y el alta en la de destino se ejecutan en
+    segundo plano y en paralelo (respuesta 202).
     """
     try:
         data = json.loads(request.body)
         onu_sn = data.get('onu_sn')
+        olt_destino = data.get('olt_destino')
         nueva_olt_ip = data.get('nueva_olt_ip')
 
-        if not all([onu_sn, nueva_olt_ip]):
+        if not onu_sn or not (olt_destino or nueva_olt_ip):
             return JsonResponse({'success': False, 'message': 'Faltan parámetros requeridos.'}, status=400)
-            
-        logging.info(f"Iniciando migración de la ONU {onu_sn} a la nueva OLT en {nueva_olt_ip}.")
-        
-        # Este es un punto de inicio. La lógica para conectarse a una OLT diferente
-        # requiere que las credenciales para la nueva OLT estén disponibles.
-        # Por ahora, se simula el proceso.
-        
-        # Si la lógica fuera exitosa:
-        # return JsonResponse({'success': True, 'message': f'ONU {onu_sn} migrada con éxito a la OLT en {nueva_olt_ip}.'})
 
-        return JsonResponse({'success': False, 'message': 'Funcionalidad de migración de OLT no implementada completamente en el back-end de AdL.'}, status=501)
+        cliente = Cliente.objects.filter(onu_sn=onu_sn).first()
+        if cliente is None:
+            return JsonResponse({'success': False, 'message': 'Cliente no encontrado.'}, status=404)
+
+        olts = Dispositivo.objects.filter(tipo=Dispositivo.OLT, activo=True)
+        destino = olts.filter(nombre=olt_destino).first() if olt_destino else olts.filter(host=nueva_olt_ip).first()
+        if destino is None:
+            return JsonResponse({'success': False, 'message': 'OLT de destino desconocida.'}, status=400)
+        if destino.pk == cliente.olt_id:
+            return JsonResponse({'success': False, 'message': f'La ONU {onu_sn} ya está en la OLT {destino}.'}, status=400)
+
+        logging.info(f"Encolando migración de la ONU {onu_sn} a la OLT {destino}.")
+        trabajo = encolar(
+            'migrar_olt',
+            cliente=cliente.pk,
+            olt_destino=destino.pk,
+            interfaz=data.get('interfaz') or INTERFAZ_PON_POR_DEFECTO,
+        )
+        return _respuesta_trabajo(request, trabajo, f'Migración de la ONU {onu_sn} a la OLT {destino} en curso.')
 
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'message': 'JSON inválido.'}, status=400)
@@ -0,0 +1,265 @@
+# api/views_async.py
+# Versiones asíncronas de los endpoints que operan sobre los equipos. Guardan
+# el mismo trabajo que los síncronos, pero lo ejecutan durante la petición
+# con E/S asyncio (Telnet a la OLT y API de MikroTik), sin ocupar un hilo
+# por petición: servidas por ASGI (gestion_red/asgi.py), un proceso puede
+# atender cientos de operaciones en curso a la vez. El diario del trabajo
+# se anota igual que en la cola, así que si un equipo no está disponible o
+# el proceso muere, un worker lo termina (ver trabajos.ejecutar_en_peticion).
+
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from clientes.models import Cliente, Dispositivo
+from gestion_red import orquestacion_async as orquestacion
+from gestion_red.connect_async import connect_olt_async, execute_olt_script_async
+from gestion_red.operaciones import INTERFAZ_PON_POR_DEFECTO
+from gestion_red.pool import PlazoAgotado, PoolTimeout
+
+from .idempotencia import idempotente
+from .trabajos import TrabajoPerdido, aplicar_migracion, ejecutar_en_peticion, tomar
+from .views import _respuesta_ocupado, _respuesta_trabajo
+
+
+async def _dispositivos(data, onu_sn):
+    """
+    Igual que views._dispositivos(), pero devuelve los Dispositivos (olt,
+    router) en lugar de sus pk.
+    """
+    cliente = await Cliente.objects.select_related('olt', 'router').filter(onu_sn=onu_sn).afirst()
+    equipos = []
+    for campo, tipo in (('olt', Dispositivo.OLT), ('router', Dispositivo.MIKROTIK)):
+        if data.get(campo):
+            equipos.append(await Dispositivo.objects.aget(nombre=data[campo], tipo=tipo))
+        else:
+            equipos.append(getattr(cliente, campo) if cliente else None)
+    return equipos
+
+
+def _pk(dispositivo):
+    return dispositivo.pk if dispositivo is not None else None
+
+
+async def _operar(request, trabajo, descripcion, paso, operacion, *args, **kwargs):
+    """
+    Ejecuta el trabajo con una operación de orquestacion_async (ver
+    trabajos.ejecutar_en_peticion) y devuelve la respuesta: 200 con el
+    informe por tramo, 502 si algún equipo la rechazó (ya revertido lo que
+    se pudo) o 202, como la versión síncrona, si quedó en la cola porque
+    algún equipo no estaba disponible.
+    """
+    try:
+        tramos = await ejecutar_en_peticion(trabajo, paso, operacion, *args, **kwargs)
+    except orquestacion.EquiposNoDisponibles as e:
+        logging.warning(f'No se pudo {descripcion} ahora, queda en la cola: {e}')
+        return _respuesta_trabajo(request, trabajo, 'Equipo no disponible; la operación sigue en la cola.')
+    except TrabajoPerdido:
+        return _respuesta_trabajo(request, trabajo, 'La operación sigue en curso en un worker.')
+    except orquestacion.OperacionFallida as e:
+        logging.error(f'Error al {descripcion}: {e}')
+        return JsonResponse({
+            'success': False, 'message': f'Error al {descripcion}: {e}', 'job_id': trabajo.pk, 'tramos': e.tramos,
+        }, status=502)
+    return JsonResponse({
+        'success': True, 'message': f'Operación completada: {descripcion}.', 'job_id': trabajo.pk, 'tramos': tramos,
+    })
+
+
+@csrf_exempt
+@require_POST
+@idempotente
+async def crear_cliente_async_api(request):
+    """
+    Endpoint asíncrono para crear un cliente en MikroTik y OLT. Recibe los
+    mismos datos que crear_cliente_api, pero responde al terminar.
+    """
+    try:
+        data = json.loads(request.body)
+        nombre = data.get('nombre')
+        onu_sn = data.get('onu_sn')
+        plan_servicio = data.get('plan_servicio')
+        pppoe_password = data.get('pppoe_password', 'password_generada')
+
+        if not all([nombre, onu_sn, plan_servicio]):
+            return JsonResponse({'success': False, 'message': 'Faltan parámetros requeridos.'}, status=400)
+
+        olt, router = await _dispositivos(data, onu_sn)
+        logging.info(f"Aprovisionando al cliente {nombre} (asíncrono)...")
+        trabajo = await sync_to_async(tomar)(
+            'crear_cliente',
+            nombre=nombre,
+            onu_sn=onu_sn,
+            plan_servicio=plan_servicio,
+            pppoe_password=pppoe_password,
+            olt=_pk(olt),
+            router=_pk(router),
+        )
+        return await _operar(
+            request, trabajo, f'aprovisionar al cliente {nombre}', 'olt+mikrotik', orquestacion.aprovisionar_cliente,
+            nombre, onu_sn, plan_servicio, pppoe_password, olt=olt, router=router,
+        )
+
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'JSON inválido.'}, status=400)
+    except Dispositivo.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Dispositivo desconocido.'}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'message': f'Error inesperado: {e}'}, status=500)
+
+
+@csrf_exempt
+@require_POST
+@idempotente
+async def desactivar_cliente_async_api(request):
+    """
+    Endpoint asíncrono para desactivar un cliente en MikroTik y OLT.
+    """
+    try:
+        data = json.loads(request.body)
+        nombre = data.get('nombre')
+        onu_sn = data.get('onu_sn')
+
+        if not all([nombre, onu_sn]):
+            return JsonResponse({'success': False, 'message': 'Faltan parámetros requeridos.'}, status=400)
+
+        olt, router = await _dispositivos(data, onu_sn)
+        logging.info(f"Desactivando al cliente {nombre} (asíncrono)...")
+        trabajo = await sync_to_async(tomar)(
+            'desactivar_cliente', nombre=nombre, onu_sn=onu_sn, olt=_pk(olt), router=_pk(router),
+        )
+        return await _operar(
+            request, trabajo, f'desactivar al cliente {nombre}', 'olt+mikrotik', orquestacion.desactivar_cliente,
+            nombre, onu_sn, olt=olt, router=router,
+        )
+
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'JSON inválido.'}, status=400)
+    except Dispositivo.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Dispositivo desconocido.'}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'message': f'Error inesperado: {e}'}, status=500)
+
+
+@csrf_exempt
+@require_POST
+@idempotente
+async def reconectar_cliente_async_api(request):
+    """
+    Endpoint asíncrono para reconectar un cliente en MikroTik y OLT.
+    """
+    try:
+        data = json.loads(request.body)
+        nombre = data.get('nombre')
+        onu_sn = data.get('onu_sn')
+
+        if not all([nombre, onu_sn]):
+            return JsonResponse({'success': False, 'message': 'Faltan parámetros requeridos.'}, status=400)
+
+        olt, router = await _dispositivos(data, onu_sn)
+        logging.info(f"Reconectando al cliente {nombre} (asíncrono)...")
+        trabajo = await sync_to_async(tomar)(
+            'reconectar_cliente', nombre=nombre, onu_sn=onu_sn, olt=_pk(olt), router=_pk(router),
+        )
+        return await _operar(
+            request, trabajo, f'reconectar al cliente {nombre}', 'olt+mikrotik', orquestacion.reconectar_cliente,
+            nombre, onu_sn, olt=olt, router=router,
+        )
+
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'JSON inválido.'}, status=400)
+    except Dispositivo.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Dispositivo desconocido.'}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'message': f'Error inesperado: {e}'}, status=500)
+
+
+@csrf_exempt
+@require_POST
+@idempotente
+async def cambiar_puerto_olt_async_api(request):
+    """
+    Endpoint asíncrono para cambiar un cliente de puerto PON en la OLT. Es
+    un solo comando en un equipo: como la versión síncrona, no pasa por un
+    trabajo.
+    """
+    try:
+        data = json.loads(request.body)
+        onu_sn = data.get('onu_sn')
+        nuevo_puerto = data.get('nuevo_puerto')
+
+        if not all([onu_sn, nuevo_puerto]):
+            return JsonResponse({'success': False, 'message': 'Faltan parámetros requeridos.'}, status=400)
+
+        cliente = await Cliente.objects.select_related('olt').filter(onu_sn=onu_sn).afirst()
+        try:
+            async with connect_olt_async(cliente.olt if cliente else None) as tn:
+                await execute_olt_script_async(tn, [
+                    "configure terminal",
+                    f'pon port change onu {onu_sn} to {nuevo_puerto}',
+                    "exit",
+                ])
+        except (PoolTimeout, PlazoAgotado) as e:
+            logging.warning(f'OLT ocupada o sin respuesta, no se cambió de puerto la ONU {onu_sn}: {e}')
+            return _respuesta_ocupado(e)
+        except Exception as e:
+            logging.error(f'Error al cambiar de puerto en la OLT para {onu_sn}: {e}')
+            return JsonResponse({'success': False, 'message': f'Error en la OLT: {e}'}, status=500)
+
+        logging.info(f"ONU {onu_sn} migrada al puerto {nuevo_puerto} con éxito.")
+        return JsonResponse({'success': True, 'message': f'ONU {onu_sn} cambiada al puerto {nuevo_puerto} con éxito.'})
+
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'JSON inválido.'}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'message': f'Error inesperado: {e}'}, status=500)
+
+
+@csrf_exempt
+@require_POST
+@idempotente
+async def migrar_cliente_olt_async_api(request):
+    """
+    Endpoint asíncrono para migrar un cliente entre OLTs. Recibe los mismos
+    datos que migrar_cliente_olt_api; al terminar actualiza la OLT del
+    cliente.
+    """
+    try:
+        data = json.loads(request.body)
+        onu_sn = data.get('onu_sn')
+        olt_destino = data.get('olt_destino')
+        nueva_olt_ip = data.get('nueva_olt_ip')
+
+        if not onu_sn or not (olt_destino or nueva_olt_ip):
+            return JsonResponse({'success': False, 'message': 'Faltan parámetros requeridos.'}, status=400)
+
+        cliente = await Cliente.objects.select_related('olt').filter(onu_sn=onu_sn).afirst()
+        if cliente is None:
+            return JsonResponse({'success': False, 'message': 'Cliente no encontrado.'}, status=404)
+
+        olts = Dispositivo.objects.filter(tipo=Dispositivo.OLT, activo=True)
+        destino = await (olts.filter(nombre=olt_destino) if olt_destino else olts.filter(host=nueva_olt_ip)).afirst()
+        if destino is None:
+            return JsonResponse({'success': False, 'message': 'OLT de destino desconocida.'}, status=400)
+        if destino.pk == cliente.olt_id:
+            return JsonResponse({'success': False, 'message': f'La ONU {onu_sn} ya está en la OLT {destino}.'}, status=400)
+
+        logging.info(f"Migrando la ONU {onu_sn} a la OLT {destino} (asíncrono)...")
+        interfaz = data.get('interfaz') or INTERFAZ_PON_POR_DEFECTO
+        trabajo = await sync_to_async(tomar)(
+            'migrar_olt', cliente=cliente.pk, olt_destino=destino.pk, interfaz=interfaz,
+        )
+        return await _operar(
+            request, trabajo, f'migrar la ONU {onu_sn} a la OLT {destino}',
+            'olt_origen+olt_destino', orquestacion.migrar_onu, onu_sn, cliente.olt, destino, interfaz,
+            al_completar=lambda: aplicar_migracion(cliente, destino),
+        )
+
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'JSON inválido.'}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'message': f'Error inesperado: {e}'}, status=500)
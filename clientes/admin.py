@@ -1,3 +1,16 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Dispositivo, EstadoOnu
+
+
+@admin.register(Dispositivo)
+class DispositivoAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'tipo', 'host', 'puerto', 'max_sesiones', 'activo')
+    list_filter = ('tipo', 'activo')
+
+
+@admin.register(EstadoOnu)
+class EstadoOnuAdmin(admin.ModelAdmin):
+    list_display = ('onu_sn', 'olt', 'indice', 'estado', 'potencia_rx', 'fuera_de_rango', 'leido')
+    list_filter = ('fuera_de_rango', 'estado', 'olt')
+    search_fields = ('onu_sn', 'indice')
@@ -0,0 +1,174 @@
+# clientes/cortes.py
+
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from librouteros.exceptions import TrapError
+
+from gestion_red.connect import connect_mikrotik, connect_olt, execute_olt_script
+from gestion_red.pool import LOTE, con_prioridad
+from gestion_red.secrets_ppp import iniciar_espejo
+
+from .models import Cliente
+
+SUSPENDER = 'suspender'
+RECONECTAR = 'reconectar'
+ACCIONES = (SUSPENDER, RECONECTAR)
+
+LOTE_MIKROTIK = 500
+
+
+def _pendientes(accion, clientes):
+    """
+    Clientes de `clientes` (queryset o lista de ids) que aún no están en el
+    estado final de la acción. Así, repetir un corte interrumpido solo
+    procesa lo que faltaba.
+    """
+    if not isinstance(clientes, QuerySet):
+        clientes = Cliente.objects.filter(pk__in=list(clientes))
+    return (
+        clientes.filter(activo=(accion == SUSPENDER))
+        .select_related('olt', 'router')
+        .only('pk', 'nombre', 'onu_sn', 'activo', 'fecha_desactivacion', 'olt', 'router')
+        .order_by('pk')
+    )
+
+
+def _en_lotes(elementos, tamano):
+    for i in range(0, len(elementos), tamano):
+        yield elementos[i:i + tamano]
+
+
+def _leer_ids_secrets(api):
+    filas = api.rawCmd('/ppp/secret/print', '=.proplist=.id,name')
+    return {fila['name']: fila['.id'] for fila in filas}
+
+
+def _cambiar_secrets(api, espejo, accion, ids_secrets, clientes):
+    ids = [ids_secrets[c.nombre] for c in clientes if c.nombre in ids_secrets]
+    secrets = api.path('ppp', 'secret')
+    for lote in _en_lotes(ids, LOTE_MIKROTIK):
+        secrets.update(**{'.id': ','.join(lote), 'disabled': accion == SUSPENDER})
+        for secret_id in lote:
+            espejo.actualizar(secret_id, accion == SUSPENDER)
+
+
+def _tramo_mikrotik(accion, router, clientes, ids_secrets):
+    # Un solo `set` sobre varios .id a la vez por cada LOTE_MIKROTIK secrets.
+    # Los .id salen del espejo de /ppp/secret; si aún no está sincronizado,
+    # la tabla de secrets de cada router se lee una sola vez por corte. Un
+    # cliente sin secret se da por hecho, igual que en la operación individual.
+    espejo = iniciar_espejo(router)
+    try:
+        with connect_mikrotik(router) as api:
+            if router not in ids_secrets:
+                ids_secrets[router] = espejo.ids() or _leer_ids_secrets(api)
+            try:
+                _cambiar_secrets(api, espejo, accion, ids_secrets[router], clientes)
+            except TrapError:
+                # Algún .id del espejo ya no existe: se relee la tabla y se repite.
+                ids_secrets[router] = _leer_ids_secrets(api)
+                _cambiar_secrets(api, espejo, accion, ids_secrets[router], clientes)
+    except Exception as e:
+        return {c.pk: f'MikroTik: {e}' for c in clientes}
+    return {}
+
+
+def _tramo_olt(accion, olt, clientes):
+    # Un único script por OLT y lote; cada comando informa su propio error.
+    comando = 'no onu service' if accion == SUSPENDER else 'onu service'
+    try:
+        with connect_olt(olt) as tn:
+            resultados = execute_olt_script(tn, [
+                "configure terminal",
+                *(f"{comando} {c.onu_sn}" for c in clientes),
+                "exit",
+            ], check=False)
+    except Exception as e:
+        return {c.pk: f'OLT: {e}' for c in clientes}
+    if resultados[0].error:
+        return {c.pk: f'OLT: {resultados[0].error}' for c in clientes}
+    return {c.pk: f'OLT: {r.error}' for c, r in zip(clientes, resultados[1:]) if r.error}
+
+
+def ejecutar_corte(accion, clientes, progreso=None):
+    """
+    Suspende o reconecta en masa los clientes indicados (queryset o lista de
+    ids). Trabaja por lotes de CORTE_TAMANO_LOTE clientes: en cada lote, un
+    `set` agrupado por router y un script de `onu service` por OLT, con
+    todos los equipos en paralelo (hasta CORTE_MAX_PARALELO a la vez). Al
+    terminar cada lote se actualiza `activo` (y `fecha_desactivacion`) con
+    bulk_update de los clientes que quedaron bien en ambos equipos y se
+    llama a `progreso(informe)`.
+
+    Es reanudable: los clientes que ya están en el estado final se omiten,
+    así que volver a ejecutarlo tras una interrupción continúa donde quedó.
+    Devuelve el informe final.
+    """
+    if accion not in ACCIONES:
+        raise ValueError(f"Acción desconocida: {accion}")
+    inicio = time.monotonic()
+    tamano_lote = getattr(settings, 'CORTE_TAMANO_LOTE', 200)
+    max_paralelo = getattr(settings, 'CORTE_MAX_PARALELO', 4)
+
+    pendientes = list(_pendientes(accion, clientes))
+    informe = {
+        'accion': accion,
+        'total': len(pendientes),
+        'procesados': 0,
+        'completados': 0,
+        'fallidos': 0,
+        'errores': {},
+    }
+    ids_secrets = {}
+
+    with ThreadPoolExecutor(max_workers=max_paralelo, thread_name_prefix='corte') as executor:
+        for lote in _en_lotes(pendientes, tamano_lote):
+            por_router = defaultdict(list)
+            por_olt = defaultdict(list)
+            for cliente in lote:
+                por_router[cliente.router].append(cliente)
+                por_olt[cliente.olt].append(cliente)
+
+            futuros = [
+                executor.submit(con_prioridad(LOTE, _tramo_mikrotik), accion, router, grupo, ids_secrets)
+                for router, grupo in por_router.items()
+            ] + [
+                executor.submit(con_prioridad(LOTE, _tramo_olt), accion, olt, grupo)
+                for olt, grupo in por_olt.items()
+            ]
+            errores = defaultdict(list)
+            for futuro in futuros:
+                for pk, error in futuro.result().items():
+                    errores[pk].append(error)
+
+            correctos = [cliente for cliente in lote if cliente.pk not in errores]
+            ahora = timezone.now()
+            for cliente in correctos:
+                cliente.activo = accion == RECONECTAR
+                cliente.actualizado = ahora
+                if accion == SUSPENDER:
+                    cliente.fecha_desactivacion = date.today()
+            Cliente.objects.bulk_update(correctos, ['activo', 'fecha_desactivacion', 'actualizado'])
+
+            informe['procesados'] += len(lote)
+            informe['completados'] += len(correctos)
+            informe['fallidos'] += len(errores)
+            informe['errores'].update({str(pk): '; '.join(lista) for pk, lista in errores.items()})
+            informe['duracion'] = round(time.monotonic() - inicio, 3)
+            logging.info(
+                f"Corte ({accion}): {informe['procesados']}/{informe['total']} procesados, "
+                f"{informe['fallidos']} con errores."
+            )
+            if progreso is not None:
+                progreso(informe)
+
+    informe['duracion'] = round(time.monotonic() - inicio, 3)
+    return informe
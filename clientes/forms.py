@@ -1,15 +1,32 @@
 from django import forms
-from .models import Cliente
+from .models import Cliente, normalizar_telefono
 
 class ClienteForm(forms.ModelForm):
     class Meta:
         model = Cliente
-        fields = ['nombre', 'direccion', 'telefono', 'onu_sn', 'plan_servicio', 'activo']
+        fields = ['nombre', 'direccion', 'telefono', 'onu_sn', 'plan_servicio', 'olt', 'router', 'activo']
         labels = {
             'nombre': 'Nombre completo',
             'direccion': 'Dirección',
             'telefono': 'Teléfono',
             'onu_sn': 'Número de Serie (ONU)',
             'plan_servicio': 'Plan de Servicio',
+            'olt': 'OLT',
+            'router': 'Router (MikroTik)',
             'activo': 'Estado (Activo)'
-        }
\ No newline at end of file
+        }
+        help_texts = {
+            'olt': 'Vacío: la OLT por defecto.',
+            'router': 'Vacío: el MikroTik por defecto.',
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            # Cambiar de equipo requiere reconfigurarlo (p. ej. migrar la ONU
+            # de OLT), así que no se permite desde la edición.
+            self.fields['olt'].disabled = True
+            self.fields['router'].disabled = True
+
+    def clean_telefono(self):
+        return normalizar_telefono(self.cleaned_data['telefono'])
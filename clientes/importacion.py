@@ -0,0 +1,181 @@
+# clientes/importacion.py
+# Alta masiva de clientes desde un CSV o NDJSON con las columnas de la
+# exportación. Solo escribe en la base de datos: los equipos se configuran
+# después con `reconciliar --aplicar sin_secret sin_onu`.
+
+import csv
+import io
+import json
+import logging
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .models import Cliente, Dispositivo, indexar_nombres, normalizar_telefono
+
+# Como en el formulario de alta: "false", "0" o vacío es False.
+ACTIVO = forms.BooleanField(required=False)
+MAX_ERRORES = 100    # Errores que se detallan en el informe (se cuentan todos)
+
+
+def leer(archivo, formato):
+    """
+    Recorre las filas de `archivo` (binario) como (número de línea, datos).
+    Una fila ilegible se devuelve como (número, mensaje de error).
+    """
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='' if formato == 'csv' else None)
+    if formato == 'csv':
+        lector = csv.DictReader(texto)
+        for fila in lector:
+            yield lector.line_num, fila
+        return
+    for numero, linea in enumerate(texto, start=1):
+        if not linea.strip():
+            continue
+        try:
+            datos = json.loads(linea)
+        except ValueError as e:
+            yield numero, f'JSON inválido: {e}'
+            continue
+        yield numero, datos if isinstance(datos, dict) else 'Se esperaba un objeto JSON.'
+
+
+def _dispositivos():
+    dispositivos = {Dispositivo.OLT: {}, Dispositivo.MIKROTIK: {}}
+    for dispositivo in Dispositivo.objects.all():
+        dispositivos[dispositivo.tipo][dispositivo.nombre] = dispositivo
+    return dispositivos
+
+
+def _errores(errores):
+    return '; '.join(f'{campo}: {" ".join(mensajes)}' for campo, mensajes in errores.items())
+
+
+def _texto(valor):
+    return '' if valor is None else str(valor).strip()
+
+
+def _cliente(fila, dispositivos):
+    """
+    Convierte una fila en un Cliente sin guardar, validado con las reglas del
+    modelo y sin consultas: OLT y router se indican por nombre y se resuelven
+    con `dispositivos` (cargado una vez), y la unicidad del SN la comprueba
+    _guardar_lote para todo el lote. Lanza ValidationError.
+    """
+    errores = {}
+    equipos = {}
+    for campo, tipo in (('olt', Dispositivo.OLT), ('router', Dispositivo.MIKROTIK)):
+        nombre = _texto(fila.get(campo))
+        equipos[campo] = dispositivos[tipo].get(nombre) if nombre else None
+        if nombre and equipos[campo] is None:
+            errores[campo] = [f'No existe el dispositivo "{nombre}".']
+    activo = fila.get('activo')
+    cliente = Cliente(
+        nombre=_texto(fila.get('nombre')),
+        direccion=_texto(fila.get('direccion')) or None,
+        telefono=normalizar_telefono(_texto(fila.get('telefono'))),
+        onu_sn=_texto(fila.get('onu_sn')),
+        plan_servicio=_texto(fila.get('plan_servicio')),
+        # Sin la columna (o vacía) el cliente entra activo, como en el modelo.
+        activo=True if activo in (None, '') else ACTIVO.clean(activo),
+        **equipos,
+    )
+    try:
+        cliente.full_clean(exclude=['olt', 'router'], validate_unique=False)
+    except ValidationError as e:
+        errores = {**e.message_dict, **errores}
+    if errores:
+        raise ValidationError(errores)
+    return cliente
+
+
+class _Informe:
+    def __init__(self):
+        self.leidas = 0
+        self.creadas = 0
+        self.con_errores = 0
+        self.errores = []
+
+    def error(self, numero, mensaje):
+        self.con_errores += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append({'linea': numero, 'error': mensaje})
+
+    def como_dict(self):
+        return {
+            'leidas': self.leidas,
+            'creadas': self.creadas,
+            'con_errores': self.con_errores,
+            'errores': self.errores,
+        }
+
+
+def _guardar_lote(lote, informe, validar):
+    """
+    Comprueba la unicidad del SN de todo el lote con una consulta (contra la
+    base de datos y dentro del propio lote) y lo inserta con bulk_create.
+    """
+    existentes = set(
+        Cliente.objects.filter(onu_sn__in=[cliente.onu_sn for _, cliente in lote]).values_list('onu_sn', flat=True)
+    )
+    nuevos = []
+    for numero, cliente in lote:
+        if cliente.onu_sn in existentes:
+            informe.error(numero, f'onu_sn: ya existe un cliente con el SN {cliente.onu_sn}.')
+            continue
+        existentes.add(cliente.onu_sn)
+        nuevos.append((numero, cliente))
+    if nuevos and not validar:
+        try:
+            with transaction.atomic():
+                Cliente.objects.bulk_create([cliente for _, cliente in nuevos])
+                # bulk_create no pasa por Cliente.save() (ni devuelve los pk en MySQL).
+                indexar_nombres(
+                    Cliente.objects.filter(onu_sn__in=[cliente.onu_sn for _, cliente in nuevos])
+                    .values_list('pk', 'nombre')
+                )
+        except IntegrityError as e:
+            # Otro proceso dio de alta alguno de estos SN entre la comprobación y la inserción.
+            logging.error(f'Importación de clientes: lote de {len(nuevos)} filas rechazado: {e}')
+            for numero, _ in nuevos:
+                informe.error(numero, f'Lote rechazado por la base de datos: {e}')
+            return
+    informe.creadas += len(nuevos)
+
+
+def importar(filas, validar=False):
+    """
+    Da de alta los clientes de `filas` ((número, datos) como los de `leer`)
+    validando cada una con las reglas de Cliente, en lotes de
+    CLIENTES_IMPORTACION_LOTE con bulk_create. Las filas con errores se
+    saltan y se informan. Con `validar` no se escribe nada y `creadas`
+    cuenta las que se habrían creado.
+    """
+    tamano = getattr(settings, 'CLIENTES_IMPORTACION_LOTE', 1000)
+    informe = _Informe()
+    dispositivos = _dispositivos()
+    lote = []
+    for numero, fila in filas:
+        informe.leidas += 1
+        if isinstance(fila, str):
+            informe.error(numero, fila)
+            continue
+        try:
+            cliente = _cliente(fila, dispositivos)
+        except ValidationError as e:
+            informe.error(numero, _errores(e.message_dict))
+            continue
+        lote.append((numero, cliente))
+        if len(lote) >= tamano:
+            _guardar_lote(lote, informe, validar)
+            lote = []
+    if lote:
+        _guardar_lote(lote, informe, validar)
+
+    logging.info(
+        f'Importación de clientes: {informe.leidas} filas leídas, {informe.creadas} creadas, '
+        f'{informe.con_errores} con errores.'
+    )
+    return informe.como_dict()
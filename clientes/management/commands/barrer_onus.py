@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from clientes.optica import barrer
+
+
+class Command(BaseCommand):
+    help = ('Lee el estado y la potencia óptica de todas las ONUs (un comando por puerto PON) '
+            'y marca las que están fuera de ONU_RX_MIN..ONU_RX_MAX.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true',
+                            help='Repetir cada OPTICA_INTERVALO segundos en lugar de terminar.')
+
+    def handle(self, *args, **options):
+        intervalo = getattr(settings, 'OPTICA_INTERVALO', 900)
+        while True:
+            inicio = time.monotonic()
+            resumen = barrer()
+            self.stdout.write(
+                f"{resumen['onus']} ONU(s) leída(s), {len(resumen['fuera_de_rango'])} fuera de rango."
+            )
+            for olt, error in resumen['errores'].items():
+                self.stderr.write(f'{olt}: {error}')
+            if not options['continuo']:
+                break
+            time.sleep(max(intervalo - (time.monotonic() - inicio), 0))
@@ -0,0 +1,39 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from clientes.cortes import ACCIONES, ejecutar_corte
+
+
+class Command(BaseCommand):
+    help = ('Suspende o reconecta en masa a los clientes indicados. Si se interrumpe, '
+            'volver a ejecutarlo con los mismos ids continúa donde quedó.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('accion', choices=ACCIONES)
+        parser.add_argument('--ids', nargs='+', type=int, default=[], metavar='ID',
+                            help='Ids de los clientes.')
+        parser.add_argument('--archivo',
+                            help='Archivo con un id de cliente por línea.')
+
+    def handle(self, *args, **options):
+        ids = list(options['ids'])
+        if options['archivo']:
+            try:
+                lineas = Path(options['archivo']).read_text(encoding='utf-8').split()
+                ids += [int(linea) for linea in lineas]
+            except (OSError, ValueError) as e:
+                raise CommandError(f'No se pudo leer el archivo de ids: {e}')
+        if not ids:
+            raise CommandError('Indique los clientes con --ids o --archivo.')
+
+        def progreso(informe):
+            self.stdout.write(
+                f"{informe['procesados']}/{informe['total']} procesados, {informe['fallidos']} con errores."
+            )
+
+        informe = ejecutar_corte(options['accion'], ids, progreso)
+        self.stdout.write(json.dumps(informe, indent=2, ensure_ascii=False))
+        resumen = f"{informe['completados']} de {informe['total']} cliente(s) pendiente(s) procesado(s)."
+        self.stdout.write(self.style.SUCCESS(resumen) if not informe['fallidos'] else self.style.WARNING(resumen))
@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from clientes.importacion import importar, leer
+
+
+class Command(BaseCommand):
+    help = ('Da de alta clientes en masa desde un CSV o NDJSON con las columnas de la exportación. '
+            'No configura los equipos: luego ejecute reconciliar --aplicar sin_secret sin_onu.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--formato', choices=('csv', 'ndjson'),
+                            help='Por defecto, según la extensión del archivo.')
+        parser.add_argument('--validar', action='store_true',
+                            help='Solo validar las filas, sin crear clientes.')
+
+    def handle(self, *args, **options):
+        formato = options['formato']
+        if formato is None:
+            formato = 'ndjson' if options['archivo'].lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                informe = importar(leer(archivo, formato), validar=options['validar'])
+        except OSError as e:
+            raise CommandError(f'No se pudo leer el archivo: {e}')
+
+        self.stdout.write(json.dumps(informe, indent=2, ensure_ascii=False))
+        accion = 'válido(s)' if options['validar'] else 'creado(s)'
+        resumen = f"{informe['creadas']} de {informe['leidas']} cliente(s) {accion}."
+        self.stdout.write(self.style.SUCCESS(resumen) if not informe['con_errores'] else self.style.WARNING(resumen))
@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from clientes.trafico import ciclo
+
+
+class Command(BaseCommand):
+    help = ('Lee los contadores de tráfico de todas las sesiones PPPoE, los consolida en '
+            'resúmenes de 5 minutos, 1 hora y 1 día, y purga lo que excede la retención.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--continuo', action='store_true',
+                            help='Repetir cada TRAFICO_INTERVALO segundos en lugar de terminar. Sin él '
+                                 '(p. ej. desde cron) hace falta una caché compartida para '
+                                 'conservar los contadores entre ejecuciones.')
+
+    def handle(self, *args, **options):
+        intervalo = getattr(settings, 'TRAFICO_INTERVALO', 60)
+        while True:
+            inicio = time.monotonic()
+            muestras, resumenes, purgados = ciclo()
+            self.stdout.write(
+                f'{muestras} muestra(s), {sum(resumenes.values())} resumen(es), {purgados} fila(s) purgada(s).'
+            )
+            if not options['continuo']:
+                break
+            time.sleep(max(intervalo - (time.monotonic() - inicio), 0))
@@ -0,0 +1,21 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from clientes.reconciliacion import CATEGORIAS, reconciliar
+
+
+class Command(BaseCommand):
+    help = 'Compara clientes, secrets de MikroTik y ONUs de la OLT y opcionalmente corrige las diferencias.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--aplicar', nargs='+', choices=CATEGORIAS, default=[], metavar='CATEGORIA',
+                            help=f'Corregir estas diferencias en los equipos: {", ".join(CATEGORIAS)}.')
+        parser.add_argument('--detalle', action='store_true',
+                            help='Incluir en la salida la lista completa de cada diferencia.')
+
+    def handle(self, *args, **options):
+        informe = reconciliar(options['aplicar'])
+        if not options['detalle']:
+            informe.pop('detalle')
+        self.stdout.write(json.dumps(informe, indent=2, ensure_ascii=False))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clientes", "0002_cliente_fecha_desactivacion"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="cliente",
+            name="nombre",
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name="cliente",
+            name="onu_sn",
+            field=models.CharField(max_length=50, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="cliente",
+            name="telefono",
+            field=models.CharField(db_index=True, max_length=20),
+        ),
+    ]
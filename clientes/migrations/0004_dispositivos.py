@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clientes", "0003_indices_busqueda"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Dispositivo",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("nombre", models.CharField(max_length=50, unique=True)),
+                (
+                    "tipo",
+                    models.CharField(
+                        choices=[("olt", "OLT"), ("mikrotik", "MikroTik")],
+                        max_length=10,
+                    ),
+                ),
+                ("host", models.CharField(max_length=100)),
+                ("puerto", models.PositiveIntegerField(blank=True, null=True)),
+                ("usuario", models.CharField(max_length=50)),
+                ("password", models.CharField(max_length=100)),
+                ("activo", models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="cliente",
+            name="olt",
+            field=models.ForeignKey(
+                blank=True,
+                limit_choices_to={"tipo": "olt"},
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="clientes_olt",
+                to="clientes.dispositivo",
+            ),
+        ),
+        migrations.AddField(
+            model_name="cliente",
+            name="router",
+            field=models.ForeignKey(
+                blank=True,
+                limit_choices_to={"tipo": "mikrotik"},
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="clientes_router",
+                to="clientes.dispositivo",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clientes", "0004_dispositivos"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dispositivo",
+            name="max_sesiones",
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
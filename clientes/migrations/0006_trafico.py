@@ -0,0 +1,95 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clientes", "0005_dispositivo_max_sesiones"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MuestraTrafico",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("instante", models.DateTimeField()),
+                ("bytes_subida", models.BigIntegerField(default=0)),
+                ("bytes_bajada", models.BigIntegerField(default=0)),
+                ("paquetes_subida", models.BigIntegerField(default=0)),
+                ("paquetes_bajada", models.BigIntegerField(default=0)),
+                (
+                    "cliente",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="muestras_trafico",
+                        to="clientes.cliente",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["instante"], name="clientes_mu_instant_b6a1a8_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="ResumenTrafico",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "resolucion",
+                    models.PositiveIntegerField(
+                        choices=[(300, "5 minutos"), (3600, "1 hora"), (86400, "1 día")]
+                    ),
+                ),
+                ("inicio", models.DateTimeField()),
+                ("bytes_subida", models.BigIntegerField(default=0)),
+                ("bytes_bajada", models.BigIntegerField(default=0)),
+                ("paquetes_subida", models.BigIntegerField(default=0)),
+                ("paquetes_bajada", models.BigIntegerField(default=0)),
+                (
+                    "cliente",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="resumenes_trafico",
+                        to="clientes.cliente",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["resolucion", "inicio"],
+                        name="clientes_re_resoluc_09520b_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("cliente", "resolucion", "inicio"),
+                        name="resumen_trafico_unico",
+                    )
+                ],
+            },
+        ),
+    ]
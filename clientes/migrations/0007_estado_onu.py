@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clientes", "0006_trafico"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EstadoOnu",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("onu_sn", models.CharField(max_length=50, unique=True)),
+                ("indice", models.CharField(max_length=50)),
+                ("estado", models.CharField(blank=True, max_length=20)),
+                ("potencia_rx", models.FloatField(blank=True, null=True)),
+                ("fuera_de_rango", models.BooleanField(db_index=True, default=False)),
+                ("leido", models.DateTimeField()),
+                (
+                    "olt",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="onus",
+                        to="clientes.dispositivo",
+                    ),
+                ),
+            ],
+        ),
+    ]
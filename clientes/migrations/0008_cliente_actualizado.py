@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clientes", "0007_estado_onu"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cliente",
+            name="actualizado",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:30
+
+import re
+
+from django.db import migrations
+from django.utils import timezone
+
+# Copia de clientes.models.normalizar_telefono a la fecha de esta migración.
+SEPARADORES_TELEFONO = re.compile(r"[\s\-.()+]")
+
+
+def normalizar(telefono):
+    telefono = (telefono or "").strip()
+    return ("+" if telefono.startswith("+") else "") + SEPARADORES_TELEFONO.sub("", telefono)
+
+
+def normalizar_telefonos(apps, schema_editor):
+    Cliente = apps.get_model("clientes", "Cliente")
+    ahora = timezone.now()
+    cambiados = []
+    for cliente in Cliente.objects.only("pk", "telefono").iterator(chunk_size=2000):
+        telefono = normalizar(cliente.telefono)
+        if telefono != cliente.telefono:
+            # `actualizado` invalida la fila cacheada de la lista de clientes.
+            cliente.telefono = telefono
+            cliente.actualizado = ahora
+            cambiados.append(cliente)
+        if len(cambiados) >= 1000:
+            Cliente.objects.bulk_update(cambiados, ["telefono", "actualizado"])
+            cambiados = []
+    Cliente.objects.bulk_update(cambiados, ["telefono", "actualizado"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clientes", "0008_cliente_actualizado"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalizar_telefonos, migrations.RunPython.noop),
+    ]
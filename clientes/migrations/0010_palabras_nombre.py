@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Copia de clientes.models.sufijos_nombre a la fecha de esta migración.
+def sufijos(nombre):
+    palabras = (nombre or "").lower().split()
+    return {" ".join(palabras[i:])[:100] for i in range(len(palabras))}
+
+
+def indexar_nombres(apps, schema_editor):
+    Cliente = apps.get_model("clientes", "Cliente")
+    PalabraNombre = apps.get_model("clientes", "PalabraNombre")
+    filas = []
+    for pk, nombre in Cliente.objects.values_list("pk", "nombre").iterator(chunk_size=2000):
+        filas.extend(PalabraNombre(cliente_id=pk, texto=texto) for texto in sufijos(nombre))
+        if len(filas) >= 1000:
+            PalabraNombre.objects.bulk_create(filas)
+            filas = []
+    PalabraNombre.objects.bulk_create(filas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clientes", "0009_normalizar_telefonos"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PalabraNombre",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("texto", models.CharField(db_index=True, max_length=100)),
+                (
+                    "cliente",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="palabras_nombre",
+                        to="clientes.cliente",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(indexar_nombres, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,162 @@
-from django.db import models
+import re
+
+from django.db import models, transaction
+
+# Separadores que se quitan de los teléfonos al guardarlos y al buscarlos.
+SEPARADORES_TELEFONO = re.compile(r'[\s\-.()+]')
+
+def normalizar_telefono(telefono):
+    """
+    Deja el teléfono solo con sus dígitos (y el '+' inicial, si lo tiene),
+    para que la búsqueda por prefijo lo encuentre se escriba como se escriba.
+    """
+    telefono = (telefono or '').strip()
+    return ('+' if telefono.startswith('+') else '') + SEPARADORES_TELEFONO.sub('', telefono)
+
+class Dispositivo(models.Model):
+    """
+    OLT o router MikroTik (BRAS) con sus credenciales de acceso. Un cliente
+    sin dispositivo asignado usa el equipo configurado en settings
+    (OLT_IP / MIKROTIK_IP).
+    """
+    OLT = 'olt'
+    MIKROTIK = 'mikrotik'
+    TIPOS = [
+        (OLT, 'OLT'),
+        (MIKROTIK, 'MikroTik'),
+    ]
+
+    nombre = models.CharField(max_length=50, unique=True)
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    host = models.CharField(max_length=100)
+    puerto = models.PositiveIntegerField(blank=True, null=True) # Vacío: puerto por defecto (23 Telnet, 8728 API)
+    usuario = models.CharField(max_length=50)
+    password = models.CharField(max_length=100)
+    max_sesiones = models.PositiveSmallIntegerField(blank=True, null=True) # Vacío: MIKROTIK_POOL_SIZE / OLT_SESSION_POOL_SIZE
+    activo = models.BooleanField(default=True)
+
+    def __str__(self):
+        return self.nombre
 
 class Cliente(models.Model):
-    nombre = models.CharField(max_length=100)
+    nombre = models.CharField(max_length=100, db_index=True)
     direccion = models.CharField(max_length=200, blank=True, null=True)
-    telefono = models.CharField(max_length=20)
-    onu_sn = models.CharField(max_length=50) # Número de serie de la ONU
+    telefono = models.CharField(max_length=20, db_index=True) # Normalizado con normalizar_telefono()
+    onu_sn = models.CharField(max_length=50, unique=True) # Número de serie de la ONU
     plan_servicio = models.CharField(max_length=50)
     fecha_alta = models.DateField(auto_now_add=True)
     activo = models.BooleanField(default=True)
     fecha_desactivacion = models.DateField(blank=True, null=True)
+    olt = models.ForeignKey(
+        Dispositivo, on_delete=models.PROTECT, blank=True, null=True,
+        related_name='clientes_olt', limit_choices_to={'tipo': Dispositivo.OLT},
+    )
+    router = models.ForeignKey(
+        Dispositivo, on_delete=models.PROTECT, blank=True, null=True,
+        related_name='clientes_router', limit_choices_to={'tipo': Dispositivo.MIKROTIK},
+    )
+    # Versión de la fila: la lista de clientes cachea cada fila con esta clave.
+    # Los update()/bulk_update() que tocan un cliente tienen que ponerla a mano.
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            campos = kwargs.get('update_fields')
+            if campos is None or 'nombre' in campos:
+                indexar_nombres([(self.pk, self.nombre)])
+
+    def __str__(self):
+        return self.nombre
+
+def sufijos_nombre(nombre):
+    """
+    El nombre en minúsculas desde cada una de sus palabras: 'Juan Pérez
+    García' -> 'juan pérez garcía', 'pérez garcía', 'garcía'.
+    """
+    palabras = (nombre or '').lower().split()
+    return {' '.join(palabras[i:])[:100] for i in range(len(palabras))}
+
+class PalabraNombre(models.Model):
+    """
+    Índice de búsqueda por nombre: una fila por palabra del nombre de un
+    cliente, con el resto del nombre desde ella (ver sufijos_nombre). Buscar
+    por apellido o segundo nombre es así un LIKE 'texto%' sobre un índice,
+    no un recorrido de la tabla. Lo mantienen Cliente.save() y, para los
+    bulk_create, indexar_nombres().
+    """
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='palabras_nombre')
+    texto = models.CharField(max_length=100, db_index=True)
+
+def indexar_nombres(clientes):
+    """
+    Rehace las filas de PalabraNombre de `clientes` ((pk, nombre), p. ej. de
+    values_list) en dos consultas.
+    """
+    clientes = list(clientes)
+    PalabraNombre.objects.filter(cliente_id__in=[pk for pk, _ in clientes]).delete()
+    PalabraNombre.objects.bulk_create(
+        [PalabraNombre(cliente_id=pk, texto=texto) for pk, nombre in clientes for texto in sufijos_nombre(nombre)],
+        batch_size=1000,
+    )
+
+class MuestraTrafico(models.Model):
+    """
+    Tráfico de un cliente entre dos lecturas consecutivas de los contadores
+    del router (diferencias, no acumulados). Solo se agregan filas; se
+    consolidan en ResumenTrafico y se borran pasado TRAFICO_RETENCION.
+    """
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='muestras_trafico')
+    instante = models.DateTimeField()
+    bytes_subida = models.BigIntegerField(default=0)
+    bytes_bajada = models.BigIntegerField(default=0)
+    paquetes_subida = models.BigIntegerField(default=0)
+    paquetes_bajada = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['instante'])]
+
+class ResumenTrafico(models.Model):
+    """
+    Tráfico de un cliente sumado por intervalos de 5 minutos, 1 hora o 1 día.
+    Las gráficas se dibujan solo desde aquí.
+    """
+    CINCO_MINUTOS = 300
+    HORA = 3600
+    DIA = 86400
+    RESOLUCIONES = [
+        (CINCO_MINUTOS, '5 minutos'),
+        (HORA, '1 hora'),
+        (DIA, '1 día'),
+    ]
+
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='resumenes_trafico')
+    resolucion = models.PositiveIntegerField(choices=RESOLUCIONES)
+    inicio = models.DateTimeField()
+    bytes_subida = models.BigIntegerField(default=0)
+    bytes_bajada = models.BigIntegerField(default=0)
+    paquetes_subida = models.BigIntegerField(default=0)
+    paquetes_bajada = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cliente', 'resolucion', 'inicio'], name='resumen_trafico_unico'),
+        ]
+        indexes = [models.Index(fields=['resolucion', 'inicio'])]
+
+class EstadoOnu(models.Model):
+    """
+    Última lectura de estado y potencia óptica de una ONU, tomada del
+    barrido por puerto PON de su OLT. Se identifica por número de serie,
+    como Cliente.onu_sn.
+    """
+    onu_sn = models.CharField(max_length=50, unique=True)
+    olt = models.ForeignKey(Dispositivo, on_delete=models.CASCADE, blank=True, null=True, related_name='onus')
+    indice = models.CharField(max_length=50) # p. ej. gpon-onu_1/1/1:3
+    estado = models.CharField(max_length=20, blank=True) # Phase State: working, LOS, DyingGasp, OffLine...
+    potencia_rx = models.FloatField(blank=True, null=True) # dBm recibidos por la ONU; vacío si no responde
+    fuera_de_rango = models.BooleanField(default=False, db_index=True)
+    leido = models.DateTimeField()
 
     def __str__(self):
-        return self.nombre
\ No newline at end of file
+        return f'{self.onu_sn} ({self.indice})'
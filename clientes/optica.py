@@ -0,0 +1,122 @@
+# clientes/optica.py
+# Barrido de estado y potencia óptica de las ONUs. Por cada puerto PON se
+# piden en bloque el estado y la potencia de todas sus ONUs, así que un
+# barrido completo cuesta O(puertos) comandos y no O(ONUs).
+
+import logging
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.utils import timezone
+
+from gestion_red.connect import connect_olt, execute_olt_script
+from gestion_red.pool import LOTE, con_prioridad
+
+from .models import Cliente, Dispositivo, EstadoOnu
+from .reconciliacion import ONU_BASEINFO, _equipos
+
+# "show gpon onu state gpon-olt_1/1/1": "1/1/1:3   enable   enable   working   1(GPON)"
+ONU_ESTADO = re.compile(r'^\s*(?:gpon-onu_)?(\d+/\d+/\d+:\d+)\s+\S+\s+\S+\s+(\S+)', re.MULTILINE)
+# "show pon power onu-rx gpon-olt_1/1/1": "gpon-onu_1/1/1:3   -21.456(dbm)" o "N/A"
+ONU_POTENCIA = re.compile(r'^\s*(?:gpon-onu_)?(\d+/\d+/\d+:\d+)\s+(-?\d+(?:\.\d+)?|N/A)', re.MULTILINE | re.IGNORECASE)
+
+CAMPOS = ('olt', 'indice', 'estado', 'potencia_rx', 'fuera_de_rango', 'leido')
+
+
+def _puerto(indice):
+    # gpon-onu_1/1/1:3 -> 1/1/1
+    return indice.split('_', 1)[1].split(':', 1)[0]
+
+
+def fuera_de_rango(potencia):
+    """
+    True si la potencia recibida (dBm) está fuera de ONU_RX_MIN..ONU_RX_MAX.
+    """
+    if potencia is None:
+        return False
+    return not getattr(settings, 'ONU_RX_MIN', -27.0) <= potencia <= getattr(settings, 'ONU_RX_MAX', -8.0)
+
+
+def parsear_estados(salida):
+    return {f'gpon-onu_{indice}': estado for indice, estado in ONU_ESTADO.findall(salida)}
+
+
+def parsear_potencias(salida):
+    return {
+        f'gpon-onu_{indice}': None if valor.upper() == 'N/A' else float(valor)
+        for indice, valor in ONU_POTENCIA.findall(salida)
+    }
+
+
+def _barrer_olt(olt):
+    """
+    Lee las ONUs de la OLT y, por cada puerto PON con ONUs, su estado y su
+    potencia en un único script. Devuelve {sn: (indice, estado, potencia)}.
+    """
+    with connect_olt(olt) as tn:
+        salida = execute_olt_script(tn, ["show gpon onu baseinfo"])[0].salida
+        indices = {indice: sn for indice, sn in ONU_BASEINFO.findall(salida)}
+        puertos = sorted({_puerto(indice) for indice in indices})
+        resultados = execute_olt_script(tn, [
+            comando
+            for puerto in puertos
+            for comando in (f"show gpon onu state gpon-olt_{puerto}", f"show pon power onu-rx gpon-olt_{puerto}")
+        ], check=False)
+
+    estados = {}
+    potencias = {}
+    for resultado in resultados:
+        if resultado.error:
+            logging.warning(f'{olt or "OLT"}: "{resultado.comando}" falló: {resultado.error}')
+        elif ' state ' in resultado.comando:
+            estados.update(parsear_estados(resultado.salida))
+        else:
+            potencias.update(parsear_potencias(resultado.salida))
+    return {sn: (indice, estados.get(indice, ''), potencias.get(indice)) for indice, sn in indices.items()}
+
+
+def barrer():
+    """
+    Barre todas las OLTs en paralelo (con prioridad de lote) y guarda la
+    última lectura de cada ONU en EstadoOnu. Devuelve un resumen con las
+    ONUs leídas y las que quedaron fuera de rango.
+    """
+    leido = timezone.now()
+    usadas = defaultdict(set)
+    for onu_sn, olt in Cliente.objects.values_list('onu_sn', 'olt').iterator(chunk_size=5000):
+        usadas[olt].add(onu_sn)
+    olts = _equipos(Dispositivo.OLT, usadas)
+
+    lecturas = []
+    errores = {}
+    with ThreadPoolExecutor(max_workers=len(olts), thread_name_prefix='optica') as executor:
+        futuros = {executor.submit(con_prioridad(LOTE, _barrer_olt), olt): (pk, olt) for pk, olt in olts.items()}
+        for futuro, (pk, olt) in futuros.items():
+            try:
+                onus = futuro.result()
+            except Exception as e:
+                logging.error(f'No se pudo barrer {olt or "la OLT"}: {e}')
+                errores[str(olt or 'olt')] = str(e)
+                continue
+            lecturas += [
+                EstadoOnu(
+                    onu_sn=sn, olt_id=pk, indice=indice, estado=estado, potencia_rx=potencia,
+                    fuera_de_rango=fuera_de_rango(potencia), leido=leido,
+                )
+                for sn, (indice, estado, potencia) in onus.items()
+            ]
+
+    EstadoOnu.objects.bulk_create(
+        lecturas,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['onu_sn'],
+        update_fields=list(CAMPOS),
+    )
+    return {
+        'onus': len(lecturas),
+        'fuera_de_rango': sorted(lectura.onu_sn for lectura in lecturas if lectura.fuera_de_rango),
+        'errores': errores,
+    }
@@ -0,0 +1,254 @@
+# clientes/reconciliacion.py
+
+import logging
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from gestion_red.connect import connect_mikrotik, connect_olt, execute_olt_script
+from gestion_red.operaciones import INTERFAZ_PON_POR_DEFECTO
+from gestion_red.pool import LOTE, con_prioridad
+from gestion_red.secrets_ppp import iniciar_espejo
+
+from .models import Cliente, Dispositivo
+
+# En "show gpon onu baseinfo" cada ONU aparece como "gpon-onu_1/1/1:3 ... SN:ZTEGC0A1B2C3 ..."
+ONU_BASEINFO = re.compile(r'(gpon-onu_\d+/\d+/\d+:\d+)\s.*?\b(?:SN:)?([A-Z]{4}[0-9A-F]{8})\b')
+
+# Tipos de diferencia que pueden corregirse en los equipos.
+CATEGORIAS = (
+    'secrets_huerfanos',   # secret en MikroTik sin cliente en la base de datos
+    'sin_secret',          # cliente sin secret en MikroTik
+    'estado_distinto',     # cliente activo con secret deshabilitado, o al revés
+    'onus_huerfanas',      # ONU en la OLT sin cliente en la base de datos
+    'sin_onu',             # cliente cuya ONU no está en la OLT
+)
+
+LOTE_MIKROTIK = 500
+
+
+def _leer_clientes():
+    # El secret PPPoE se identifica por el nombre del cliente (en su router)
+    # y la ONU por su SN (en su OLT). None es el equipo de settings.
+    por_router = defaultdict(dict)
+    por_olt = defaultdict(set)
+    consulta = Cliente.objects.values_list('nombre', 'onu_sn', 'activo', 'plan_servicio', 'router', 'olt')
+    for nombre, onu_sn, activo, plan_servicio, router, olt in consulta.iterator(chunk_size=5000):
+        por_router[router][nombre] = (activo, plan_servicio)
+        por_olt[olt].add(onu_sn)
+    return por_router, por_olt
+
+
+def _equipos(tipo, usados):
+    # Los equipos registrados y activos, más el de settings si algún cliente
+    # lo usa o si no hay ninguno registrado de ese tipo.
+    equipos = {d.pk: d for d in Dispositivo.objects.filter(tipo=tipo, activo=True)}
+    if None in usados or not equipos:
+        equipos[None] = None
+    return equipos
+
+
+def _etiqueta(dispositivo, tipo):
+    return dispositivo.nombre if dispositivo is not None else tipo
+
+
+def _leer_secrets(router):
+    with connect_mikrotik(router) as api:
+        filas = api.rawCmd('/ppp/secret/print', '=.proplist=.id,name,disabled')
+        return {fila['name']: (fila['.id'], bool(fila.get('disabled'))) for fila in filas}
+
+
+def _leer_onus(olt):
+    with connect_olt(olt) as tn:
+        salida = execute_olt_script(tn, ["show gpon onu baseinfo"])[0].salida
+    return {sn: indice for indice, sn in ONU_BASEINFO.findall(salida)}
+
+
+def _diferencias_router(clientes, secrets):
+    nombres = clientes.keys()
+    return {
+        'secrets_huerfanos': sorted(secrets.keys() - nombres),
+        'sin_secret': sorted(nombres - secrets.keys()),
+        'estado_distinto': sorted(
+            nombre for nombre in nombres & secrets.keys()
+            # activo y deshabilitado, o inactivo y habilitado
+            if clientes[nombre][0] == secrets[nombre][1]
+        ),
+    }
+
+
+def _diferencias_olt(sns, onus):
+    return {
+        'onus_huerfanas': sorted(onus.keys() - sns),
+        'sin_onu': sorted(sns - onus.keys()),
+    }
+
+
+def comparar():
+    """
+    Lee una sola vez cada fuente (clientes, /ppp/secret de cada router y ONUs
+    de cada OLT, todos los equipos en paralelo) y devuelve `(informe,
+    contexto)`: el informe con las diferencias y el contexto con los datos
+    leídos, necesario para aplicar correcciones. Las lecturas tienen
+    prioridad de lote frente a las operaciones interactivas.
+    """
+    inicio = time.monotonic()
+    clientes_por_router, sns_por_olt = _leer_clientes()
+    routers = _equipos(Dispositivo.MIKROTIK, clientes_por_router)
+    olts = _equipos(Dispositivo.OLT, sns_por_olt)
+
+    with ThreadPoolExecutor(max_workers=len(routers) + len(olts), thread_name_prefix='reconciliar') as executor:
+        lecturas_secrets = {
+            pk: executor.submit(con_prioridad(LOTE, _leer_secrets), router) for pk, router in routers.items()
+        }
+        lecturas_onus = {pk: executor.submit(con_prioridad(LOTE, _leer_onus), olt) for pk, olt in olts.items()}
+        secrets = {pk: futuro.result() for pk, futuro in lecturas_secrets.items()}
+        onus = {pk: futuro.result() for pk, futuro in lecturas_onus.items()}
+
+    contexto = {'routers': {}, 'olts': {}}
+    for pk, router in routers.items():
+        clientes = clientes_por_router.get(pk, {})
+        contexto['routers'][pk] = {
+            'dispositivo': router,
+            'clientes': clientes,
+            'secrets': secrets[pk],
+            'diferencias': _diferencias_router(clientes, secrets[pk]),
+        }
+    for pk, olt in olts.items():
+        contexto['olts'][pk] = {
+            'dispositivo': olt,
+            'diferencias': _diferencias_olt(sns_por_olt.get(pk, set()), onus[pk]),
+        }
+
+    detalle = {categoria: [] for categoria in CATEGORIAS}
+    por_equipo = {}
+    for tipo, equipos in (('mikrotik', contexto['routers']), ('olt', contexto['olts'])):
+        for equipo in equipos.values():
+            por_equipo[_etiqueta(equipo['dispositivo'], tipo)] = {
+                categoria: len(lista) for categoria, lista in equipo['diferencias'].items()
+            }
+            for categoria, lista in equipo['diferencias'].items():
+                detalle[categoria].extend(lista)
+
+    informe = {
+        'totales': {
+            'clientes': sum(len(sns) for sns in sns_por_olt.values()),
+            'secrets': sum(len(s) for s in secrets.values()),
+            'onus': sum(len(o) for o in onus.values()),
+        },
+        'diferencias': {categoria: len(lista) for categoria, lista in detalle.items()},
+        'por_equipo': por_equipo,
+        'detalle': {categoria: sorted(lista) for categoria, lista in detalle.items()},
+        'duracion': round(time.monotonic() - inicio, 3),
+    }
+    return informe, contexto
+
+
+def _en_lotes(elementos, tamano):
+    for i in range(0, len(elementos), tamano):
+        yield elementos[i:i + tamano]
+
+
+def _aplicar_router(equipo, categorias):
+    router = equipo['dispositivo']
+    clientes = equipo['clientes']
+    secrets = equipo['secrets']
+    diferencias = equipo['diferencias']
+    corregidos = {}
+    espejo = iniciar_espejo(router)
+    with connect_mikrotik(router) as api:
+        ppp_secret = api.path('ppp', 'secret')
+        if 'secrets_huerfanos' in categorias:
+            ids = [secrets[nombre][0] for nombre in diferencias['secrets_huerfanos']]
+            for lote in _en_lotes(ids, LOTE_MIKROTIK):
+                ppp_secret.remove(*lote)
+                for secret_id in lote:
+                    espejo.quitar(secret_id)
+            corregidos['secrets_huerfanos'] = len(ids)
+
+        if 'sin_secret' in categorias:
+            for nombre in diferencias['sin_secret']:
+                secret_id = ppp_secret.add(
+                    name=nombre,
+                    password='password_generada',
+                    service='pppoe',
+                    profile=clientes[nombre][1]
+                )
+                espejo.registrar(secret_id, nombre, clientes[nombre][1], 'pppoe')
+            corregidos['sin_secret'] = len(diferencias['sin_secret'])
+
+        if 'estado_distinto' in categorias:
+            for activo in (True, False):
+                ids = [
+                    secrets[nombre][0] for nombre in diferencias['estado_distinto']
+                    if clientes[nombre][0] == activo
+                ]
+                for lote in _en_lotes(ids, LOTE_MIKROTIK):
+                    ppp_secret.update(**{'.id': ','.join(lote), 'disabled': not activo})
+                    for secret_id in lote:
+                        espejo.actualizar(secret_id, not activo)
+            corregidos['estado_distinto'] = len(diferencias['estado_distinto'])
+    return corregidos
+
+
+def _aplicar_olt(equipo, categorias):
+    diferencias = equipo['diferencias']
+    with connect_olt(equipo['dispositivo']) as tn:
+        if 'onus_huerfanas' in categorias and diferencias['onus_huerfanas']:
+            execute_olt_script(tn, [
+                "configure terminal",
+                *(f"no onu {sn}" for sn in diferencias['onus_huerfanas']),
+                "exit",
+            ])
+        if 'sin_onu' in categorias and diferencias['sin_onu']:
+            execute_olt_script(tn, [
+                "configure terminal",
+                f"interface {INTERFAZ_PON_POR_DEFECTO}",
+                *(f"onu pre-config-mode serial-number {sn}" for sn in diferencias['sin_onu']),
+                "exit",
+                "exit",
+            ])
+    return {categoria: len(diferencias[categoria]) for categoria in categorias}
+
+
+def aplicar(contexto, categorias):
+    """
+    Corrige en los equipos las diferencias de las categorías indicadas, en
+    operaciones agrupadas y con todos los equipos en paralelo: una conexión
+    por router (con `remove`/`set` sobre varios .id a la vez) y un único
+    script por acción en cada OLT. Devuelve cuántos elementos se corrigieron
+    por categoría.
+    """
+    categorias_mikrotik = {'secrets_huerfanos', 'sin_secret', 'estado_distinto'} & set(categorias)
+    categorias_olt = {'onus_huerfanas', 'sin_onu'} & set(categorias)
+    tareas = []
+    if categorias_mikrotik:
+        tareas += [(_aplicar_router, equipo, categorias_mikrotik) for equipo in contexto['routers'].values()]
+    if categorias_olt:
+        tareas += [(_aplicar_olt, equipo, categorias_olt) for equipo in contexto['olts'].values()]
+
+    corregidos = {}
+    if tareas:
+        with ThreadPoolExecutor(max_workers=len(tareas), thread_name_prefix='reconciliar') as executor:
+            futuros = [executor.submit(con_prioridad(LOTE, funcion), equipo, cats) for funcion, equipo, cats in tareas]
+            for futuro in futuros:
+                for categoria, cantidad in futuro.result().items():
+                    corregidos[categoria] = corregidos.get(categoria, 0) + cantidad
+
+    logging.info(f"Reconciliación aplicada: {corregidos}")
+    return corregidos
+
+
+def reconciliar(categorias=()):
+    """
+    Compara las tres fuentes y, si se indican categorías, corrige esas
+    diferencias. Devuelve el informe (con `corregidos` si se aplicó algo).
+    """
+    desconocidas = set(categorias) - set(CATEGORIAS)
+    if desconocidas:
+        raise ValueError(f"Categorías desconocidas: {', '.join(sorted(desconocidas))}")
+    informe, contexto = comparar()
+    if categorias:
+        informe['corregidos'] = aplicar(contexto, categorias)
+    return informe
@@ -1,3 +1,360 @@
-from django.test import TestCase
+import io
+import json
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from api.models import Trabajo
+from api.trabajos import ejecutar_trabajo
+from gestion_red.connect import pools
+from gestion_red.difusion import suscribir
+from gestion_red.simuladores import SimuladorMikrotik, SimuladorOlt
+
+from . import exportacion, importacion
+from .cortes import RECONECTAR, SUSPENDER, ejecutar_corte
+from .reconciliacion import CATEGORIAS, reconciliar
+from .forms import ClienteForm
+from .models import Cliente, Dispositivo, PalabraNombre
+
+
+def _nuevo(nombre, telefono, onu_sn):
+    form = ClienteForm({'nombre': nombre, 'telefono': telefono, 'onu_sn': onu_sn, 'plan_servicio': '10M', 'activo': True})
+    return form.save()
+
+
+class CrearClienteTests(TestCase):
+    """
+    Alta desde la web contra un MikroTik y una OLT simulados: la vista solo
+    guarda el cliente y encola el trabajo, que se ejecuta en el hilo del test.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.mikrotik = cls.enterClassContext(SimuladorMikrotik())
+        cls.olt = cls.enterClassContext(SimuladorOlt())
+        cls.enterClassContext(override_settings(
+            MIKROTIK_IP='127.0.0.1', MIKROTIK_PORT=cls.mikrotik.puerto,
+            MIKROTIK_USER='admin', MIKROTIK_PASSWORD='admin',
+            OLT_IP='127.0.0.1', OLT_PORT=cls.olt.puerto, OLT_USER='admin', OLT_PASSWORD='admin',
+            TRABAJOS_EN_PROCESO=False,
+        ))
+        cls.addClassCleanup(lambda: [pool.close_all() for pool in pools()])
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('operador'))
+
+    def _secrets(self):
+        return [s['name'] for s in self.mikrotik._tablas['/ppp/secret'].values()]
+
+    def _crear(self, nombre, onu_sn):
+        respuesta = self.client.post(reverse('crear_cliente'), {
+            'nombre': nombre, 'telefono': '+34 (600) 12-34', 'onu_sn': onu_sn,
+            'plan_servicio': '10M', 'activo': 'on',
+        })
+        self.assertRedirects(respuesta, reverse('lista_clientes'), fetch_redirect_response=False)
+        trabajo = Trabajo.objects.get(tipo='crear_cliente')
+        ejecutar_trabajo(trabajo.pk)
+        trabajo.refresh_from_db()
+        return trabajo
+
+    def test_alta_encola_y_aprovisiona(self):
+        trabajo = self._crear('Ana Perez', 'ZTEG00000001')
+        self.assertEqual(trabajo.estado, Trabajo.COMPLETADO, trabajo.error)
+        cliente = Cliente.objects.get(onu_sn='ZTEG00000001')
+        self.assertEqual(trabajo.datos['cliente'], cliente.pk)
+        self.assertEqual(cliente.telefono, '+346001234')
+        self.assertIn('ZTEG00000001', self.olt.onus)
+        self.assertIn('Ana Perez', self._secrets())
+
+    def test_alta_rechazada_por_la_olt_borra_el_cliente(self):
+        self.olt.agregar_onu('ZTEG00000002')
+        trabajo = self._crear('Luis Gomez', 'ZTEG00000002')
+        self.assertEqual(trabajo.estado, Trabajo.FALLIDO)
+        self.assertFalse(Cliente.objects.filter(onu_sn='ZTEG00000002').exists())
+        # El secret que sí se creó se revirtió.
+        self.assertNotIn('Luis Gomez', self._secrets())
+
+    def _encolar(self, url, cliente):
+        respuesta = self.client.post(reverse(url, args=[cliente.pk]))
+        self.assertRedirects(respuesta, reverse('lista_clientes'), fetch_redirect_response=False)
+        return Trabajo.objects.get(tipo=url)
+
+    def test_desactivar_y_eliminar_encolan(self):
+        self._crear('Eva Ruiz', 'ZTEG00000003')
+        cliente = Cliente.objects.get(onu_sn='ZTEG00000003')
+
+        trabajo = self._encolar('desactivar_cliente', cliente)
+        # Hasta que los equipos lo confirman, el cliente sigue activo.
+        cliente.refresh_from_db()
+        self.assertTrue(cliente.activo)
+        ejecutar_trabajo(trabajo.pk)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, Trabajo.COMPLETADO, trabajo.error)
+        cliente.refresh_from_db()
+        self.assertFalse(cliente.activo)
+        self.assertIsNotNone(cliente.fecha_desactivacion)
+        self.assertFalse(self.olt.onus['ZTEG00000003']['servicio'])
+
+        trabajo = self._encolar('eliminar_cliente', cliente)
+        self.assertTrue(Cliente.objects.filter(pk=cliente.pk).exists())
+        ejecutar_trabajo(trabajo.pk)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, Trabajo.COMPLETADO, trabajo.error)
+        self.assertFalse(Cliente.objects.filter(pk=cliente.pk).exists())
+        self.assertNotIn('ZTEG00000003', self.olt.onus)
+        self.assertNotIn('Eva Ruiz', self._secrets())
+
+
+class CorteMasivoTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.mikrotik = cls.enterClassContext(SimuladorMikrotik())
+        cls.olt = cls.enterClassContext(SimuladorOlt())
+        cls.enterClassContext(override_settings(
+            MIKROTIK_IP='127.0.0.1', MIKROTIK_PORT=cls.mikrotik.puerto,
+            MIKROTIK_USER='admin', MIKROTIK_PASSWORD='admin',
+            OLT_IP='127.0.0.1', OLT_PORT=cls.olt.puerto, OLT_USER='admin', OLT_PASSWORD='admin',
+            CORTE_TAMANO_LOTE=2,
+        ))
+        cls.addClassCleanup(lambda: [pool.close_all() for pool in pools()])
+
+    def _cliente(self, nombre, onu_sn, onu=True):
+        if onu:
+            self.olt.agregar_onu(onu_sn)
+        self.mikrotik._guardar('/ppp/secret', {'.id': self.mikrotik._nuevo_id(), 'name': nombre, 'profile': '10M'})
+        return _nuevo(nombre, '1', onu_sn).pk
+
+    def _deshabilitado(self, nombre):
+        secret = next(s for s in self.mikrotik._tablas['/ppp/secret'].values() if s['name'] == nombre)
+        return secret.get('disabled') == 'true'
+
+    def test_repetir_un_corte_solo_procesa_lo_que_faltaba(self):
+        ids = [
+            self._cliente('corte1', 'ZTEG00000201'),
+            self._cliente('corte2', 'ZTEG00000202', onu=False),
+            self._cliente('corte3', 'ZTEG00000203'),
+        ]
+        progreso = []
+        informe = ejecutar_corte(SUSPENDER, ids, lambda i: progreso.append(i['procesados']))
+        self.assertEqual((informe['total'], informe['completados'], informe['fallidos']), (3, 2, 1))
+        self.assertIn('OLT', informe['errores'][str(ids[1])])
+        self.assertEqual(progreso, [2, 3])
+        activos = dict(Cliente.objects.filter(pk__in=ids).values_list('pk', 'activo'))
+        self.assertEqual(activos, {ids[0]: False, ids[1]: True, ids[2]: False})
+        self.assertFalse(self.olt.onus['ZTEG00000201']['servicio'])
+        self.assertTrue(self._deshabilitado('corte1'))
+
+        # Aparece la ONU que faltaba: la segunda pasada solo toca ese cliente.
+        self.olt.agregar_onu('ZTEG00000202')
+        comandos = self.olt.comandos['no']
+        informe = ejecutar_corte(SUSPENDER, ids)
+        self.assertEqual((informe['total'], informe['completados'], informe['fallidos']), (1, 1, 0))
+        self.assertEqual(self.olt.comandos['no'], comandos + 1)
+        self.assertFalse(Cliente.objects.filter(pk__in=ids, activo=True).exists())
+        self.assertIsNotNone(Cliente.objects.get(pk=ids[1]).fecha_desactivacion)
+
+        informe = ejecutar_corte(RECONECTAR, ids)
+        self.assertEqual((informe['total'], informe['completados']), (3, 3))
+        self.assertFalse(self._deshabilitado('corte2'))
+        self.assertTrue(self.olt.onus['ZTEG00000202']['servicio'])
+
+
+class ReconciliacionTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.mikrotik = cls.enterClassContext(SimuladorMikrotik())
+        cls.olt = cls.enterClassContext(SimuladorOlt())
+        cls.enterClassContext(override_settings(
+            MIKROTIK_IP='127.0.0.1', MIKROTIK_PORT=cls.mikrotik.puerto,
+            MIKROTIK_USER='admin', MIKROTIK_PASSWORD='admin',
+            OLT_IP='127.0.0.1', OLT_PORT=cls.olt.puerto, OLT_USER='admin', OLT_PASSWORD='admin',
+        ))
+        cls.addClassCleanup(lambda: [pool.close_all() for pool in pools()])
+
+    def _secret(self, nombre, disabled='false'):
+        self.mikrotik._guardar('/ppp/secret', {
+            '.id': self.mikrotik._nuevo_id(), 'name': nombre, 'profile': '10M', 'disabled': disabled,
+        })
+
+    def test_detecta_y_corrige_cada_categoria(self):
+        _nuevo('rec1', '1', 'ZTEG00000301')
+        self._secret('rec1')
+        self.olt.agregar_onu('ZTEG00000301')
+        # rec2 no tiene secret ni ONU; rec3 está inactivo con el secret habilitado.
+        _nuevo('rec2', '1', 'ZTEG00000302')
+        Cliente.objects.filter(pk=_nuevo('rec3', '1', 'ZTEG00000303').pk).update(activo=False)
+        self._secret('rec3')
+        self.olt.agregar_onu('ZTEG00000303')
+        self._secret('huerfano')
+        self.olt.agregar_onu('ZTEG00000399')
+
+        informe = reconciliar()
+        self.assertEqual(informe['totales'], {'clientes': 3, 'secrets': 3, 'onus': 3})
+        self.assertEqual(informe['detalle'], {
+            'secrets_huerfanos': ['huerfano'],
+            'sin_secret': ['rec2'],
+            'estado_distinto': ['rec3'],
+            'onus_huerfanas': ['ZTEG00000399'],
+            'sin_onu': ['ZTEG00000302'],
+        })
+        self.assertNotIn('corregidos', informe)
+
+        informe = reconciliar(CATEGORIAS)
+        self.assertEqual(informe['corregidos'], dict.fromkeys(CATEGORIAS, 1))
+        self.assertEqual(set(self.olt.onus), {'ZTEG00000301', 'ZTEG00000302', 'ZTEG00000303'})
+        self.assertEqual(set(reconciliar()['diferencias'].values()), {0})
+
+    def test_categoria_desconocida(self):
+        with self.assertRaises(ValueError):
+            reconciliar(['secrets_huerfanos', 'otra'])
+
+
+class DashboardTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('operador'))
+        self.addCleanup(cache.clear)
+
+    def test_sin_asgi_no_hay_eventos_en_vivo(self):
+        respuesta = self.client.get(reverse('eventos_dashboard'))
+        self.assertEqual(respuesta.status_code, 503)
+
+    @override_settings(DASHBOARD_PUSH_INTERVAL=0.05, MIKROTIK_IP='127.0.0.1', MIKROTIK_PORT=1)
+    def test_otro_proceso_con_el_turno_lee_el_router(self):
+        # El router no responde: si este proceso lo leyera publicaría un error.
+        cache.set('difusion:turno:default', 'otro-proceso', 60)
+        cache.set('difusion:ultimo:default', {'cpu_load': 7, 'timestamp': 1}, 60)
+        suscripcion = suscribir()
+        try:
+            evento = suscripcion.esperar(5)
+        finally:
+            suscripcion.cancelar()
+        self.assertEqual(evento, {'cpu_load': 7, 'timestamp': 1})
+        self.assertEqual(cache.get('difusion:turno:default'), 'otro-proceso')
+
+
+class BusquedaClientesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        _nuevo('Juan Pérez García', '+34 600-12-34', 'ZTEG00000001')
+        _nuevo('Pérez Ana', '(611) 22.33', 'ZTEG00000002')
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('operador'))
+
+    def _buscar(self, query):
+        respuesta = self.client.get(reverse('lista_clientes'), {'q': query})
+        return [cliente.onu_sn for cliente in respuesta.context['clientes']]
+
+    def test_prefijo_de_nombre(self):
+        self.assertEqual(self._buscar('juan p'), ['ZTEG00000001'])
+
+    def test_cualquier_palabra_del_nombre(self):
+        self.assertEqual(self._buscar('garcía'), ['ZTEG00000001'])
+        self.assertEqual(self._buscar('PÉREZ'), ['ZTEG00000001', 'ZTEG00000002'])
+        self.assertEqual(self._buscar('pérez  gar'), ['ZTEG00000001'])
+        self.assertEqual(self._buscar('rez'), [])
+
+    def test_el_indice_sigue_al_nombre(self):
+        cliente = Cliente.objects.get(onu_sn='ZTEG00000002')
+        cliente.nombre = 'Ana Gómez'
+        cliente.save()
+        self.assertEqual(self._buscar('pérez'), ['ZTEG00000001'])
+        self.assertEqual(self._buscar('gómez'), ['ZTEG00000002'])
+
+    def test_telefono_con_cualquier_formato(self):
+        self.assertEqual(self._buscar('611 22'), ['ZTEG00000002'])
+        self.assertEqual(self._buscar('+34 (600) 12'), ['ZTEG00000001'])
+        self.assertEqual(self._buscar('34600'), ['ZTEG00000001'])
+
+
+class ImportacionTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('operador'))
+
+    def _importar(self, csv, validar=False):
+        return importacion.importar(importacion.leer(io.BytesIO(csv.encode()), 'csv'), validar=validar)
+
+    def test_importa_y_resuelve_dispositivos_por_nombre(self):
+        olt = Dispositivo.objects.create(nombre='olt1', tipo=Dispositivo.OLT, host='h', usuario='u', password='p')
+        informe = self._importar(
+            'nombre,telefono,onu_sn,plan_servicio,olt,activo\n'
+            'a,555 1,SN1,10M,olt1,False\n'
+            'b,555 2,SN2,10M,,\n'
+        )
+        self.assertEqual((informe['creadas'], informe['con_errores']), (2, 0))
+        a = Cliente.objects.get(onu_sn='SN1')
+        self.assertEqual((a.olt, a.activo, a.telefono), (olt, False, '5551'))
+        self.assertTrue(Cliente.objects.get(onu_sn='SN2').activo)
+        self.assertEqual(
+            set(PalabraNombre.objects.values_list('cliente__onu_sn', 'texto')), {('SN1', 'a'), ('SN2', 'b')}
+        )
+
+    def test_un_error_por_fila(self):
+        _nuevo('x', '1', 'SN1')
+        informe = self._importar(
+            'nombre,telefono,onu_sn,plan_servicio,olt\n'
+            'a,1,SN1,10M,\n'      # SN ya existente
+            'b,1,SN2,10M,\n'
+            'c,1,SN2,10M,\n'      # SN repetido en el lote
+            ',1,SN3,10M,nada\n'   # sin nombre y con una OLT desconocida
+        )
+        self.assertEqual((informe['leidas'], informe['creadas'], informe['con_errores']), (4, 1, 3))
+        self.assertEqual(sorted(e['linea'] for e in informe['errores']), [2, 4, 5])
+        errores = {e['linea']: e['error'] for e in informe['errores']}
+        self.assertIn('nombre', errores[5])
+        self.assertIn('olt', errores[5])
+
+    def test_validar_no_escribe(self):
+        informe = self._importar('nombre,telefono,onu_sn,plan_servicio\na,1,SN1,10M\n', validar=True)
+        self.assertEqual(informe['creadas'], 1)
+        self.assertFalse(Cliente.objects.exists())
+
+    @override_settings(CLIENTES_EXPORTACION_LOTE=1)
+    def test_exportar_e_importar_ida_y_vuelta(self):
+        olt = Dispositivo.objects.create(nombre='olt1', tipo=Dispositivo.OLT, host='h', usuario='u', password='p')
+        _nuevo('Ana, "la" Ruiz', '+34 600', 'SN1')
+        Cliente.objects.filter(pk=_nuevo('Bea', '611', 'SN2').pk).update(olt=olt, activo=False)
+        _nuevo('Ciro Díaz', '622', 'SN3')
+        campos = ('nombre', 'telefono', 'onu_sn', 'plan_servicio', 'olt', 'activo')
+        originales = list(Cliente.objects.order_by('onu_sn').values_list(*campos))
+
+        for formato in ('csv', 'ndjson'):
+            with self.subTest(formato=formato):
+                respuesta = self.client.get(reverse('exportar_clientes'), {'formato': formato})
+                self.assertEqual(respuesta['Content-Type'], exportacion.FORMATOS[formato])
+                contenido = b''.join(respuesta.streaming_content)
+                self.assertEqual(len(contenido.decode().splitlines()), 4 if formato == 'csv' else 3)
+
+                Cliente.objects.all().delete()
+                informe = importacion.importar(importacion.leer(io.BytesIO(contenido), formato))
+                self.assertEqual((informe['creadas'], informe['con_errores']), (3, 0), informe['errores'])
+                self.assertEqual(list(Cliente.objects.order_by('onu_sn').values_list(*campos)), originales)
+
+    def test_exportar_solo_la_busqueda(self):
+        _nuevo('Ana Ruiz', '1', 'SN1')
+        _nuevo('Bea Gil', '2', 'SN2')
+        respuesta = self.client.get(reverse('exportar_clientes'), {'formato': 'ndjson', 'q': 'bea'})
+        filas = [json.loads(linea) for linea in b''.join(respuesta.streaming_content).splitlines()]
+        self.assertEqual([fila['onu_sn'] for fila in filas], ['SN2'])
+
+    def test_importar_desde_la_vista(self):
+        archivo = SimpleUploadedFile(
+            'clientes.ndjson', b'{"nombre": "a", "telefono": "1", "onu_sn": "SN1", "plan_servicio": "10M"}\n'
+                               b'no es json\n\n[1, 2]\n',
+        )
+        respuesta = self.client.post(reverse('importar_clientes'), {'archivo': archivo})
+        informe = respuesta.context['informe']
+        self.assertEqual((informe['leidas'], informe['creadas'], informe['con_errores']), (3, 1, 2))
+        self.assertEqual([e['linea'] for e in informe['errores']], [2, 4])
+        self.assertTrue(Cliente.objects.filter(onu_sn='SN1').exists())
@@ -0,0 +1,216 @@
+# clientes/trafico.py
+# Historial de tráfico por cliente. Cada ciclo lee de una sola vez los
+# contadores de todas las sesiones PPPoE de cada router, guarda la
+# diferencia con la lectura anterior (MuestraTrafico) y la consolida en
+# intervalos de 5 minutos, 1 hora y 1 día (ResumenTrafico). Las gráficas se
+# dibujan solo con los resúmenes.
+
+import logging
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from gestion_red.connect import connect_mikrotik
+from gestion_red.pool import LOTE, con_prioridad
+
+from .models import Cliente, Dispositivo, MuestraTrafico, ResumenTrafico
+from .reconciliacion import _equipos
+
+# Cada sesión PPPoE es una interfaz dinámica "<pppoe-NOMBRE>" en el router.
+INTERFAZ_PPPOE = re.compile(r'^<pppoe-(.+)>$')
+CAMPOS = ('name', 'rx-byte', 'tx-byte', 'rx-packet', 'tx-packet')
+CONTADORES = ('bytes_subida', 'bytes_bajada', 'paquetes_subida', 'paquetes_bajada')
+
+# Cada resolución se consolida a partir de la anterior (None: las muestras).
+NIVELES = (
+    (ResumenTrafico.CINCO_MINUTOS, None),
+    (ResumenTrafico.HORA, ResumenTrafico.CINCO_MINUTOS),
+    (ResumenTrafico.DIA, ResumenTrafico.HORA),
+)
+
+# Rango de las gráficas -> (período, resolución usada).
+RANGOS = {
+    'dia': (timedelta(days=1), ResumenTrafico.CINCO_MINUTOS),
+    'semana': (timedelta(days=7), ResumenTrafico.HORA),
+    'mes': (timedelta(days=30), ResumenTrafico.HORA),
+    'anio': (timedelta(days=365), ResumenTrafico.DIA),
+}
+
+
+def _clave_contadores(router):
+    return f'trafico:contadores:{router.pk if router is not None else "default"}'
+
+
+def _leer_contadores(router):
+    # Una sola consulta por router para todas las sesiones. En la interfaz
+    # pppoe-in del router, rx es lo que sube el cliente y tx lo que baja.
+    with connect_mikrotik(router) as api:
+        filas = api.rawCmd('/interface/print', '=stats=', f'=.proplist={",".join(CAMPOS)}', '?type=pppoe-in')
+        contadores = {}
+        for fila in filas:
+            match = INTERFAZ_PPPOE.match(fila.get('name', ''))
+            if match:
+                contadores[match.group(1)] = tuple(
+                    int(fila.get(campo, 0)) for campo in ('rx-byte', 'tx-byte', 'rx-packet', 'tx-packet')
+                )
+    return contadores
+
+
+def _diferencias(anteriores, actuales):
+    # Un contador menor que el anterior es una sesión nueva (se reinició en
+    # cero), igual que una sesión que no estaba en la lectura anterior.
+    diferencias = {}
+    for nombre, valores in actuales.items():
+        previos = anteriores.get(nombre)
+        if previos is None or any(v < p for v, p in zip(valores, previos)):
+            diferencias[nombre] = valores
+        else:
+            diferencias[nombre] = tuple(v - p for v, p in zip(valores, previos))
+    return diferencias
+
+
+def _recolectar_router(router, clientes, instante):
+    actuales = _leer_contadores(router)
+    clave = _clave_contadores(router)
+    anteriores = cache.get(clave)
+    cache.set(clave, actuales, timeout=None)
+    if anteriores is None:
+        # Primera lectura: todavía no hay con qué comparar.
+        return []
+    return [
+        MuestraTrafico(cliente_id=clientes[nombre], instante=instante, **dict(zip(CONTADORES, valores)))
+        for nombre, valores in _diferencias(anteriores, actuales).items()
+        if nombre in clientes and any(valores)
+    ]
+
+
+def recolectar():
+    """
+    Lee los contadores de todos los routers en paralelo y guarda una
+    muestra por cliente con tráfico desde la lectura anterior. Devuelve
+    cuántas muestras se guardaron.
+    """
+    instante = timezone.now()
+    clientes_por_router = defaultdict(dict)
+    for pk, nombre, router in Cliente.objects.values_list('pk', 'nombre', 'router').iterator(chunk_size=5000):
+        clientes_por_router[router][nombre] = pk
+    routers = _equipos(Dispositivo.MIKROTIK, clientes_por_router)
+
+    muestras = []
+    with ThreadPoolExecutor(max_workers=len(routers), thread_name_prefix='trafico') as executor:
+        futuros = {
+            executor.submit(con_prioridad(LOTE, _recolectar_router), router, clientes_por_router.get(pk, {}), instante): router
+            for pk, router in routers.items()
+        }
+        for futuro, router in futuros.items():
+            try:
+                muestras += futuro.result()
+            except Exception as e:
+                logging.error(f'No se pudo leer el tráfico de {router or "MikroTik"}: {e}')
+    MuestraTrafico.objects.bulk_create(muestras, batch_size=1000)
+    return len(muestras)
+
+
+def _inicio_intervalo(instante, resolucion):
+    # Los días empiezan a medianoche de la hora local; 5 minutos y 1 hora se
+    # alinean igual en cualquier zona con desfase de horas enteras.
+    if resolucion == ResumenTrafico.DIA:
+        return timezone.localtime(instante).replace(hour=0, minute=0, second=0, microsecond=0)
+    segundos = int(instante.timestamp())
+    return datetime.fromtimestamp(segundos - segundos % resolucion, tz=dt_timezone.utc)
+
+
+def _consolidar_nivel(resolucion, origen, hasta):
+    # Solo se consolidan intervalos cerrados, a partir del último ya consolidado.
+    hasta = _inicio_intervalo(hasta, resolucion)
+    if origen is None:
+        fuente, campo = MuestraTrafico.objects.all(), 'instante'
+    else:
+        fuente, campo = ResumenTrafico.objects.filter(resolucion=origen), 'inicio'
+    ultimo = ResumenTrafico.objects.filter(resolucion=resolucion).aggregate(ultimo=Max('inicio'))['ultimo']
+    if ultimo is None:
+        ultimo = fuente.aggregate(primero=Min(campo))['primero']
+        if ultimo is None:
+            return 0
+        desde = _inicio_intervalo(ultimo, resolucion)
+    else:
+        desde = ultimo + timedelta(seconds=resolucion)
+    if desde >= hasta:
+        return 0
+
+    sumas = defaultdict(lambda: [0] * len(CONTADORES))
+    filas = fuente.filter(**{f'{campo}__gte': desde, f'{campo}__lt': hasta}).values_list('cliente_id', campo, *CONTADORES)
+    for cliente_id, instante, *valores in filas.iterator(chunk_size=5000):
+        acumulado = sumas[cliente_id, _inicio_intervalo(instante, resolucion)]
+        for i, valor in enumerate(valores):
+            acumulado[i] += valor
+
+    ResumenTrafico.objects.bulk_create(
+        [
+            ResumenTrafico(cliente_id=cliente_id, resolucion=resolucion, inicio=inicio, **dict(zip(CONTADORES, valores)))
+            for (cliente_id, inicio), valores in sumas.items()
+        ],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['cliente', 'resolucion', 'inicio'],
+        update_fields=list(CONTADORES),
+    )
+    return len(sumas)
+
+
+def consolidar(ahora=None):
+    """
+    Suma las muestras en intervalos de 5 minutos, esos en horas y las horas
+    en días. Devuelve cuántos resúmenes se escribieron por resolución.
+    """
+    # Margen para no cerrar un intervalo mientras aún se guardan sus últimas muestras.
+    hasta = (ahora or timezone.now()) - timedelta(seconds=getattr(settings, 'TRAFICO_INTERVALO', 60))
+    return {resolucion: _consolidar_nivel(resolucion, origen, hasta) for resolucion, origen in NIVELES}
+
+
+def purgar(ahora=None):
+    """
+    Borra las muestras y resúmenes más antiguos que su retención.
+    """
+    ahora = ahora or timezone.now()
+    retencion = getattr(settings, 'TRAFICO_RETENCION', {})
+    borrados, _ = MuestraTrafico.objects.filter(
+        instante__lt=ahora - timedelta(days=retencion.get('muestras', 2))
+    ).delete()
+    for resolucion, dias in ((ResumenTrafico.CINCO_MINUTOS, 14), (ResumenTrafico.HORA, 180), (ResumenTrafico.DIA, 1825)):
+        cantidad, _ = ResumenTrafico.objects.filter(
+            resolucion=resolucion, inicio__lt=ahora - timedelta(days=retencion.get(resolucion, dias))
+        ).delete()
+        borrados += cantidad
+    return borrados
+
+
+def ciclo():
+    """
+    Una vuelta completa: recolectar, consolidar y purgar.
+    """
+    muestras = recolectar()
+    resumenes = consolidar()
+    purgados = purgar()
+    logging.info(f'Tráfico: {muestras} muestras, {sum(resumenes.values())} resúmenes, {purgados} filas purgadas.')
+    return muestras, resumenes, purgados
+
+
+def serie(cliente, rango='dia', ahora=None):
+    """
+    Tráfico del cliente en el rango pedido ('dia', 'semana', 'mes', 'anio'),
+    leído de los resúmenes. Devuelve la resolución usada y una lista de
+    (inicio, bytes_subida, bytes_bajada).
+    """
+    periodo, resolucion = RANGOS[rango]
+    desde = (ahora or timezone.now()) - periodo
+    filas = ResumenTrafico.objects.filter(
+        cliente=cliente, resolucion=resolucion, inicio__gte=desde
+    ).order_by('inicio').values_list('inicio', 'bytes_subida', 'bytes_bajada')
+    return resolucion, list(filas)
@@ -5,7 +5,12 @@ from . import views
 
 urlpatterns = [
     path('', views.dashboard, name='dashboard'), # <-- Esta es la nueva ruta principal
+    path('dashboard/eventos/', views.eventos_dashboard, name='eventos_dashboard'),
+    path('dashboard/metricas/', views.metricas_dashboard, name='metricas_dashboard'),
     path('clientes/', views.lista_clientes, name='lista_clientes'),
+    path('clientes/estado/', views.estado_clientes, name='estado_clientes'),
+    path('clientes/exportar/', views.exportar_clientes, name='exportar_clientes'),
+    path('clientes/importar/', views.importar_clientes, name='importar_clientes'),
     path('clientes/crear/', views.crear_cliente, name='crear_cliente'),
     path('clientes/editar/<int:pk>/', views.editar_cliente, name='editar_cliente'),
     path('clientes/detalle/<int:pk>/', views.detalle_cliente, name='detalle_cliente'),
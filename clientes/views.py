@@ -1,71 +1,278 @@
 # clientes/views.py
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.views.decorators.http import require_POST
 from django.conf import settings
-from .models import Cliente
+from django.db import transaction
+from django.utils import timezone
+from .models import Cliente, Dispositivo, EstadoOnu, PalabraNombre, normalizar_telefono
 from .forms import ClienteForm
+from . import exportacion, importacion, trafico
 from datetime import date
 from django.db.models import Q
 from django.contrib.auth.decorators import login_required
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import defaultdict
+import json
 import logging
+import re
 from librouteros import connect
 from librouteros.query import Key
-from gestion_red.connect import connect_mikrotik, connect_olt, execute_olt_command
+from api.trabajos import encolar
+from gestion_red.connect import connect_mikrotik
+from gestion_red.difusion import suscribir
+from gestion_red.monitor import obtener_snapshot
+from gestion_red.secrets_ppp import estado_secret, estados_secrets
+from gestion_red.sesiones_ppp import estado_sesion, estados_sesiones
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Números de serie GPON: 4 letras de fabricante + 8 dígitos hexadecimales (ZTEGC0A1B2C3).
+SN_ONU = re.compile(r'^[A-Za-z]{4}[0-9A-Fa-f]{0,8}$')
+LARGO_SN_ONU = 12
+COLUMNAS_LISTA = ('nombre', 'telefono', 'onu_sn', 'plan_servicio', 'activo', 'actualizado')
+MAX_ESTADOS = 200    # Clientes por petición de estado (una página de la lista)
+
 @login_required
 def dashboard(request):
     """
     Vista principal que muestra un resumen del estado de los equipos.
+    Se renderiza desde el snapshot que mantiene gestion_red.monitor, sin
+    consultar al MikroTik en cada carga.
     """
-    api = None
-    context = {}
+    snapshot, error = obtener_snapshot()
+    context = dict(snapshot or {})
 
-    try:
-        api = connect_mikrotik()
-        
-        system_health = list(api.path('system', 'health'))
-        if system_health:
-            health_data = system_health[0]
-            context['cpu_load'] = health_data.get('cpu-load', 'N/A')
-            context['free_memory'] = health_data.get('free-memory', 'N/A')
-            context['voltage'] = health_data.get('voltage', 'N/A')
-            context['temperature'] = health_data.get('temperature', 'N/A')
-            
-        ppp_active = list(api.path('ppp', 'active'))
-        context['active_users_count'] = len(ppp_active)
-        
-        ppp_secrets = list(api.path('ppp', 'secret'))
-        context['total_users_count'] = len(ppp_secrets)
-
-        system_resource = list(api.path('system', 'resource'))
-        if system_resource:
-            context['uptime'] = system_resource[0].get('uptime', 'N/A')
-
-    except Exception as e:
-        context['error_message'] = f'Error al conectar con MikroTik: {e}'
+    if snapshot is None:
+        context['error_message'] = error or 'Recopilando datos del MikroTik, recargue en unos segundos.'
+    elif error and snapshot['obsoleto']:
+        context['aviso'] = error
 
-    finally:
-        if api:
-            api.close()
-    
+    context['intervalo_sondeo'] = getattr(settings, 'DASHBOARD_POLL_INTERVAL', 15)
     return render(request, 'clientes/dashboard.html', context)
 
 
+@login_required
+def metricas_dashboard(request):
+    """
+    Métricas del dashboard en JSON desde el snapshot de gestion_red.monitor,
+    para los navegadores que no reciben las métricas en vivo.
+    """
+    snapshot, error = obtener_snapshot()
+    if snapshot is None or (error and snapshot['obsoleto']):
+        return JsonResponse({'success': False, 'message': error or 'Recopilando datos del MikroTik.'}, status=503)
+    return JsonResponse({'success': True, 'metricas': snapshot})
+
+
+def _evento_sse(evento):
+    return f"data: {json.dumps(evento)}\n\n"
+
+
+async def _eventos_async(router, keepalive):
+    suscripcion = suscribir(router)
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            evento = await suscripcion.esperar_async(keepalive)
+            yield _evento_sse(evento) if evento is not None else ": ping\n\n"
+    finally:
+        suscripcion.cancelar()
+
+
+@login_required
+def eventos_dashboard(request):
+    """
+    Server-Sent Events con las métricas en vivo del router (`?router=<pk>`;
+    sin él, el MikroTik de settings). Todos los navegadores conectados
+    comparten una única lectura del router (ver gestion_red.difusion).
+
+    Solo con ASGI, donde el flujo es una corrutina: con WSGI cada visor
+    ocuparía un hilo del servidor mientras tenga el dashboard abierto, así
+    que se responde 503 y el navegador pasa a consultar metricas_dashboard.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'success': False, 'message': 'Métricas en vivo solo disponibles con ASGI.'}, status=503)
+    router = None
+    if request.GET.get('router'):
+        router = get_object_or_404(Dispositivo, pk=request.GET['router'], tipo=Dispositivo.MIKROTIK)
+    keepalive = getattr(settings, 'DASHBOARD_SSE_KEEPALIVE', 15)
+    response = StreamingHttpResponse(_eventos_async(router, keepalive), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _filtro_busqueda(query):
+    """
+    Traduce el texto buscado a un filtro que pueda resolverse con los índices
+    de Cliente (búsquedas por prefijo o exactas, nunca LIKE '%...%').
+    """
+    query = query.strip()
+    telefono = normalizar_telefono(query).lstrip('+')
+    if telefono.isdigit():
+        # Los teléfonos se guardan normalizados, con o sin '+' inicial.
+        return Q(telefono__startswith=telefono) | Q(telefono__startswith=f'+{telefono}')
+    # Cualquier palabra del nombre (apellidos, segundo nombre) por prefijo, con el índice de PalabraNombre.
+    nombre = Q(pk__in=PalabraNombre.objects.filter(texto__istartswith=' '.join(query.lower().split())).values('cliente_id'))
+    if SN_ONU.match(query):
+        sn = Q(onu_sn__iexact=query) if len(query) == LARGO_SN_ONU else Q(onu_sn__istartswith=query)
+        return sn | nombre
+    return nombre
+
+
+def _codificar_cursor(cliente):
+    return urlsafe_b64encode(json.dumps([cliente.nombre, cliente.pk]).encode()).decode()
+
+
+def _decodificar_cursor(cursor):
+    try:
+        nombre, pk = json.loads(urlsafe_b64decode(cursor.encode()))
+        return str(nombre), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
 @login_required
 def lista_clientes(request):
+    """
+    Lista de clientes paginada. Cada fila se cachea con la versión del
+    cliente (`actualizado`); el estado en los equipos lo pide después el
+    navegador con una sola petición por página (estado_clientes). Con
+    `?parcial=1` (búsqueda mientras se escribe) devuelve solo las filas en
+    JSON y el navegador reemplaza las que cambiaron.
+    """
     query = request.GET.get('q')
+    clientes = Cliente.objects.only(*COLUMNAS_LISTA).order_by('nombre', 'pk')
     if query:
-        clientes = Cliente.objects.filter(
-            Q(nombre__icontains=query) |
-            Q(telefono__icontains=query) |
-            Q(onu_sn__icontains=query)
-        )
+        clientes = clientes.filter(_filtro_busqueda(query))
+
+    # Paginación por clave (nombre, pk): el coste no crece con el número de página.
+    cursor = _decodificar_cursor(request.GET.get('despues', ''))
+    if cursor:
+        nombre, pk = cursor
+        clientes = clientes.filter(Q(nombre__gt=nombre) | Q(nombre=nombre, pk__gt=pk))
+
+    por_pagina = getattr(settings, 'CLIENTES_POR_PAGINA', 50)
+    clientes = list(clientes[:por_pagina + 1])
+    siguiente = _codificar_cursor(clientes[por_pagina - 1]) if len(clientes) > por_pagina else None
+    context = {
+        'clientes': clientes[:por_pagina],
+        'query': query or '',
+        'siguiente': siguiente,
+        'paginado': bool(cursor),
+        'cache_filas': getattr(settings, 'CLIENTES_CACHE_FILAS', 86400),
+    }
+    if request.GET.get('parcial'):
+        return JsonResponse({
+            'success': True,
+            'filas': render_to_string('clientes/_filas_clientes.html', context, request=request),
+            'siguiente': siguiente,
+        })
+    return render(request, 'clientes/lista_clientes.html', context)
+
+
+@login_required
+def estado_clientes(request):
+    """
+    Estado en los equipos de los clientes `?ids=1,2,3` (los de una página de
+    la lista): sesión PPP y secret según los índices en memoria de cada
+    router, y la ONU según el último barrido de su OLT. Una sola petición
+    por página, sin consultar a los equipos.
+    """
+    try:
+        ids = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk]
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Ids de cliente inválidos.'}, status=400)
+    if len(ids) > MAX_ESTADOS:
+        return JsonResponse({'success': False, 'message': f'Como máximo {MAX_ESTADOS} clientes por petición.'}, status=400)
+
+    clientes = Cliente.objects.filter(pk__in=ids).select_related('router').only('nombre', 'onu_sn', 'router')
+    por_router = defaultdict(list)
+    for cliente in clientes:
+        por_router[cliente.router].append(cliente)
+    onus = {
+        onu.onu_sn: onu
+        for onu in EstadoOnu.objects.filter(onu_sn__in=[c.onu_sn for grupo in por_router.values() for c in grupo])
+    }
+
+    estados = {}
+    for router, grupo in por_router.items():
+        nombres = [cliente.nombre for cliente in grupo]
+        sesiones = estados_sesiones(nombres, router)
+        secrets = estados_secrets(nombres, router)
+        for cliente in grupo:
+            estados[cliente.pk] = {
+                # None: el índice o el espejo del router aún no está sincronizado.
+                'sesion': sesiones.get(cliente.nombre),
+                'secret': _estado_secret(secrets, cliente.nombre),
+                'onu': _estado_onu(onus.get(cliente.onu_sn)),
+            }
+    return JsonResponse({'success': True, 'clientes': estados})
+
+
+def _estado_secret(secrets, nombre):
+    if not secrets:
+        return None
+    secret = secrets.get(nombre)
+    if secret is None:
+        return {'existe': False}
+    return {'existe': True, 'perfil': secret['perfil'], 'deshabilitado': secret['deshabilitado']}
+
+
+def _estado_onu(onu):
+    if onu is None:
+        return None
+    return {'estado': onu.estado, 'potencia_rx': onu.potencia_rx, 'fuera_de_rango': onu.fuera_de_rango}
+
+
+def _peticion_invalida(request, mensaje):
+    return render(request, 'error.html', {'error_message': mensaje}, status=400)
+
+
+@login_required
+def exportar_clientes(request):
+    """
+    Exporta los clientes (`?formato=csv` o `ndjson`; con `?q=`, solo los que
+    coinciden con la búsqueda) como descarga que se genera por bloques, sin
+    cargar la lista entera en memoria.
+    """
+    formato = request.GET.get('formato', 'csv')
+    if formato not in exportacion.FORMATOS:
+        return _peticion_invalida(request, f'Formato de exportación desconocido: {formato}')
+    clientes = Cliente.objects.all()
+    if request.GET.get('q'):
+        clientes = clientes.filter(_filtro_busqueda(request.GET['q']))
+
+    if isinstance(request, ASGIRequest):
+        contenido = exportacion.contenido_async(clientes, formato)
     else:
-        clientes = Cliente.objects.all()
-    return render(request, 'clientes/lista_clientes.html', {'clientes': clientes})
+        contenido = exportacion.contenido(clientes, formato)
+    response = StreamingHttpResponse(contenido, content_type=exportacion.FORMATOS[formato])
+    response['Content-Disposition'] = f'attachment; filename="clientes-{date.today():%Y%m%d}.{formato}"'
+    return response
+
+
+@login_required
+def importar_clientes(request):
+    """
+    Alta masiva desde un archivo CSV o NDJSON con las columnas de la
+    exportación. Solo se crean los clientes en la base de datos; los
+    equipos se configuran después con la reconciliación.
+    """
+    informe = None
+    if request.method == 'POST':
+        archivo = request.FILES.get('archivo')
+        if archivo is None:
+            return _peticion_invalida(request, 'Seleccione un archivo para importar.')
+        formato = 'ndjson' if archivo.name.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+        informe = importacion.importar(
+            importacion.leer(archivo, formato), validar=bool(request.POST.get('validar')),
+        )
+        informe['validar'] = bool(request.POST.get('validar'))
+    return render(request, 'clientes/importar_clientes.html', {'informe': informe})
 
 
 @login_required
@@ -73,46 +280,23 @@ def crear_cliente(request):
     if request.method == 'POST':
         form = ClienteForm(request.POST)
         if form.is_valid():
-            cliente = form.save()
-
-            api = None
-            tn = None
-            try:
-                # 1. Configuración en la OLT (REAL)
-                logging.info("Iniciando aprovisionamiento en OLT...")
-                tn = connect_olt()
-                
-                # Comandos de ejemplo para la OLT ZTE
-                execute_olt_command(tn, "configure terminal")
-                execute_olt_command(tn, "interface gpon_olt-1/1/1")
-                execute_olt_command(tn, f"onu pre-config-mode serial-number {cliente.onu_sn}")
-                execute_olt_command(tn, "exit")
-                
-                logging.info(f"ONU {cliente.onu_sn} pre-configurada en OLT.")
-
-                # 2. Configuración en el MikroTik
-                api = connect_mikrotik()
-                secrets = api.path('ppp', 'secret')
-                secrets.add(
-                    name=cliente.nombre, 
-                    password='password_generada', 
-                    service='pppoe', 
-                    profile=cliente.plan_servicio
+            # El cliente y el trabajo que lo aprovisiona se guardan juntos: si
+            # el proceso muere, el trabajo se reanuda; si un equipo no está
+            # disponible, espera en la cola a que vuelva. El operador no
+            # espera a los equipos (el estado se ve en la lista y en /api/jobs/).
+            with transaction.atomic():
+                cliente = form.save()
+                trabajo = encolar(
+                    'crear_cliente',
+                    nombre=cliente.nombre,
+                    onu_sn=cliente.onu_sn,
+                    plan_servicio=cliente.plan_servicio,
+                    pppoe_password='password_generada',
+                    olt=cliente.olt_id,
+                    router=cliente.router_id,
+                    cliente=cliente.pk,
                 )
-                logging.info(f"Cliente {cliente.nombre} creado en MikroTik.")
-
-            except Exception as e:
-                if cliente:
-                    cliente.delete()
-                logging.error(f'Error al configurar equipos para {cliente.nombre}: {e}')
-                return render(request, 'error.html', {'error_message': f'Error al configurar equipos: {e}'})
-
-            finally:
-                if api:
-                    api.close()
-                if tn:
-                    tn.close()
-
+            logging.info(f"Aprovisionamiento de {cliente.nombre} encolado (trabajo #{trabajo.pk}).")
             return redirect('lista_clientes')
     else:
         form = ClienteForm()
@@ -135,72 +319,87 @@ def editar_cliente(request, pk):
 @login_required
 def detalle_cliente(request, pk):
     cliente = get_object_or_404(Cliente, pk=pk)
-    
-    api = None
+
     mikrotik_status = None
-    try:
-        api = connect_mikrotik()
-        active_users = api.path('ppp', 'active')
-        active_client = list(active_users.get(query={Key('name'): cliente.nombre}))
-        
-        if active_client:
-            mikrotik_status = "Conectado"
-        else:
-            mikrotik_status = "Desconectado"
-            
-    except Exception as e:
-        mikrotik_status = f"Error al conectar con MikroTik: {e}"
+    sesion = estado_sesion(cliente.nombre, cliente.router)
+    if sesion is None:
+        # El índice de sesiones aún no está sincronizado: consulta directa.
+        try:
+            with connect_mikrotik(cliente.router) as api:
+                active_users = api.path('ppp', 'active')
+                active_client = list(active_users.select(Key('.id')).where(Key('name') == cliente.nombre))
+            sesion = {'online': bool(active_client)}
+        except Exception as e:
+            mikrotik_status = f"Error al conectar con MikroTik: {e}"
+
+    if sesion is not None:
+        mikrotik_status = "Conectado" if sesion['online'] else "Desconectado"
+
+    rango = request.GET.get('rango')
+    if rango not in trafico.RANGOS:
+        rango = 'dia'
+    resolucion, filas = trafico.serie(cliente, rango)
 
-    finally:
-        if api:
-            api.close()
-            
     return render(request, 'clientes/detalle_cliente.html', {
-        'cliente': cliente, 
-        'mikrotik_status': mikrotik_status
+        'cliente': cliente,
+        'mikrotik_status': mikrotik_status,
+        'sesion': sesion,
+        # Perfil y estado del secret según el espejo local, sin consultar al router.
+        'secret': estado_secret(cliente.nombre, cliente.router),
+        'rango': rango,
+        'rangos': trafico.RANGOS,
+        'grafico': _grafico_trafico(filas, resolucion, trafico.RANGOS[rango][0]),
+        'estado_onu': EstadoOnu.objects.filter(onu_sn=cliente.onu_sn).first(),
     })
 
 
+def _grafico_trafico(filas, resolucion, periodo, ancho=600, alto=150):
+    """
+    Coordenadas SVG de las líneas de subida y bajada (Mbps promedio de cada
+    intervalo) a partir de los resúmenes de tráfico, o None si no hay datos.
+    """
+    if not filas:
+        return None
+    desde = timezone.now() - periodo
+
+    def mbps(cantidad):
+        return cantidad * 8 / resolucion / 1_000_000
+
+    maximo = max(max(mbps(subida), mbps(bajada)) for _, subida, bajada in filas) or 1
+
+    def puntos(columna):
+        return ' '.join(
+            f'{(fila[0] - desde) / periodo * ancho:.1f},{alto - mbps(fila[columna]) / maximo * alto:.1f}'
+            for fila in filas
+        )
+
+    return {
+        'ancho': ancho,
+        'alto': alto,
+        'subida': puntos(1),
+        'bajada': puntos(2),
+        'maximo': round(maximo, 2),
+        'total_subida': sum(fila[1] for fila in filas),
+        'total_bajada': sum(fila[2] for fila in filas),
+    }
+
+
 @login_required
 @require_POST
 def desactivar_cliente(request, pk):
     cliente = get_object_or_404(Cliente, pk=pk)
     if cliente.activo:
-        api = None
-        tn = None
-        try:
-            # 1. Desactivar en MikroTik
-            api = connect_mikrotik()
-            secrets = api.path('ppp', 'secret')
-            
-            user = secrets.get(query={Key('name'): cliente.nombre})
-            if user:
-                secrets.disable(user[0]['.id'])
-            logging.info(f"Cliente {cliente.nombre} desactivado en MikroTik.")
-
-            # 2. Desactivar en la OLT
-            logging.info(f"Iniciando desactivación en OLT para cliente {cliente.nombre}...")
-            tn = connect_olt()
-            execute_olt_command(tn, "configure terminal")
-            execute_olt_command(tn, f"no onu service {cliente.onu_sn}")
-            execute_olt_command(tn, "exit")
-            logging.info(f"Servicio de ONU {cliente.onu_sn} desactivado en OLT.")
-            
-            # 3. Actualizar la base de datos local
-            cliente.activo = False
-            cliente.fecha_desactivacion = date.today()
-            cliente.save()
-
-        except Exception as e:
-            logging.error(f'Error al desactivar cliente {cliente.nombre}: {e}')
-            return render(request, 'error.html', {'error_message': f'Error al desactivar cliente: {e}'})
-        
-        finally:
-            if api:
-                api.close()
-            if tn:
-                tn.close()
-                
+        # Como el alta: el trabajo desactiva en MikroTik y en la OLT y marca
+        # al cliente inactivo cuando los equipos lo confirman.
+        trabajo = encolar(
+            'desactivar_cliente',
+            nombre=cliente.nombre,
+            onu_sn=cliente.onu_sn,
+            olt=cliente.olt_id,
+            router=cliente.router_id,
+            cliente=cliente.pk,
+        )
+        logging.info(f"Desactivación de {cliente.nombre} encolada (trabajo #{trabajo.pk}).")
     return redirect('lista_clientes')
 
 
@@ -208,37 +407,15 @@ def desactivar_cliente(request, pk):
 @require_POST
 def eliminar_cliente(request, pk):
     cliente = get_object_or_404(Cliente, pk=pk)
-    api = None
-    tn = None
-    try:
-        # 1. Eliminar de MikroTik
-        api = connect_mikrotik()
-        secrets = api.path('ppp', 'secret')
-        
-        user = secrets.get(query={Key('name'): cliente.nombre})
-        if user:
-            secrets.remove(user[0]['.id'])
-        logging.info(f"Cliente {cliente.nombre} eliminado de MikroTik.")
-
-        # 2. Eliminar de la OLT
-        logging.info(f"Iniciando eliminación en OLT para cliente {cliente.nombre}...")
-        tn = connect_olt()
-        execute_olt_command(tn, "configure terminal")
-        execute_olt_command(tn, f"no onu {cliente.onu_sn}")
-        execute_olt_command(tn, "exit")
-        logging.info(f"ONU {cliente.onu_sn} eliminada de OLT.")
-        
-        # 3. Eliminar de la base de datos local
-        cliente.delete()
-        
-    except Exception as e:
-        logging.error(f'Error al eliminar cliente {cliente.nombre}: {e}')
-        return render(request, 'error.html', {'error_message': f'Error al eliminar cliente: {e}'})
-
-    finally:
-        if api:
-            api.close()
-        if tn:
-            tn.close()
-
+    # El cliente se borra de la base de datos cuando el trabajo lo haya
+    # eliminado de MikroTik y de la OLT.
+    trabajo = encolar(
+        'eliminar_cliente',
+        nombre=cliente.nombre,
+        onu_sn=cliente.onu_sn,
+        olt=cliente.olt_id,
+        router=cliente.router_id,
+        cliente=cliente.pk,
+    )
+    logging.info(f"Eliminación de {cliente.nombre} encolada (trabajo #{trabajo.pk}).")
     return redirect('lista_clientes')
\ No newline at end of file
@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "gestion_red.settings")
 
 application = get_asgi_application()
+
+# Al arrancar, reanudar los trabajos que quedaron pendientes o a medias.
+from django.conf import settings
+
+if getattr(settings, 'TRABAJOS_EN_PROCESO', True):
+    from api.trabajos import iniciar_despachador
+
+    iniciar_despachador()
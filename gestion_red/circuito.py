@@ -0,0 +1,161 @@
+# gestion_red/circuito.py
+# Cortacircuitos por equipo: tras varias fallas seguidas al conectar con un
+# router u OLT se deja de intentarlo durante un rato, y las peticiones fallan
+# al instante en lugar de esperar el timeout de conexión cada una.
+
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .pool import CircuitoAbierto
+
+CERRADO = 'cerrado'         # funcionamiento normal
+ABIERTO = 'abierto'         # el equipo no responde: se rechaza todo
+SEMIABIERTO = 'semiabierto'  # pasó la espera: una sola petición prueba el equipo
+
+
+class Circuito:
+    """
+    Estado de salud de un equipo, compartido por sus pools síncrono y async.
+
+    Tras `umbral` fallas seguidas el circuito se abre y `permitir()` lanza
+    CircuitoAbierto. Pasados `espera` segundos queda semiabierto: deja pasar
+    una sola petición de prueba (otra más por cada `espera` si la prueba no
+    termina); si funciona el circuito se cierra y si falla vuelve a abrirse.
+    """
+
+    def __init__(self, nombre, umbral=5, espera=30):
+        self.nombre = nombre
+        self.umbral = umbral
+        self.espera = espera
+        self._lock = threading.Lock()
+        self._estado = CERRADO
+        self._fallas = 0         # fallas seguidas
+        self._abierto_desde = None
+        self._prueba = None      # instante en que salió la última petición de prueba
+        self._ultimo_error = None
+
+        # Métricas acumuladas.
+        self._aperturas = 0
+        self._rechazadas = 0
+
+    @property
+    def estado(self):
+        with self._lock:
+            return self._estado_actual(time.monotonic())
+
+    @property
+    def cerrado(self):
+        return self._estado == CERRADO
+
+    def permitir(self):
+        """
+        Lanza CircuitoAbierto si ahora no se debe intentar usar el equipo.
+        """
+        if self._estado == CERRADO:
+            return
+        with self._lock:
+            ahora = time.monotonic()
+            estado = self._estado_actual(ahora)
+            if estado == CERRADO:
+                return
+            if estado == SEMIABIERTO and (self._prueba is None or ahora - self._prueba >= self.espera):
+                self._estado = SEMIABIERTO
+                self._prueba = ahora
+                logging.info(f"{self.nombre}: circuito semiabierto, se prueba el equipo.")
+                return
+            self._rechazadas += 1
+            reintento = max(0, self.espera - (ahora - (self._prueba or self._abierto_desde)))
+            raise CircuitoAbierto(
+                f"{self.nombre}: equipo no disponible tras {self._fallas} fallas seguidas "
+                f"({self._ultimo_error}); se reintentará en {reintento:.0f}s."
+            )
+
+    def exito(self):
+        if self._estado == CERRADO and not self._fallas:
+            return
+        with self._lock:
+            if self._estado != CERRADO:
+                logging.warning(f"{self.nombre}: el equipo responde de nuevo, circuito cerrado.")
+            self._estado = CERRADO
+            self._fallas = 0
+            self._abierto_desde = None
+            self._prueba = None
+
+    def fallo(self, error=None):
+        with self._lock:
+            self._fallas += 1
+            if error is not None:
+                self._ultimo_error = f'{type(error).__name__}: {error}'
+            # Una prueba fallida vuelve a abrirlo sin esperar al umbral.
+            if self._estado != CERRADO or self._fallas >= self.umbral:
+                if self._estado == CERRADO:
+                    self._aperturas += 1
+                    logging.error(
+                        f"{self.nombre}: circuito abierto tras {self._fallas} fallas seguidas "
+                        f"({self._ultimo_error})."
+                    )
+                self._estado = ABIERTO
+                self._abierto_desde = time.monotonic()
+                self._prueba = None
+
+    def _estado_actual(self, ahora):
+        # Con el lock tomado. La espera vencida se ve como semiabierto.
+        if self._estado == ABIERTO and ahora - self._abierto_desde >= self.espera:
+            return SEMIABIERTO
+        return self._estado
+
+    def stats(self):
+        with self._lock:
+            ahora = time.monotonic()
+            return {
+                'estado': self._estado_actual(ahora),
+                'fallas_seguidas': self._fallas,
+                'umbral': self.umbral,
+                'espera': self.espera,
+                'abierto_hace': round(ahora - self._abierto_desde, 1) if self._abierto_desde else None,
+                'ultimo_error': self._ultimo_error,
+                'aperturas': self._aperturas,
+                'rechazadas': self._rechazadas,
+            }
+
+
+# Un circuito por equipo: (tipo, host, puerto) -> Circuito.
+_circuitos = {}
+_circuitos_pid = None
+_circuitos_lock = threading.Lock()
+
+
+def circuito_de(tipo, host, puerto):
+    """
+    Devuelve el circuito del equipo, creándolo la primera vez. Se comparte
+    entre los pools síncrono y async del proceso, y sobrevive a que el pool
+    se recree por un cambio de credenciales.
+    """
+    global _circuitos_pid
+    with _circuitos_lock:
+        if _circuitos_pid != os.getpid():
+            _circuitos.clear()
+            _circuitos_pid = os.getpid()
+        clave = (tipo, host, puerto)
+        circuito = _circuitos.get(clave)
+        if circuito is None:
+            circuito = _circuitos[clave] = Circuito(
+                f'{tipo}@{host}:{puerto}',
+                umbral=getattr(settings, 'CIRCUITO_UMBRAL', 5),
+                espera=getattr(settings, 'CIRCUITO_ESPERA', 30),
+            )
+        return circuito
+
+
+def circuitos():
+    """
+    Devuelve los circuitos de este proceso como {(tipo, host, puerto): Circuito}.
+    """
+    with _circuitos_lock:
+        if _circuitos_pid != os.getpid():
+            return {}
+        return dict(_circuitos)
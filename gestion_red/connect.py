@@ -1,52 +1,382 @@
 # gestion_red/connect.py
 
 from librouteros import connect
+from librouteros.api import Path
+from librouteros.exceptions import ConnectionClosed, FatalError
 from django.conf import settings
-import telnetlib
-import time
+from collections import namedtuple
+from contextlib import suppress
+import os
+import threading
 
-def connect_mikrotik():
+from .circuito import circuito_de
+from .metricas import medir
+from .olt import OltCommandError, OltError, OltSession
+from .pool import PLAZO, ConnectionPool, PlazoAgotado, PoolTimeout, tiempo_restante
+
+# Errores tras los cuales la conexión a MikroTik ya no es reutilizable.
+# TrapError (p. ej. "no such item") deja la sesión en buen estado.
+ERRORES_CONEXION_MIKROTIK = (ConnectionClosed, FatalError, OSError)
+
+# Errores que indican que la sesión Telnet con la OLT se cortó.
+ERRORES_CONEXION_OLT = (EOFError, OSError)
+
+PUERTO_API_MIKROTIK = 8728
+PUERTO_TELNET_OLT = 23
+
+# Datos de acceso a un equipo; `limite` es su máximo de conexiones simultáneas.
+Equipo = namedtuple('Equipo', ['host', 'puerto', 'usuario', 'password', 'limite'])
+
+# Un pool por equipo: (tipo, host, puerto) -> (Equipo, pool).
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+def texto_comando(cmd, palabras=()):
+    # Texto del comando para el registro de operaciones lentas, sin contraseñas.
+    return ' '.join([cmd, *('=password=***' if p.startswith('=password=') else p for p in palabras)])
+
+
+def _operacion_mikrotik(cmd):
+    # '/ppp/secret/print' -> 'print'
+    return cmd.rsplit('/', 1)[-1]
+
+
+class ConexionMikrotik:
     """
-    Establece y devuelve una conexión a la API de MikroTik.
+    Conexión a MikroTik prestada por el pool del proceso.
+
+    Se usa igual que la `Api` de librouteros. `close()` la devuelve al pool en
+    lugar de cerrar el socket; si durante su uso hubo un error de conexión,
+    se descarta y el pool abrirá otra. También puede usarse con `with`.
+
+    Dentro de un `plazo` (gestion_red.pool) cada lectura espera como mucho lo
+    que quede de él, y al agotarse se lanza PlazoAgotado y la conexión se
+    descarta (la respuesta quedó a medias).
     """
-    api = connect(
-        username=settings.MIKROTIK_USER,
-        password=settings.MIKROTIK_PASSWORD,
-        host=settings.MIKROTIK_IP
-    )
+
+    def __init__(self, pool, api):
+        self._pool = pool
+        self._api = api
+        self._rota = False
+        self._error = None
+
+    def __call__(self, cmd, /, **kwargs):
+        texto = texto_comando(cmd, [f'={clave}={valor}' for clave, valor in kwargs.items()])
+        try:
+            with medir('mikrotik', self._pool.nombre, _operacion_mikrotik(cmd), texto):
+                yield from self._con_plazo(self._api(cmd, **kwargs))
+        except (*ERRORES_CONEXION_MIKROTIK, PlazoAgotado) as e:
+            self._romper(e)
+            raise
+
+    def rawCmd(self, cmd, *words):
+        try:
+            with medir('mikrotik', self._pool.nombre, _operacion_mikrotik(cmd), texto_comando(cmd, words)):
+                yield from self._con_plazo(self._api.rawCmd(cmd, *words))
+        except (*ERRORES_CONEXION_MIKROTIK, PlazoAgotado) as e:
+            self._romper(e)
+            raise
+
+    def _con_plazo(self, filas):
+        if PLAZO.get() is None:
+            yield from filas
+            return
+        sock = self._api.protocol.transport.sock
+        previo = sock.gettimeout()
+        try:
+            while True:
+                sock.settimeout(tiempo_restante(previo))
+                try:
+                    fila = next(filas)
+                except StopIteration:
+                    return
+                yield fila
+        except OSError:
+            # Si lo que venció es el plazo, PlazoAgotado en lugar del timeout del socket.
+            tiempo_restante()
+            raise
+        finally:
+            with suppress(OSError):
+                sock.settimeout(previo)
+
+    def _romper(self, error):
+        self._rota = True
+        self._error = error
+
+    def path(self, *path):
+        # Las rutas quedan ligadas al envoltorio para detectar conexiones rotas.
+        return Path(path='', api=self).join(*path)
+
+    def __getattr__(self, name):
+        return getattr(self._api, name)
+
+    def close(self):
+        if self._api is not None:
+            self._pool.release(self._api, rota=self._rota, error=self._error)
+            self._api = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and issubclass(exc_type, (*ERRORES_CONEXION_MIKROTIK, PlazoAgotado)):
+            self._romper(exc)
+        self.close()
+
+
+def _datos_mikrotik(dispositivo):
+    limite = getattr(settings, 'MIKROTIK_POOL_SIZE', 4)
+    if dispositivo is None:
+        return Equipo(settings.MIKROTIK_IP, getattr(settings, 'MIKROTIK_PORT', PUERTO_API_MIKROTIK),
+                      settings.MIKROTIK_USER, settings.MIKROTIK_PASSWORD, limite)
+    return Equipo(dispositivo.host, dispositivo.puerto or PUERTO_API_MIKROTIK,
+                  dispositivo.usuario, dispositivo.password, dispositivo.max_sesiones or limite)
+
+
+def _datos_olt(dispositivo):
+    limite = getattr(settings, 'OLT_SESSION_POOL_SIZE', 2)
+    if dispositivo is None:
+        return Equipo(settings.OLT_IP, getattr(settings, 'OLT_PORT', PUERTO_TELNET_OLT),
+                      settings.OLT_USER, settings.OLT_PASSWORD, limite)
+    return Equipo(dispositivo.host, dispositivo.puerto or PUERTO_TELNET_OLT,
+                  dispositivo.usuario, dispositivo.password, dispositivo.max_sesiones or limite)
+
+
+def _obtener_pool(tipo, datos, fabricar):
+    """
+    Devuelve el pool del equipo descrito por `datos` (un Equipo), creándolo
+    con `fabricar(datos)` la primera vez. Si cambiaron las credenciales o el
+    límite se cierra el pool anterior (y si ya estaba cerrado, se crea otro). Tras un fork (p. ej. workers
+    de gunicorn) se empieza de cero.
+    """
+    global _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+        clave = (tipo, datos.host, datos.puerto)
+        anterior = _pools.get(clave)
+        if anterior is not None and anterior[0] == datos and not anterior[1]._cerrado:
+            return anterior[1]
+        if anterior is not None:
+            anterior[1].close_all()
+        pool = fabricar(datos)
+        _pools[clave] = (datos, pool)
+        return pool
+
+
+def pools():
+    """
+    Devuelve los pools abiertos en este proceso, uno por equipo.
+    """
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            return []
+        return [pool for _, pool in _pools.values()]
+
+
+def _abrir_mikrotik(datos, timeout=10):
+    # La conexión y el login se ajustan al plazo del contexto; luego el
+    # socket vuelve a `timeout`, porque la conexión sobrevive a la petición.
+    try:
+        api = connect(
+            username=datos.usuario,
+            password=datos.password,
+            host=datos.host,
+            port=datos.puerto,
+            timeout=tiempo_restante(timeout),
+        )
+    except OSError:
+        tiempo_restante()
+        raise
+    api.protocol.transport.sock.settimeout(timeout)
     return api
 
-def connect_olt():
+
+def _sondear_mikrotik(api):
+    return tuple(api('/system/identity/print'))
+
+
+def _crear_pool_mikrotik(datos):
+    return ConnectionPool(
+        crear=lambda: _abrir_mikrotik(datos),
+        validar=_sondear_mikrotik,
+        cerrar=lambda api: api.close(),
+        tamano=datos.limite,
+        timeout=getattr(settings, 'MIKROTIK_POOL_TIMEOUT', 10),
+        keepalive=getattr(settings, 'MIKROTIK_POOL_KEEPALIVE', 30),
+        max_inactividad=getattr(settings, 'MIKROTIK_POOL_MAX_IDLE', 300),
+        nombre=f'mikrotik@{datos.host}:{datos.puerto}',
+        cola_maxima=getattr(settings, 'MIKROTIK_POOL_QUEUE_MAX', None),
+        circuito=circuito_de('mikrotik', datos.host, datos.puerto),
+    )
+
+
+def get_mikrotik_pool(dispositivo=None):
+    """
+    Devuelve el pool de conexiones del proceso para el router `dispositivo`
+    (o el MikroTik de settings si es None), creándolo la primera vez.
+    """
+    return _obtener_pool('mikrotik', _datos_mikrotik(dispositivo), _crear_pool_mikrotik)
+
+
+def connect_mikrotik(dispositivo=None):
+    """
+    Devuelve una conexión a la API de MikroTik tomada del pool del proceso
+    para ese router. Al cerrarla (o al salir del bloque `with`) vuelve al pool.
+    """
+    pool = get_mikrotik_pool(dispositivo)
+    with medir('mikrotik', pool.nombre, 'conexion'):
+        return ConexionMikrotik(pool, pool.acquire())
+
+
+def connect_mikrotik_dedicada(timeout=10, dispositivo=None):
+    """
+    Abre una conexión a MikroTik propia, fuera del pool, para comandos que la
+    ocupan indefinidamente (p. ej. `listen`). Quien la abre debe cerrarla.
+    """
+    return _abrir_mikrotik(_datos_mikrotik(dispositivo), timeout=timeout)
+
+class ConexionOlt:
+    """
+    Sesión Telnet a la OLT prestada por el gestor de sesiones del proceso.
+
+    `close()` devuelve la sesión (de vuelta en modo exec) para que la use la
+    siguiente petición sin volver a hacer login. Si la sesión prestada resulta
+    estar caída en la primera operación, se reemplaza por una nueva y se
+    reintenta una vez. También puede usarse con `with`.
+    """
+
+    def __init__(self, pool, sesion):
+        self._pool = pool
+        self._sesion = sesion
+        self._rota = False
+        self._error = None
+        self._operaciones = 0
+
+    def ejecutar(self, comando):
+        with medir('olt', self._pool.nombre, 'comando', comando):
+            return self._con_reintento(lambda sesion: sesion.ejecutar(comando))
+
+    def ejecutar_script(self, comandos):
+        with medir('olt', self._pool.nombre, 'script', '; '.join(comandos)):
+            return self._con_reintento(lambda sesion: sesion.ejecutar_script(comandos))
+
+    def _con_reintento(self, operacion):
+        try:
+            resultado = self._operar(operacion)
+        except ERRORES_CONEXION_OLT as e:
+            if self._operaciones:
+                raise
+            # La sesión murió mientras estaba ociosa: se abre otra y se reintenta.
+            self._pool.release(self._sesion, rota=True, error=e)
+            self._sesion = None
+            self._sesion = self._pool.acquire()
+            self._rota = False
+            self._error = None
+            resultado = self._operar(operacion)
+        self._operaciones += 1
+        return resultado
+
+    def _operar(self, operacion):
+        try:
+            return operacion(self._sesion)
+        except (OltError, PlazoAgotado, *ERRORES_CONEXION_OLT) as e:
+            # Sin prompt no sabemos en qué estado quedó la CLI.
+            self._rota = True
+            self._error = e
+            raise
+
+    def close(self):
+        if self._sesion is None:
+            return
+        if not self._rota:
+            try:
+                self._sesion.restablecer()
+            except (OltError, PlazoAgotado, *ERRORES_CONEXION_OLT) as e:
+                self._rota = True
+                self._error = e
+        self._pool.release(self._sesion, rota=self._rota, error=self._error)
+        self._sesion = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _abrir_olt(datos):
+    return OltSession(
+        datos.host,
+        datos.usuario,
+        datos.password,
+        timeout=getattr(settings, 'OLT_TIMEOUT', 10),
+        puerto=datos.puerto,
+    )
+
+
+def _crear_pool_olt(datos):
+    return ConnectionPool(
+        crear=lambda: _abrir_olt(datos),
+        validar=lambda sesion: sesion.sondear(),
+        cerrar=lambda sesion: sesion.close(),
+        tamano=datos.limite,
+        timeout=getattr(settings, 'OLT_SESSION_TIMEOUT', 30),
+        keepalive=getattr(settings, 'OLT_SESSION_KEEPALIVE', 60),
+        max_inactividad=getattr(settings, 'OLT_SESSION_MAX_IDLE', 540),
+        nombre=f'olt@{datos.host}:{datos.puerto}',
+        cola_maxima=getattr(settings, 'OLT_SESSION_QUEUE_MAX', None),
+        circuito=circuito_de('olt', datos.host, datos.puerto),
+    )
+
+
+def get_olt_pool(dispositivo=None):
+    """
+    Devuelve el gestor de sesiones Telnet del proceso para la OLT
+    `dispositivo` (o la OLT de settings si es None): un pool de sesiones
+    autenticadas que se mantienen abiertas entre peticiones. Cada sesión se
+    presta en exclusiva, así dos workers nunca comparten la CLI.
+    """
+    return _obtener_pool('olt', _datos_olt(dispositivo), _crear_pool_olt)
+
+
+def connect_olt(dispositivo=None):
     """
-    Establece y devuelve una conexión Telnet a la OLT.
+    Devuelve una sesión Telnet ya autenticada a la OLT `dispositivo` (o la de
+    settings), tomada del gestor de sesiones del proceso. Al cerrarla (o al
+    salir del bloque `with`) vuelve al gestor. Si todas las sesiones están en
+    uso espera su turno según la prioridad del contexto; lanza PoolTimeout
+    (PoolSaturado si la cola está llena, CircuitoAbierto si la OLT viene
+    fallando) si no lo obtiene, y PlazoAgotado si vence el plazo del contexto.
     """
     try:
-        tn = telnetlib.Telnet(settings.OLT_IP)
-        time.sleep(1)
-        tn.read_until(b"Username:")
-        tn.write(settings.OLT_USER.encode('ascii') + b"\n")
-        tn.read_until(b"Password:")
-        tn.write(settings.OLT_PASSWORD.encode('ascii') + b"\n")
-        time.sleep(1)
-
-        output = tn.read_until(b"#", timeout=5).decode('ascii')
-
-        if "#" not in output:
-            raise Exception("No se pudo conectar a la OLT. Verifique las credenciales.")
-            
-        return tn
+        pool = get_olt_pool(dispositivo)
+        with medir('olt', pool.nombre, 'conexion'):
+            return ConexionOlt(pool, pool.acquire())
+    except (PoolTimeout, PlazoAgotado):
+        # La OLT está ocupada o no disponible: quien llama puede reintentar luego.
+        raise
     except Exception as e:
-        raise Exception(f"Error al conectar con la OLT por Telnet: {e}")
+        raise Exception(f"Error al conectar con la OLT por Telnet: {e}") from e
+
 
 def execute_olt_command(tn, command):
     """
     Ejecuta un comando en la OLT y devuelve la salida.
     """
-    tn.write(command.encode('ascii') + b'\n')
-    time.sleep(2)
-    output = tn.read_until(b"#", timeout=5).decode('ascii')
-    
-    output_lines = output.split('\n')
-    cleaned_output = [line for line in output_lines if command not in line and line.strip()]
-    
-    return "\n".join(cleaned_output)
\ No newline at end of file
+    return tn.ejecutar(command)
+
+
+def execute_olt_script(tn, commands, check=True):
+    """
+    Ejecuta una lista de comandos en la OLT en un solo envío y devuelve el
+    resultado de cada uno (`comando`, `salida`, `error`). Con `check=True`
+    lanza OltCommandError si la OLT rechazó alguno de ellos.
+    """
+    resultados = tn.ejecutar_script(commands)
+    if check and any(r.error for r in resultados):
+        raise OltCommandError(resultados)
+    return resultados
@@ -0,0 +1,290 @@
+# gestion_red/connect_async.py
+# Conexiones a OLT y MikroTik para código asyncio (vistas asíncronas). Misma
+# política que gestion_red.connect (un pool por equipo, límite de sesiones,
+# cola por prioridad), pero sin ocupar un hilo por operación en curso.
+
+import asyncio
+import weakref
+
+from django.conf import settings
+from librouteros import async_connect
+from librouteros.api import AsyncPath
+
+from .connect import (
+    ERRORES_CONEXION_MIKROTIK, ERRORES_CONEXION_OLT, _datos_mikrotik, _datos_olt, _operacion_mikrotik,
+    texto_comando,
+)
+from .circuito import circuito_de
+from .metricas import medir
+from .olt import OltCommandError, OltError, OltSessionAsync
+from .pool import PLAZO, ConnectionPoolAsync, PlazoAgotado, PoolTimeout, tiempo_restante
+
+# Errores tras los cuales la conexión asíncrona ya no es reutilizable; el
+# protocolo asíncrono de librouteros corta las lecturas lentas con TimeoutError.
+ERRORES_CONEXION_MIKROTIK_ASYNC = (*ERRORES_CONEXION_MIKROTIK, asyncio.TimeoutError)
+
+# Los pools asyncio pertenecen a un bucle de eventos: bucle -> {(tipo, host, puerto): (Equipo, pool)}.
+_pools = weakref.WeakKeyDictionary()
+
+
+def _obtener_pool(tipo, datos, fabricar):
+    pools = _pools.setdefault(asyncio.get_running_loop(), {})
+    clave = (tipo, datos.host, datos.puerto)
+    anterior = pools.get(clave)
+    if anterior is not None and anterior[0] == datos and not anterior[1]._cerrado:
+        return anterior[1]
+    if anterior is not None:
+        asyncio.get_running_loop().create_task(anterior[1].close_all())
+    pool = fabricar(datos)
+    pools[clave] = (datos, pool)
+    return pool
+
+
+def pools_async():
+    """
+    Devuelve los pools asyncio abiertos en el bucle de eventos actual.
+    """
+    try:
+        pools = _pools.get(asyncio.get_running_loop(), {})
+    except RuntimeError:
+        return []
+    return [pool for _, pool in pools.values()]
+
+
+# --- MikroTik ---
+
+class ConexionMikrotikAsync:
+    """
+    Conexión a la API de MikroTik prestada por el pool asyncio del router. Se
+    usa con `async with connect_mikrotik_async(router) as api:` igual que la
+    `AsyncApi` de librouteros; al salir del bloque vuelve al pool, o se
+    descarta si hubo un error de conexión. Respeta el plazo del contexto
+    igual que ConexionMikrotik.
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._api = None
+        self._rota = False
+        self._error = None
+
+    async def __call__(self, cmd, /, **kwargs):
+        texto = texto_comando(cmd, [f'={clave}={valor}' for clave, valor in kwargs.items()])
+        try:
+            with medir('mikrotik', self._pool.nombre, _operacion_mikrotik(cmd), texto):
+                async for fila in self._con_plazo(self._api(cmd, **kwargs)):
+                    yield fila
+        except (*ERRORES_CONEXION_MIKROTIK_ASYNC, PlazoAgotado) as e:
+            self._romper(e)
+            raise
+
+    async def rawCmd(self, cmd, *words):
+        try:
+            with medir('mikrotik', self._pool.nombre, _operacion_mikrotik(cmd), texto_comando(cmd, words)):
+                async for fila in self._con_plazo(self._api.rawCmd(cmd, *words)):
+                    yield fila
+        except (*ERRORES_CONEXION_MIKROTIK_ASYNC, PlazoAgotado) as e:
+            self._romper(e)
+            raise
+
+    async def _con_plazo(self, filas):
+        # El protocolo asíncrono limita cada lectura con su `timeout`.
+        if PLAZO.get() is None:
+            async for fila in filas:
+                yield fila
+            return
+        protocolo = self._api.protocol
+        previo = protocolo.timeout
+        try:
+            while True:
+                protocolo.timeout = tiempo_restante(previo)
+                try:
+                    fila = await filas.__anext__()
+                except StopAsyncIteration:
+                    return
+                yield fila
+        except (OSError, asyncio.TimeoutError):
+            tiempo_restante()
+            raise
+        finally:
+            protocolo.timeout = previo
+
+    def _romper(self, error):
+        self._rota = True
+        self._error = error
+
+    def path(self, *path):
+        return AsyncPath(path='', api=self).join(*path)
+
+    async def close(self):
+        if self._api is not None:
+            await self._pool.release(self._api, rota=self._rota, error=self._error)
+            self._api = None
+
+    async def __aenter__(self):
+        with medir('mikrotik', self._pool.nombre, 'conexion'):
+            self._api = await self._pool.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None and issubclass(exc_type, (*ERRORES_CONEXION_MIKROTIK_ASYNC, PlazoAgotado)):
+            self._romper(exc)
+        await self.close()
+
+
+async def _sondear_mikrotik(api):
+    return [fila async for fila in api('/system/identity/print')]
+
+
+async def _abrir_mikrotik(datos, timeout=10):
+    # Como en connect._abrir_mikrotik: el login se ajusta al plazo y luego
+    # las lecturas vuelven a `timeout`.
+    try:
+        api = await async_connect(
+            host=datos.host,
+            username=datos.usuario,
+            password=datos.password,
+            port=datos.puerto,
+            timeout=tiempo_restante(timeout),
+        )
+    except (OSError, asyncio.TimeoutError):
+        tiempo_restante()
+        raise
+    api.protocol.timeout = timeout
+    return api
+
+
+def _crear_pool_mikrotik(datos):
+    return ConnectionPoolAsync(
+        crear=lambda: _abrir_mikrotik(datos),
+        validar=_sondear_mikrotik,
+        cerrar=lambda api: api.close(),
+        tamano=datos.limite,
+        timeout=getattr(settings, 'MIKROTIK_POOL_TIMEOUT', 10),
+        keepalive=getattr(settings, 'MIKROTIK_POOL_KEEPALIVE', 30),
+        max_inactividad=getattr(settings, 'MIKROTIK_POOL_MAX_IDLE', 300),
+        nombre=f'mikrotik-async@{datos.host}:{datos.puerto}',
+        cola_maxima=getattr(settings, 'MIKROTIK_POOL_QUEUE_MAX', None),
+        circuito=circuito_de('mikrotik', datos.host, datos.puerto),
+    )
+
+
+def connect_mikrotik_async(dispositivo=None):
+    """
+    Conexión asyncio a la API del router `dispositivo` (None: el MikroTik de
+    settings). Se obtiene del pool al entrar en el `async with`.
+    """
+    return ConexionMikrotikAsync(_obtener_pool('mikrotik', _datos_mikrotik(dispositivo), _crear_pool_mikrotik))
+
+
+# --- OLT ---
+
+class ConexionOltAsync:
+    """
+    Sesión Telnet a la OLT prestada por el pool asyncio del equipo, con el
+    mismo comportamiento que ConexionOlt: se reintenta una vez con otra
+    sesión si la prestada estaba caída y al devolverla vuelve al modo exec.
+    Se usa con `async with connect_olt_async(olt) as tn:`.
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._sesion = None
+        self._rota = False
+        self._error = None
+        self._operaciones = 0
+
+    async def ejecutar(self, comando):
+        with medir('olt', self._pool.nombre, 'comando', comando):
+            return await self._con_reintento(lambda sesion: sesion.ejecutar(comando))
+
+    async def ejecutar_script(self, comandos):
+        with medir('olt', self._pool.nombre, 'script', '; '.join(comandos)):
+            return await self._con_reintento(lambda sesion: sesion.ejecutar_script(comandos))
+
+    async def _con_reintento(self, operacion):
+        try:
+            resultado = await self._operar(operacion)
+        except ERRORES_CONEXION_OLT as e:
+            if self._operaciones:
+                raise
+            await self._pool.release(self._sesion, rota=True, error=e)
+            self._sesion = None
+            self._sesion = await self._pool.acquire()
+            self._rota = False
+            self._error = None
+            resultado = await self._operar(operacion)
+        self._operaciones += 1
+        return resultado
+
+    async def _operar(self, operacion):
+        try:
+            return await operacion(self._sesion)
+        except (OltError, PlazoAgotado, *ERRORES_CONEXION_OLT) as e:
+            self._rota = True
+            self._error = e
+            raise
+
+    async def close(self):
+        if self._sesion is None:
+            return
+        if not self._rota:
+            try:
+                await self._sesion.restablecer()
+            except (OltError, PlazoAgotado, *ERRORES_CONEXION_OLT) as e:
+                self._rota = True
+                self._error = e
+        await self._pool.release(self._sesion, rota=self._rota, error=self._error)
+        self._sesion = None
+
+    async def __aenter__(self):
+        try:
+            with medir('olt', self._pool.nombre, 'conexion'):
+                self._sesion = await self._pool.acquire()
+        except (PoolTimeout, PlazoAgotado):
+            raise
+        except Exception as e:
+            raise Exception(f"Error al conectar con la OLT por Telnet: {e}") from e
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+def _crear_pool_olt(datos):
+    return ConnectionPoolAsync(
+        crear=lambda: OltSessionAsync.abrir(
+            datos.host,
+            datos.usuario,
+            datos.password,
+            timeout=getattr(settings, 'OLT_TIMEOUT', 10),
+            puerto=datos.puerto,
+        ),
+        validar=lambda sesion: sesion.sondear(),
+        cerrar=lambda sesion: sesion.close(),
+        tamano=datos.limite,
+        timeout=getattr(settings, 'OLT_SESSION_TIMEOUT', 30),
+        keepalive=getattr(settings, 'OLT_SESSION_KEEPALIVE', 60),
+        max_inactividad=getattr(settings, 'OLT_SESSION_MAX_IDLE', 540),
+        nombre=f'olt-async@{datos.host}:{datos.puerto}',
+        cola_maxima=getattr(settings, 'OLT_SESSION_QUEUE_MAX', None),
+        circuito=circuito_de('olt', datos.host, datos.puerto),
+    )
+
+
+def connect_olt_async(dispositivo=None):
+    """
+    Sesión asyncio con la OLT `dispositivo` (None: la OLT de settings). Se
+    obtiene del pool al entrar en el `async with`.
+    """
+    return ConexionOltAsync(_obtener_pool('olt', _datos_olt(dispositivo), _crear_pool_olt))
+
+
+async def execute_olt_script_async(tn, commands, check=True):
+    """
+    Igual que execute_olt_script() para una sesión asyncio.
+    """
+    resultados = await tn.ejecutar_script(commands)
+    if check and any(r.error for r in resultados):
+        raise OltCommandError(resultados)
+    return resultados
@@ -0,0 +1,247 @@
+# gestion_red/difusion.py
+# Métricas del router en vivo para el dashboard (Server-Sent Events). Cada
+# router tiene un único hilo por proceso que publica cada lectura a todos
+# los suscriptores del proceso, sin importar cuántos navegadores estén
+# mirando. Con una caché compartida, además, solo un proceso lee de cada
+# router (con un turno en la caché, como gestion_red.monitor) y el resto
+# reparte lo que ese deja en la caché.
+
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .connect import connect_mikrotik_dedicada
+from .routeros import seguir_periodico
+from .sesiones_ppp import iniciar_indice
+
+# Lecturas periódicas que se piden al router, todas en la misma conexión.
+COMANDOS = {
+    'recursos': '/system/resource',
+    'salud': '/system/health',
+}
+
+
+class Suscripcion:
+    """
+    Buzón de un visor. Guarda solo la última lectura: un navegador lento se
+    salta las intermedias en lugar de acumularlas. Se puede esperar desde
+    un hilo (`esperar`) o desde asyncio (`esperar_async`, si se creó dentro
+    de un bucle de eventos).
+    """
+
+    def __init__(self, difusor, ultimo=None):
+        self._difusor = difusor
+        self._lock = threading.Lock()
+        self._evento = ultimo
+        self._hay = threading.Event()
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._hay_async = asyncio.Event()
+        except RuntimeError:
+            self._loop = None
+        if ultimo is not None:
+            self._avisar()
+
+    def entregar(self, evento):
+        with self._lock:
+            self._evento = evento
+        self._avisar()
+
+    def _avisar(self):
+        self._hay.set()
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._hay_async.set)
+            except RuntimeError:
+                # El bucle del visor ya terminó.
+                self.cancelar()
+
+    def _tomar(self):
+        with self._lock:
+            evento, self._evento = self._evento, None
+        self._hay.clear()
+        if self._loop is not None:
+            self._hay_async.clear()
+        return evento
+
+    def esperar(self, timeout=None):
+        """
+        Devuelve la próxima lectura, o None si no llega ninguna en `timeout`.
+        """
+        self._hay.wait(timeout)
+        return self._tomar()
+
+    async def esperar_async(self, timeout=None):
+        try:
+            await asyncio.wait_for(self._hay_async.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._tomar()
+
+    def cancelar(self):
+        self._difusor.desuscribir(self)
+
+
+class Difusor:
+    """
+    Publica las métricas de un router (`router` es un Dispositivo; None, el
+    MikroTik de settings) a todos sus suscriptores. El hilo que lee del
+    router (o, si otro proceso tiene el turno, de la caché) arranca con el
+    primer suscriptor y termina poco después de que se vaya el último.
+    """
+
+    def __init__(self, router):
+        self.router = router
+        self._lock = threading.Lock()
+        self._suscriptores = set()
+        self._hilo = None
+        self._token = uuid.uuid4().hex  # quién tiene el turno, entre procesos y hosts
+        self.ultimo = None
+
+    def suscribir(self):
+        with self._lock:
+            suscripcion = Suscripcion(self, self.ultimo)
+            self._suscriptores.add(suscripcion)
+            if self._hilo is None:
+                self._hilo = threading.Thread(
+                    target=self._bucle,
+                    name=f'difusion-{self.router.pk if self.router is not None else "default"}',
+                    daemon=True,
+                )
+                self._hilo.start()
+        return suscripcion
+
+    def desuscribir(self, suscripcion):
+        with self._lock:
+            self._suscriptores.discard(suscripcion)
+
+    def publicar(self, evento):
+        with self._lock:
+            self.ultimo = evento
+            suscriptores = list(self._suscriptores)
+        for suscripcion in suscriptores:
+            suscripcion.entregar(evento)
+
+    def _sin_suscriptores(self):
+        # Se decide bajo el lock para que un suscriptor nuevo no se quede sin hilo.
+        with self._lock:
+            if self._suscriptores:
+                return False
+            self._hilo = None
+            self.ultimo = None
+            return True
+
+    def _clave(self, nombre):
+        return f'difusion:{nombre}:{self.router.pk if self.router is not None else "default"}'
+
+    def _tomar_turno(self, duracion):
+        """
+        Toma o renueva por `duracion` segundos el turno de leer del router.
+        Si el proceso que lo tiene muere, el turno vence y lo toma otro.
+        """
+        turno = self._clave('turno')
+        if cache.add(turno, self._token, timeout=duracion):
+            return True
+        if cache.get(turno) == self._token:
+            cache.touch(turno, duracion)
+            return True
+        return False
+
+    def _soltar_turno(self):
+        turno = self._clave('turno')
+        if cache.get(turno) == self._token:
+            cache.delete(turno)
+
+    def _difundir(self, evento, duracion):
+        # Para los suscriptores de este proceso y, por la caché, los de los demás.
+        cache.set(self._clave('ultimo'), evento, timeout=duracion)
+        self.publicar(evento)
+
+    def _bucle(self):
+        intervalo = getattr(settings, 'DASHBOARD_PUSH_INTERVAL', 2)
+        reintento = getattr(settings, 'PPP_INDICE_REINTENTO', 5)
+        duracion = max(intervalo * 5, 10)
+        nombre = self.router or 'MikroTik'
+        indice = None
+        try:
+            while not self._sin_suscriptores():
+                if not self._tomar_turno(duracion):
+                    # Otro proceso lee el router: se reparte lo que deja en la caché.
+                    evento = cache.get(self._clave('ultimo'))
+                    if evento is not None and evento != self.ultimo:
+                        self.publicar(evento)
+                    time.sleep(intervalo)
+                    continue
+                if indice is None:
+                    # El índice de sesiones PPP ya sigue /ppp/active; de ahí sale el número de usuarios activos.
+                    indice = iniciar_indice(self.router)
+                api = None
+                try:
+                    api = connect_mikrotik_dedicada(timeout=duracion, dispositivo=self.router)
+                    salud = {}
+                    for tag, fila in seguir_periodico(api, COMANDOS, intervalo):
+                        if tag == 'salud':
+                            # RouterOS 7 devuelve una fila por sensor (name/value); RouterOS 6, una sola fila.
+                            if 'name' in fila and 'value' in fila:
+                                salud[fila['name']] = fila['value']
+                            else:
+                                salud.update(fila)
+                            continue
+                        self._difundir({
+                            'cpu_load': fila.get('cpu-load', 'N/A'),
+                            'free_memory': fila.get('free-memory', 'N/A'),
+                            'uptime': fila.get('uptime', 'N/A'),
+                            'temperature': salud.get('temperature', 'N/A'),
+                            'voltage': salud.get('voltage', 'N/A'),
+                            'active_users_count': len(indice) if indice.sincronizado else 'N/A',
+                            'timestamp': time.time(),
+                        }, duracion)
+                        if self._sin_suscriptores():
+                            return
+                        if not self._tomar_turno(duracion):
+                            break
+                except Exception as e:
+                    logging.warning(f'Difusión de métricas de {nombre} interrumpida: {e}')
+                    error = {'error': f'Error al conectar con MikroTik: {e}', 'timestamp': time.time()}
+                    self._difundir(error, duracion)
+                    time.sleep(reintento)
+                finally:
+                    if api is not None:
+                        api.close()
+        finally:
+            # Sin visores en este proceso, otro puede tomar el turno enseguida.
+            self._soltar_turno()
+
+
+_difusores = {}
+_difusores_pid = None
+_difusores_lock = threading.Lock()
+
+
+def difusor(router=None):
+    """
+    Devuelve el difusor de `router` en este proceso (uno por router).
+    """
+    global _difusores, _difusores_pid
+    with _difusores_lock:
+        if _difusores_pid != os.getpid():
+            _difusores = {}
+            _difusores_pid = os.getpid()
+        clave = router.pk if router is not None else None
+        if clave not in _difusores:
+            _difusores[clave] = Difusor(router)
+        return _difusores[clave]
+
+
+def suscribir(router=None):
+    """
+    Suscribe al visor a las métricas en vivo de `router`. Hay que llamar a
+    `cancelar()` sobre la suscripción al terminar.
+    """
+    return difusor(router).suscribir()
@@ -0,0 +1,237 @@
+# gestion_red/metricas.py
+# Medición de las llamadas a los equipos: cada conexión, comando de la OLT y
+# llamada a la API de MikroTik pasa por `medir()`, que alimenta histogramas
+# de latencia, contadores de errores y llamadas en curso (expuestos en
+# formato Prometheus por /metrics), el registro de operaciones lentas y la
+# cabecera Server-Timing de la petición en curso. Las métricas son del
+# proceso, igual que los pools.
+
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .pool import CircuitoAbierto, PlazoAgotado, PoolTimeout
+
+# Registro aparte para poder enviarlo a otro archivo desde LOGGING.
+registro_lentas = logging.getLogger('gestion_red.lentas')
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_metricas = []
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(nombres, valores, extra=()):
+    pares = [*zip(nombres, valores), *extra]
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in pares) + '}'
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+        self._valores = {}
+        _metricas.append(self)
+
+    def _clave(self, etiquetas):
+        return tuple(str(etiquetas[nombre]) for nombre in self.etiquetas)
+
+    def exportar(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} {self.tipo}']
+        with self._lock:
+            valores = dict(self._valores)
+        for clave, valor in sorted(valores.items()):
+            lineas.extend(self._lineas(clave, valor))
+        return lineas
+
+    def _lineas(self, clave, valor):
+        return [f'{self.nombre}{_etiquetas(self.etiquetas, clave)} {valor}']
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def inc(self, cantidad=1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+
+class Medidor(_Metrica):
+    tipo = 'gauge'
+
+    def inc(self, cantidad=1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def dec(self, cantidad=1, **etiquetas):
+        self.inc(-cantidad, **etiquetas)
+
+
+class Histograma(_Metrica):
+    tipo = 'histogram'
+
+    def observar(self, valor, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            cubetas, suma, total = self._valores.get(clave, ([0] * len(BUCKETS), 0.0, 0))
+            cubetas = [n + (valor <= limite) for n, limite in zip(cubetas, BUCKETS)]
+            self._valores[clave] = (cubetas, suma + valor, total + 1)
+
+    def _lineas(self, clave, valor):
+        cubetas, suma, total = valor
+        lineas = [
+            f'{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, [("le", limite)])} {n}'
+            for limite, n in zip(BUCKETS, cubetas)
+        ]
+        lineas.append(f'{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, [("le", "+Inf")])} {total}')
+        lineas.append(f'{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {round(suma, 6)}')
+        lineas.append(f'{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {total}')
+        return lineas
+
+
+DURACION = Histograma(
+    'adl_equipo_llamada_segundos', 'Duración de las llamadas a los equipos.',
+    ('tipo', 'equipo', 'operacion', 'resultado'),
+)
+ERRORES = Contador(
+    'adl_equipo_errores_total', 'Llamadas a los equipos que terminaron en error.',
+    ('tipo', 'equipo', 'operacion', 'resultado'),
+)
+EN_CURSO = Medidor(
+    'adl_equipo_llamadas_en_curso', 'Llamadas a los equipos en curso.',
+    ('tipo', 'equipo'),
+)
+
+
+class TiemposPeticion:
+    """
+    Tiempo de equipo acumulado por tipo durante una petición, para la
+    cabecera Server-Timing. Los tramos que corren en otros hilos suman al
+    mismo objeto, por eso lleva lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tiempos = {}
+
+    def sumar(self, tipo, duracion):
+        with self._lock:
+            total, llamadas = self._tiempos.get(tipo, (0.0, 0))
+            self._tiempos[tipo] = (total + duracion, llamadas + 1)
+
+    def server_timing(self):
+        with self._lock:
+            tiempos = sorted(self._tiempos.items())
+        return ', '.join(
+            f'{tipo};dur={total * 1000:.1f};desc="{llamadas} llamada(s)"' for tipo, (total, llamadas) in tiempos
+        )
+
+
+TIEMPOS = contextvars.ContextVar('tiempos_peticion', default=None)
+
+
+@contextmanager
+def medir(tipo, equipo, operacion, comando=None):
+    """
+    Mide una llamada a un equipo (`tipo` 'mikrotik' u 'olt', `equipo` el
+    nombre de su pool, `operacion` el tipo de llamada). Si tarda más de
+    OPERACION_LENTA segundos se registra con el texto completo de `comando`.
+    """
+    EN_CURSO.inc(tipo=tipo, equipo=equipo)
+    inicio = time.monotonic()
+    resultado = 'ok'
+    try:
+        yield
+    except CircuitoAbierto:
+        resultado = 'no_disponible'
+        raise
+    except PoolTimeout:
+        resultado = 'ocupado'
+        raise
+    except PlazoAgotado:
+        resultado = 'plazo_agotado'
+        raise
+    except Exception:
+        resultado = 'error'
+        raise
+    finally:
+        duracion = time.monotonic() - inicio
+        EN_CURSO.dec(tipo=tipo, equipo=equipo)
+        DURACION.observar(duracion, tipo=tipo, equipo=equipo, operacion=operacion, resultado=resultado)
+        if resultado != 'ok':
+            ERRORES.inc(tipo=tipo, equipo=equipo, operacion=operacion, resultado=resultado)
+        tiempos = TIEMPOS.get()
+        if tiempos is not None:
+            tiempos.sumar(tipo, duracion)
+        if duracion >= getattr(settings, 'OPERACION_LENTA', 1.0):
+            registro_lentas.warning(
+                f'{equipo} {operacion} tardó {duracion:.3f}s ({resultado}): {comando or operacion}'
+            )
+
+
+def _metricas_pools(pools):
+    # Estado de los pools en el momento de la consulta.
+    campos = (
+        ('abiertas', 'gauge', 'Conexiones abiertas.'),
+        ('en_uso', 'gauge', 'Conexiones prestadas.'),
+        ('en_espera', 'gauge', 'Peticiones esperando una conexión.'),
+        ('rechazadas', 'counter', 'Peticiones rechazadas por cola llena.'),
+        ('agotadas', 'counter', 'Peticiones que agotaron el tiempo de espera.'),
+    )
+    estadisticas = [pool.stats() for pool in pools]
+    lineas = []
+    for campo, tipo, ayuda in campos:
+        nombre = f'adl_pool_{campo}' + ('_total' if tipo == 'counter' else '')
+        lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}']
+        lineas += [f'{nombre}{_etiquetas(("pool",), (e["nombre"],))} {e[campo]}' for e in estadisticas]
+    return lineas
+
+
+# Valor del medidor adl_circuito_estado por estado.
+_ESTADOS_CIRCUITO = {'cerrado': 0, 'semiabierto': 1, 'abierto': 2}
+
+
+def _metricas_circuitos(circuitos):
+    campos = (
+        ('estado', 'gauge', 'Estado del circuito del equipo (0 cerrado, 1 semiabierto, 2 abierto).'),
+        ('fallas_seguidas', 'gauge', 'Fallas de conexión seguidas.'),
+        ('aperturas', 'counter', 'Veces que se abrió el circuito.'),
+        ('rechazadas', 'counter', 'Peticiones rechazadas con el circuito abierto.'),
+    )
+    estadisticas = [circuito.stats() | {'nombre': circuito.nombre} for circuito in circuitos]
+    for e in estadisticas:
+        e['estado'] = _ESTADOS_CIRCUITO[e['estado']]
+    lineas = []
+    for campo, tipo, ayuda in campos:
+        nombre = f'adl_circuito_{campo}' + ('_total' if tipo == 'counter' else '')
+        lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}']
+        lineas += [f'{nombre}{_etiquetas(("equipo",), (e["nombre"],))} {e[campo]}' for e in estadisticas]
+    return lineas
+
+
+def exportar(pools=(), circuitos=()):
+    """
+    Devuelve todas las métricas del proceso en el formato de texto de
+    Prometheus, incluido el estado de los `pools` y `circuitos` indicados.
+    """
+    lineas = []
+    for metrica in _metricas:
+        lineas.extend(metrica.exportar())
+    lineas.extend(_metricas_pools(pools))
+    lineas.extend(_metricas_circuitos(circuitos))
+    return '\n'.join(lineas) + '\n'
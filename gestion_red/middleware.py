@@ -0,0 +1,92 @@
+# gestion_red/middleware.py
+
+import time
+from contextlib import nullcontext
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from .metricas import TIEMPOS, TiemposPeticion
+from .pool import INTERACTIVA, plazo, prioridad
+
+
+@sync_and_async_middleware
+def prioridad_interactiva(get_response):
+    """
+    Las peticiones web tienen un operador esperando: sus operaciones sobre
+    los equipos pasan antes que los trabajos en segundo plano y los lotes.
+    Funciona tanto con WSGI como con ASGI (vistas asíncronas).
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with prioridad(INTERACTIVA):
+                return await get_response(request)
+        return middleware
+
+    def middleware(request):
+        with prioridad(INTERACTIVA):
+            return get_response(request)
+    return middleware
+
+
+def _agregar_server_timing(response, tiempos, inicio):
+    partes = [tiempos.server_timing(), f'total;dur={(time.monotonic() - inicio) * 1000:.1f}']
+    response['Server-Timing'] = ', '.join(parte for parte in partes if parte)
+    return response
+
+
+@sync_and_async_middleware
+def tiempos_servidor(get_response):
+    """
+    Agrega a cada respuesta la cabecera Server-Timing con el tiempo pasado
+    en los equipos (por tipo: mikrotik, olt) y el total de la petición, para
+    verlo en las herramientas de desarrollo del navegador.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            tiempos = TiemposPeticion()
+            token = TIEMPOS.set(tiempos)
+            inicio = time.monotonic()
+            try:
+                response = await get_response(request)
+            finally:
+                TIEMPOS.reset(token)
+            return _agregar_server_timing(response, tiempos, inicio)
+        return middleware
+
+    def middleware(request):
+        tiempos = TiemposPeticion()
+        token = TIEMPOS.set(tiempos)
+        inicio = time.monotonic()
+        try:
+            response = get_response(request)
+        finally:
+            TIEMPOS.reset(token)
+        return _agregar_server_timing(response, tiempos, inicio)
+    return middleware
+
+
+def _plazo():
+    segundos = getattr(settings, 'PLAZO_PETICION', None)
+    return plazo(segundos) if segundos else nullcontext()
+
+
+@sync_and_async_middleware
+def plazo_peticion(get_response):
+    """
+    Limita a PLAZO_PETICION segundos el tiempo total que una petición web
+    puede pasar esperando a los equipos (turno en el pool, conexión y
+    comandos): al agotarse, la siguiente espera lanza PlazoAgotado en lugar
+    de dejar al operador mirando una página que no carga.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with _plazo():
+                return await get_response(request)
+        return middleware
+
+    def middleware(request):
+        with _plazo():
+            return get_response(request)
+    return middleware
@@ -0,0 +1,102 @@
+# gestion_red/monitor.py
+
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .connect import connect_mikrotik
+from .pool import plazo
+
+CLAVE_SNAPSHOT = 'dashboard:snapshot'
+CLAVE_ERROR = 'dashboard:error'
+CLAVE_TURNO = 'dashboard:turno'
+
+_poller = None
+_poller_pid = None
+_poller_lock = threading.Lock()
+
+
+def _contar(api, *path):
+    # count-only devuelve solo el total (=ret=N) sin transferir la tabla.
+    respuesta = tuple(api.rawCmd('/' + '/'.join(path) + '/print', '=count-only='))
+    return respuesta[0].get('ret', 0) if respuesta else 0
+
+
+def tomar_snapshot():
+    """
+    Consulta al MikroTik las métricas del dashboard y las devuelve en un
+    diccionario con la marca de tiempo de la lectura.
+    """
+    snapshot = {}
+    with connect_mikrotik() as api:
+        system_health = list(api.path('system', 'health'))
+        if system_health:
+            health_data = system_health[0]
+            snapshot['cpu_load'] = health_data.get('cpu-load', 'N/A')
+            snapshot['free_memory'] = health_data.get('free-memory', 'N/A')
+            snapshot['voltage'] = health_data.get('voltage', 'N/A')
+            snapshot['temperature'] = health_data.get('temperature', 'N/A')
+
+        snapshot['active_users_count'] = _contar(api, 'ppp', 'active')
+        snapshot['total_users_count'] = _contar(api, 'ppp', 'secret')
+
+        system_resource = list(api.path('system', 'resource'))
+        if system_resource:
+            snapshot['uptime'] = system_resource[0].get('uptime', 'N/A')
+
+    snapshot['timestamp'] = time.time()
+    return snapshot
+
+
+def _bucle(intervalo):
+    while True:
+        # Con una caché compartida solo un proceso consulta al router por intervalo.
+        if cache.add(CLAVE_TURNO, os.getpid(), timeout=max(intervalo - 1, 1)):
+            try:
+                # Una lectura atascada no debe comerse el turno siguiente.
+                with plazo(intervalo):
+                    snapshot = tomar_snapshot()
+                cache.set(CLAVE_SNAPSHOT, snapshot, timeout=None)
+                cache.delete(CLAVE_ERROR)
+            except Exception as e:
+                logging.error(f'Error al actualizar el snapshot del dashboard: {e}')
+                cache.set(CLAVE_ERROR, f'Error al conectar con MikroTik: {e}', timeout=None)
+        time.sleep(intervalo)
+
+
+def iniciar_poller():
+    """
+    Arranca (una vez por proceso) el hilo que refresca el snapshot del
+    dashboard cada DASHBOARD_POLL_INTERVAL segundos.
+    """
+    global _poller, _poller_pid
+    with _poller_lock:
+        if _poller is None or _poller_pid != os.getpid():
+            _poller = threading.Thread(
+                target=_bucle,
+                args=(getattr(settings, 'DASHBOARD_POLL_INTERVAL', 15),),
+                name='dashboard-poller',
+                daemon=True,
+            )
+            _poller.start()
+            _poller_pid = os.getpid()
+
+
+def obtener_snapshot():
+    """
+    Devuelve `(snapshot, error)` desde la caché sin consultar al router.
+    `snapshot` incluye `edad` (segundos desde la lectura) y `obsoleto` si
+    supera DASHBOARD_MAX_STALENESS; es None si aún no hay ninguna lectura.
+    """
+    iniciar_poller()
+    snapshot = cache.get(CLAVE_SNAPSHOT)
+    error = cache.get(CLAVE_ERROR)
+    if snapshot is not None:
+        snapshot = dict(snapshot)
+        snapshot['edad'] = int(time.time() - snapshot['timestamp'])
+        snapshot['obsoleto'] = snapshot['edad'] > getattr(settings, 'DASHBOARD_MAX_STALENESS', 60)
+    return snapshot, error
@@ -0,0 +1,241 @@
+# gestion_red/olt.py
+
+import asyncio
+import re
+from collections import namedtuple
+
+from .pool import tiempo_restante
+from .telnet import ClienteTelnet, ClienteTelnetAsync
+
+# Prompt de la CLI ZTE tras el login: "ZXAN#", "ZXAN(config)#", "ZXAN(config-if)#"...
+PROMPT_LOGIN = re.compile(rb"[\r\n](?P<host>[A-Za-z0-9_.\-]+)(?P<modo>\([^)\r\n]*\))?#")
+# Login rechazado: solo cuenta la primera línea que llega tras la contraseña
+# (un banner posterior que mencione "failed" no es un error de login).
+ERROR_LOGIN = re.compile(rb"(?i)\A\s*(Username:|Password:|[^\r\n]*(invalid|failed|denied))")
+# La CLI ZTE marca los errores con líneas que empiezan por "%":
+# "%Error 20203: Entry not found", "% Invalid input detected at '^' marker."
+ERROR_COMANDO = re.compile(r"^\s*%.*$", re.M)
+
+ResultadoComando = namedtuple('ResultadoComando', ['comando', 'salida', 'error'])
+
+
+class OltError(Exception):
+    """
+    Error de comunicación con la OLT.
+    """
+
+
+class OltCommandError(OltError):
+    """
+    Uno o más comandos de un script fueron rechazados por la OLT.
+    `resultados` contiene el resultado de cada comando del script.
+    """
+
+    def __init__(self, resultados):
+        self.resultados = resultados
+        fallidos = [r for r in resultados if r.error]
+        super().__init__("; ".join(f"'{r.comando}': {r.error}" for r in fallidos))
+
+
+def _sin_respuesta(mensaje):
+    # Si lo que venció es el plazo del contexto, PlazoAgotado en lugar de OltError.
+    tiempo_restante()
+    return OltError(mensaje)
+
+
+def _prompt_de(match):
+    # Tras el login el prompt se fija al nombre de host de la OLT.
+    return re.compile(rb"[\r\n]" + re.escape(match.group('host')) + rb"(?P<modo>\([^)\r\n]*\))?#")
+
+
+def _modo(match):
+    return (match.group('modo') or b'').decode('ascii')
+
+
+def _script(comandos):
+    return ''.join(comando + '\n' for comando in comandos).encode('ascii')
+
+
+def _resultado(comando, output, ecos):
+    # Si la OLT devuelve el eco de lo tecleado por adelantado, puede
+    # aparecer dentro de la salida del comando anterior.
+    output_lines = output.splitlines()
+    cleaned_output = [
+        line for line in output_lines
+        if comando not in line and line.strip() not in ecos and line.strip()
+    ]
+    salida = "\n".join(cleaned_output)
+    errores = ERROR_COMANDO.findall(salida)
+    return ResultadoComando(comando, salida, " ".join(e.strip() for e in errores) or None)
+
+
+class OltSession:
+    """
+    Sesión Telnet autenticada contra una OLT ZTE.
+
+    En lugar de esperar tiempos fijos, cada lectura termina al detectar el
+    prompt `<host>...#`, de modo que un comando cuesta lo que tarde la OLT en
+    responder. La sesión recuerda el modo de la CLI (exec, config,
+    config-if...) según el último prompt leído. Ninguna espera va más allá
+    del plazo del contexto (gestion_red.pool.plazo).
+    """
+
+    def __init__(self, host, usuario, password, timeout=10, puerto=23):
+        self.host = host
+        self.timeout = timeout
+        self.modo = ''
+        try:
+            self.tn = ClienteTelnet(host, puerto, tiempo_restante(timeout))
+        except OSError:
+            tiempo_restante()
+            raise
+        try:
+            self._login(usuario, password)
+        except BaseException:
+            self.tn.close()
+            raise
+
+    def _login(self, usuario, password):
+        self._esperar(b"Username:")
+        self.tn.write(usuario.encode('ascii') + b"\n")
+        self._esperar(b"Password:")
+        self.tn.write(password.encode('ascii') + b"\n")
+
+        indice, match, _ = self.tn.expect([PROMPT_LOGIN, ERROR_LOGIN], tiempo_restante(self.timeout))
+        if indice != 0:
+            raise OltError("No se pudo conectar a la OLT. Verifique las credenciales.")
+
+        self.hostname = match.group('host')
+        self.modo = _modo(match)
+        self.prompt = _prompt_de(match)
+        # Sin paginación: las salidas largas no se quedan esperando en "--More--".
+        self.ejecutar("terminal length 0")
+
+    def _esperar(self, texto):
+        data = self.tn.read_until(texto, tiempo_restante(self.timeout))
+        if not data.endswith(texto):
+            raise _sin_respuesta(f"La OLT no respondió con {texto.decode('ascii')!r} a tiempo.")
+        return data
+
+    def leer_hasta_prompt(self, timeout=None):
+        """
+        Lee hasta el siguiente prompt y devuelve lo recibido antes de él.
+        """
+        indice, match, data = self.tn.expect([self.prompt], tiempo_restante(timeout or self.timeout))
+        if indice == -1:
+            raise _sin_respuesta("Tiempo de espera agotado esperando el prompt de la OLT.")
+        self.modo = _modo(match)
+        return data[:match.start()].decode('ascii', errors='replace')
+
+    def ejecutar(self, comando, timeout=None):
+        """
+        Ejecuta un comando y devuelve su salida sin el eco ni el prompt.
+        """
+        return self.ejecutar_script([comando], timeout)[0].salida
+
+    def ejecutar_script(self, comandos, timeout=None):
+        """
+        Envía todos los comandos de una vez y separa la salida de cada uno
+        usando los prompts como frontera: la salida del comando N es lo que
+        llega entre el prompt N-1 y el prompt N. Devuelve una lista de
+        `ResultadoComando`, con `error` relleno si la OLT rechazó el comando.
+        """
+        self.tn.write(_script(comandos))
+        ecos = {comando.strip() for comando in comandos}
+        return [_resultado(comando, self.leer_hasta_prompt(timeout), ecos) for comando in comandos]
+
+    def sondear(self, timeout=3):
+        """
+        Comprueba que la sesión sigue viva enviando una línea vacía.
+        """
+        self.tn.write(b'\n')
+        self.leer_hasta_prompt(timeout)
+        return True
+
+    def restablecer(self):
+        """
+        Vuelve al modo exec para que el siguiente usuario de la sesión
+        empiece siempre desde el mismo estado.
+        """
+        if self.modo:
+            self.ejecutar("end")
+
+    def close(self):
+        self.tn.close()
+
+
+class OltSessionAsync:
+    """
+    Versión asyncio de OltSession para las vistas asíncronas: mismas
+    operaciones, como corrutinas, sin ocupar un hilo mientras la OLT
+    responde. Se abre con `await OltSessionAsync.abrir(...)`.
+    """
+
+    def __init__(self, tn, host, timeout):
+        self.tn = tn
+        self.host = host
+        self.timeout = timeout
+        self.modo = ''
+
+    @classmethod
+    async def abrir(cls, host, usuario, password, timeout=10, puerto=23):
+        try:
+            tn = await ClienteTelnetAsync.abrir(host, puerto, tiempo_restante(timeout))
+        except (OSError, asyncio.TimeoutError):
+            tiempo_restante()
+            raise
+        sesion = cls(tn, host, timeout)
+        try:
+            await sesion._login(usuario, password)
+        except BaseException:
+            await sesion.tn.close()
+            raise
+        return sesion
+
+    async def _login(self, usuario, password):
+        await self._esperar(b"Username:")
+        await self.tn.write(usuario.encode('ascii') + b"\n")
+        await self._esperar(b"Password:")
+        await self.tn.write(password.encode('ascii') + b"\n")
+
+        indice, match, _ = await self.tn.expect([PROMPT_LOGIN, ERROR_LOGIN], tiempo_restante(self.timeout))
+        if indice != 0:
+            raise OltError("No se pudo conectar a la OLT. Verifique las credenciales.")
+
+        self.hostname = match.group('host')
+        self.modo = _modo(match)
+        self.prompt = _prompt_de(match)
+        await self.ejecutar("terminal length 0")
+
+    async def _esperar(self, texto):
+        data = await self.tn.read_until(texto, tiempo_restante(self.timeout))
+        if not data.endswith(texto):
+            raise _sin_respuesta(f"La OLT no respondió con {texto.decode('ascii')!r} a tiempo.")
+        return data
+
+    async def leer_hasta_prompt(self, timeout=None):
+        indice, match, data = await self.tn.expect([self.prompt], tiempo_restante(timeout or self.timeout))
+        if indice == -1:
+            raise _sin_respuesta("Tiempo de espera agotado esperando el prompt de la OLT.")
+        self.modo = _modo(match)
+        return data[:match.start()].decode('ascii', errors='replace')
+
+    async def ejecutar(self, comando, timeout=None):
+        return (await self.ejecutar_script([comando], timeout))[0].salida
+
+    async def ejecutar_script(self, comandos, timeout=None):
+        await self.tn.write(_script(comandos))
+        ecos = {comando.strip() for comando in comandos}
+        return [_resultado(comando, await self.leer_hasta_prompt(timeout), ecos) for comando in comandos]
+
+    async def sondear(self, timeout=3):
+        await self.tn.write(b'\n')
+        await self.leer_hasta_prompt(timeout)
+        return True
+
+    async def restablecer(self):
+        if self.modo:
+            await self.ejecutar("end")
+
+    async def close(self):
+        await self.tn.close()
@@ -0,0 +1,190 @@
+# gestion_red/operaciones.py
+# Pasos de aprovisionamiento sobre los equipos, reutilizables desde las vistas
+# y desde los trabajos en segundo plano. Cada paso toma su propia conexión del
+# pool del equipo indicado (`olt` o `router`, un Dispositivo; None es el
+# equipo configurado en settings).
+#
+# Los pasos con `reanudar=True` son los que se repiten al reanudar un trabajo
+# cuyo resultado se desconoce (el proceso murió o el equipo dejó de
+# responder a mitad): si el equipo ya está como el paso lo deja, cuenta como
+# hecho en lugar de fallar.
+
+import re
+
+from librouteros.exceptions import TrapError
+from librouteros.query import Key
+
+from .connect import connect_mikrotik, connect_olt, execute_olt_script
+from .olt import OltCommandError
+from .secrets_ppp import iniciar_espejo
+
+INTERFAZ_PON_POR_DEFECTO = 'gpon_olt-1/1/1'
+
+# "%Error 20207: The ONU already exists." / "%Error 20209: The ONU does not exist."
+# ("show gpon onu by sn" de una ONU que no existe: "No related information to show.")
+ONU_YA_EXISTE = re.compile(r'(?i)already exists')
+ONU_NO_EXISTE = re.compile(r'(?i)does not exist|not found|no related information')
+
+# "show gpon onu by sn" responde con el índice de la ONU: "gpon-onu_1/1/1:3".
+ONU_POR_SN = re.compile(r'gpon-onu_(\d+/\d+/\d+):\d+')
+
+
+def _script_olt(olt, comandos, tolerado=None):
+    # `tolerado`: error de la OLT que significa que el paso ya estaba hecho.
+    with connect_olt(olt) as tn:
+        resultados = execute_olt_script(tn, comandos, check=tolerado is None)
+    if tolerado is not None and any(r.error and not tolerado.search(r.error) for r in resultados):
+        raise OltCommandError(resultados)
+    return resultados
+
+
+# --- OLT ---
+
+def preconfigurar_onu(onu_sn, interfaz=INTERFAZ_PON_POR_DEFECTO, olt=None, reanudar=False):
+    return _script_olt(olt, [
+        "configure terminal",
+        f"interface {interfaz}",
+        f"onu pre-config-mode serial-number {onu_sn}",
+        "exit",
+    ], ONU_YA_EXISTE if reanudar else None)
+
+
+def suspender_onu(onu_sn, olt=None):
+    with connect_olt(olt) as tn:
+        return execute_olt_script(tn, [
+            "configure terminal",
+            f"no onu service {onu_sn}",
+            "exit",
+        ])
+
+
+def reactivar_onu(onu_sn, olt=None):
+    with connect_olt(olt) as tn:
+        return execute_olt_script(tn, [
+            "configure terminal",
+            f"onu service {onu_sn}",
+            "exit",
+        ])
+
+
+def eliminar_onu(onu_sn, olt=None, reanudar=False):
+    return _script_olt(olt, [
+        "configure terminal",
+        f"no onu {onu_sn}",
+        "exit",
+    ], ONU_NO_EXISTE if reanudar else None)
+
+
+def retirar_onu(onu_sn, olt=None, reanudar=False):
+    """
+    Como eliminar_onu(), pero antes averigua en la misma sesión la interfaz
+    gpon_olt de la ONU, para poder volver a pre-configurarla allí. Devuelve
+    la interfaz, o None si la ONU ya no estaba (solo con `reanudar`).
+    """
+    resultados = _script_olt(olt, [
+        f"show gpon onu by sn {onu_sn}",
+        "configure terminal",
+        f"no onu {onu_sn}",
+        "exit",
+    ], ONU_NO_EXISTE if reanudar else None)
+    match = ONU_POR_SN.search(resultados[0].salida or '')
+    return f'gpon_olt-{match.group(1)}' if match else None
+
+
+# --- MikroTik ---
+# El .id de cada secret sale del espejo local de /ppp/secret (secrets_ppp),
+# así cambiar un secret cuesta una sola ida y vuelta al router. Si el
+# espejo no lo tiene (o aún no está sincronizado) se busca en el router, y
+# si el .id del espejo ya no vale se vuelve a buscar una vez.
+
+def _buscar_secret(secrets, nombre):
+    encontrados = tuple(secrets.select(Key('.id')).where(Key('name') == nombre))
+    return encontrados[0]['.id'] if encontrados else None
+
+
+def _cambiar_secret(nombre, deshabilitado, router):
+    espejo = iniciar_espejo(router)
+    with connect_mikrotik(router) as api:
+        secrets = api.path('ppp', 'secret')
+        entrada = espejo.secret(nombre)
+        secret_id = entrada['id'] if entrada else _buscar_secret(secrets, nombre)
+        if secret_id is None:
+            return False
+        try:
+            secrets.update(**{'.id': secret_id, 'disabled': deshabilitado})
+        except TrapError:
+            if entrada is None:
+                raise
+            # El espejo iba atrasado: el secret se borró o recreó fuera de la aplicación.
+            secret_id = _buscar_secret(secrets, nombre)
+            if secret_id is None:
+                return False
+            secrets.update(**{'.id': secret_id, 'disabled': deshabilitado})
+        espejo.actualizar(secret_id, deshabilitado)
+        return True
+
+
+def crear_secret(nombre, password, perfil, router=None, reanudar=False):
+    """
+    Crea el secret PPPoE del cliente. Con `reanudar`, si ya existe uno con
+    ese nombre se le aplican la contraseña y el perfil en lugar de fallar.
+    """
+    with connect_mikrotik(router) as api:
+        secrets = api.path('ppp', 'secret')
+        secret_id = _buscar_secret(secrets, nombre) if reanudar else None
+        if secret_id is not None:
+            secrets.update(**{'.id': secret_id, 'password': password, 'profile': perfil})
+        else:
+            secret_id = secrets.add(
+                name=nombre,
+                password=password,
+                service='pppoe',
+                profile=perfil
+            )
+    iniciar_espejo(router).registrar(secret_id, nombre, perfil, 'pppoe')
+    return secret_id
+
+
+def deshabilitar_secret(nombre, router=None):
+    """
+    Deshabilita el secret PPPoE del cliente. Devuelve False si no existe.
+    """
+    return _cambiar_secret(nombre, True, router)
+
+
+def habilitar_secret(nombre, router=None):
+    """
+    Habilita el secret PPPoE del cliente. Devuelve False si no existe.
+    """
+    return _cambiar_secret(nombre, False, router)
+
+
+def eliminar_secret(nombre, router=None):
+    """
+    Elimina el secret PPPoE del cliente. Devuelve sus datos (para poder
+    restaurarlo) o None si no existe.
+    """
+    # La contraseña no está en el espejo y hace falta para poder restaurarlo.
+    with connect_mikrotik(router) as api:
+        secrets = api.path('ppp', 'secret')
+        encontrados = tuple(
+            secrets.select(Key('.id'), Key('name'), Key('password'), Key('service'), Key('profile'))
+            .where(Key('name') == nombre)
+        )
+        if not encontrados:
+            return None
+        datos = dict(encontrados[0])
+        secret_id = datos.pop('.id')
+        secrets.remove(secret_id)
+    iniciar_espejo(router).quitar(secret_id)
+    return datos
+
+
+def restaurar_secret(datos, router=None):
+    """
+    Vuelve a crear un secret con los datos devueltos por eliminar_secret().
+    """
+    with connect_mikrotik(router) as api:
+        secret_id = api.path('ppp', 'secret').add(**datos)
+    iniciar_espejo(router).registrar(secret_id, datos.get('name'), datos.get('profile'), datos.get('service'))
+    return secret_id
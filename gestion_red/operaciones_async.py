@@ -0,0 +1,152 @@
+# gestion_red/operaciones_async.py
+# Los mismos pasos que gestion_red.operaciones, como corrutinas, para las
+# vistas asíncronas de la API. Cada paso toma su propia conexión del pool
+# asyncio del equipo indicado.
+
+from librouteros.exceptions import TrapError
+from librouteros.query import Key
+
+from .connect_async import connect_mikrotik_async, connect_olt_async, execute_olt_script_async
+from .olt import OltCommandError
+from .operaciones import INTERFAZ_PON_POR_DEFECTO, ONU_NO_EXISTE, ONU_YA_EXISTE
+from .secrets_ppp import iniciar_espejo
+
+
+async def _script_olt(olt, comandos, tolerado=None):
+    # Igual que operaciones._script_olt().
+    async with connect_olt_async(olt) as tn:
+        resultados = await execute_olt_script_async(tn, comandos, check=tolerado is None)
+    if tolerado is not None and any(r.error and not tolerado.search(r.error) for r in resultados):
+        raise OltCommandError(resultados)
+    return resultados
+
+
+# --- OLT ---
+
+async def preconfigurar_onu(onu_sn, interfaz=INTERFAZ_PON_POR_DEFECTO, olt=None, reanudar=False):
+    return await _script_olt(olt, [
+        "configure terminal",
+        f"interface {interfaz}",
+        f"onu pre-config-mode serial-number {onu_sn}",
+        "exit",
+    ], ONU_YA_EXISTE if reanudar else None)
+
+
+async def suspender_onu(onu_sn, olt=None):
+    async with connect_olt_async(olt) as tn:
+        return await execute_olt_script_async(tn, [
+            "configure terminal",
+            f"no onu service {onu_sn}",
+            "exit",
+        ])
+
+
+async def reactivar_onu(onu_sn, olt=None):
+    async with connect_olt_async(olt) as tn:
+        return await execute_olt_script_async(tn, [
+            "configure terminal",
+            f"onu service {onu_sn}",
+            "exit",
+        ])
+
+
+async def eliminar_onu(onu_sn, olt=None, reanudar=False):
+    return await _script_olt(olt, [
+        "configure terminal",
+        f"no onu {onu_sn}",
+        "exit",
+    ], ONU_NO_EXISTE if reanudar else None)
+
+
+# --- MikroTik ---
+# Igual que en operaciones: el .id sale del espejo de /ppp/secret.
+
+async def _buscar_secret(secrets, nombre):
+    encontrados = [fila async for fila in secrets.select(Key('.id')).where(Key('name') == nombre)]
+    return encontrados[0]['.id'] if encontrados else None
+
+
+async def _cambiar_secret(nombre, deshabilitado, router):
+    espejo = iniciar_espejo(router)
+    async with connect_mikrotik_async(router) as api:
+        secrets = api.path('ppp', 'secret')
+        entrada = espejo.secret(nombre)
+        secret_id = entrada['id'] if entrada else await _buscar_secret(secrets, nombre)
+        if secret_id is None:
+            return False
+        try:
+            await secrets.update(**{'.id': secret_id, 'disabled': deshabilitado})
+        except TrapError:
+            if entrada is None:
+                raise
+            secret_id = await _buscar_secret(secrets, nombre)
+            if secret_id is None:
+                return False
+            await secrets.update(**{'.id': secret_id, 'disabled': deshabilitado})
+        espejo.actualizar(secret_id, deshabilitado)
+        return True
+
+
+async def crear_secret(nombre, password, perfil, router=None, reanudar=False):
+    """
+    Igual que operaciones.crear_secret().
+    """
+    async with connect_mikrotik_async(router) as api:
+        secrets = api.path('ppp', 'secret')
+        secret_id = await _buscar_secret(secrets, nombre) if reanudar else None
+        if secret_id is not None:
+            await secrets.update(**{'.id': secret_id, 'password': password, 'profile': perfil})
+        else:
+            secret_id = await secrets.add(
+                name=nombre,
+                password=password,
+                service='pppoe',
+                profile=perfil
+            )
+    iniciar_espejo(router).registrar(secret_id, nombre, perfil, 'pppoe')
+    return secret_id
+
+
+async def deshabilitar_secret(nombre, router=None):
+    """
+    Deshabilita el secret PPPoE del cliente. Devuelve False si no existe.
+    """
+    return await _cambiar_secret(nombre, True, router)
+
+
+async def habilitar_secret(nombre, router=None):
+    """
+    Habilita el secret PPPoE del cliente. Devuelve False si no existe.
+    """
+    return await _cambiar_secret(nombre, False, router)
+
+
+async def eliminar_secret(nombre, router=None):
+    """
+    Elimina el secret PPPoE del cliente. Devuelve sus datos (para poder
+    restaurarlo) o None si no existe.
+    """
+    async with connect_mikrotik_async(router) as api:
+        secrets = api.path('ppp', 'secret')
+        encontrados = [
+            fila async for fila in
+            secrets.select(Key('.id'), Key('name'), Key('password'), Key('service'), Key('profile'))
+            .where(Key('name') == nombre)
+        ]
+        if not encontrados:
+            return None
+        datos = dict(encontrados[0])
+        secret_id = datos.pop('.id')
+        await secrets.remove(secret_id)
+    iniciar_espejo(router).quitar(secret_id)
+    return datos
+
+
+async def restaurar_secret(datos, router=None):
+    """
+    Vuelve a crear un secret con los datos devueltos por eliminar_secret().
+    """
+    async with connect_mikrotik_async(router) as api:
+        secret_id = await api.path('ppp', 'secret').add(**datos)
+    iniciar_espejo(router).registrar(secret_id, datos.get('name'), datos.get('profile'), datos.get('service'))
+    return secret_id
@@ -0,0 +1,276 @@
+# gestion_red/orquestacion.py
+
+import contextvars
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from . import operaciones
+from .connect import ERRORES_CONEXION_MIKROTIK, ERRORES_CONEXION_OLT
+from .pool import PLAZO, PlazoAgotado, PoolTimeout, plazo, sin_plazo
+
+# Un tramo es el trabajo sobre un equipo y la acción que lo deshace.
+# `reanudar` (opcional) repite el trabajo cuando no se sabe si la vez
+# anterior llegó a aplicarse: debe dar por hecho lo que ya esté hecho.
+# Si `ejecutar` devuelve un dict, queda en el informe del tramo (y en el
+# diario) como `datos`: lo que `compensar` necesita para deshacerlo aunque
+# la operación se reanude en otro proceso. No debe llevar contraseñas.
+Tramo = namedtuple('Tramo', ['nombre', 'ejecutar', 'compensar', 'reanudar'], defaults=(None,))
+
+# Errores que indican que el equipo no está disponible (no que rechazó la
+# operación): con un diario, el tramo se deja para reintentarlo más tarde.
+ERRORES_NO_DISPONIBLE = (PoolTimeout, PlazoAgotado, *ERRORES_CONEXION_MIKROTIK, *ERRORES_CONEXION_OLT)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class OperacionFallida(Exception):
+    """
+    Falló al menos un tramo de una operación. `tramos` tiene, por tramo, su
+    estado (completado, fallido, plazo_agotado), duración, error y si se
+    compensó.
+    """
+
+    def __init__(self, tramos):
+        self.tramos = tramos
+        partes = []
+        for nombre, tramo in tramos.items():
+            if tramo.get('error'):
+                partes.append(f"{nombre}: {tramo['error']}")
+            if tramo.get('compensacion'):
+                partes.append(f"{nombre} revertido: {tramo['compensacion']}")
+        super().__init__("; ".join(partes))
+
+
+class EquiposNoDisponibles(OperacionFallida):
+    """
+    Los tramos que fallaron lo hicieron porque su equipo no estaba
+    disponible. Con un diario no se compensa nada: los tramos completados
+    quedan anotados y el resto se reanuda cuando el equipo vuelva.
+    """
+
+
+def no_disponible(error):
+    """
+    True si `error` (o el error que lo causó) indica que el equipo no estaba
+    disponible, no que rechazó la operación.
+    """
+    while error is not None:
+        if isinstance(error, ERRORES_NO_DISPONIBLE):
+            return True
+        error = error.__cause__
+    return False
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'ORQUESTACION_MAX_WORKERS', 8),
+                thread_name_prefix='tramos',
+            )
+        return _executor
+
+
+def _medir(funcion):
+    inicio = time.monotonic()
+    datos = funcion()
+    return round(time.monotonic() - inicio, 3), datos
+
+
+def _completado(duracion, datos):
+    informe = {'estado': 'completado', 'duracion': duracion}
+    if isinstance(datos, dict):
+        informe['datos'] = datos
+    return informe
+
+
+def _compensar(tramo, informe):
+    if tramo.compensar is None:
+        informe['compensacion'] = 'sin acción de compensación'
+        return
+    try:
+        # La compensación no hereda el plazo vencido de la operación.
+        with sin_plazo():
+            tramo.compensar()
+        informe['compensacion'] = 'ok'
+        logging.info(f"Tramo {tramo.nombre} revertido.")
+    except Exception as e:
+        informe['compensacion'] = f'error: {e}'
+        logging.error(f"No se pudo revertir el tramo {tramo.nombre}: {e}")
+
+
+def ejecutar_en_paralelo(tramos, timeout=None, diario=None):
+    """
+    Ejecuta los tramos a la vez con un plazo común, de modo que la operación
+    tarda lo que el tramo más lento y no la suma de todos. Si alguno falla o
+    no termina a tiempo, se compensan los que sí terminaron (y los que
+    terminen después del plazo) y se lanza OperacionFallida. Devuelve, por
+    tramo, su estado y duración.
+
+    El plazo también rige dentro de cada tramo (ver gestion_red.pool.plazo):
+    un tramo no sigue esperando a su equipo cuando ya nadie espera el
+    resultado. Si quien llama tiene un plazo menor, vale ese.
+
+    Con `diario` (un objeto con `registro(nombre)` y `anotar(informes)`,
+    p. ej. el de api.trabajos) cada tramo se anota antes de lanzarse y al
+    terminar, así una operación interrumpida puede reanudarse: los tramos
+    ya completados no se repiten y los de resultado incierto se repiten con
+    su `reanudar`. Si los fallos son solo de equipos no disponibles, no se
+    compensa nada y se lanza EquiposNoDisponibles para reintentar después.
+    """
+    timeout = timeout or getattr(settings, 'OPERACION_TIMEOUT', 30)
+    informe = {}
+    if diario is not None:
+        for tramo in tramos:
+            registro = diario.registro(tramo.nombre)
+            if registro is not None and registro['estado'] == 'completado' and 'compensacion' not in registro:
+                informe[tramo.nombre] = registro
+    lanzar = [tramo for tramo in tramos if tramo.nombre not in informe]
+    if diario is not None:
+        # Un tramo ya anotado y no completado pudo aplicarse en parte.
+        inciertos = {tramo.nombre for tramo in lanzar if diario.registro(tramo.nombre) is not None}
+        diario.anotar({tramo.nombre: {'estado': 'en_curso'} for tramo in lanzar})
+    else:
+        inciertos = set()
+
+    executor = _get_executor()
+    with plazo(timeout):
+        # Cada tramo hereda el contexto de quien lanzó la operación, plazo incluido.
+        futuros = {
+            executor.submit(
+                contextvars.copy_context().run, _medir,
+                tramo.reanudar if tramo.nombre in inciertos and tramo.reanudar else tramo.ejecutar,
+            ): tramo
+            for tramo in lanzar
+        }
+        _, pendientes = wait(futuros, timeout=max(PLAZO.get() - time.monotonic(), 0))
+
+    fallo = False
+    solo_no_disponibles = True
+    for futuro, tramo in futuros.items():
+        if futuro in pendientes:
+            informe[tramo.nombre] = {'estado': 'plazo_agotado', 'error': f'Sin respuesta tras {timeout}s.'}
+            fallo = True
+        elif futuro.exception() is not None:
+            informe[tramo.nombre] = {'estado': 'fallido', 'error': str(futuro.exception())}
+            fallo = True
+            solo_no_disponibles = solo_no_disponibles and no_disponible(futuro.exception())
+        else:
+            informe[tramo.nombre] = _completado(*futuro.result())
+
+    if diario is not None:
+        diario.anotar({tramo.nombre: informe[tramo.nombre] for tramo in lanzar})
+    if not fallo:
+        return informe
+    if diario is not None and solo_no_disponibles:
+        # Store-and-forward: lo hecho queda hecho y el resto se reanuda luego.
+        raise EquiposNoDisponibles(informe)
+
+    futuro_de = {tramo.nombre: futuro for futuro, tramo in futuros.items()}
+    for tramo in tramos:
+        futuro = futuro_de.get(tramo.nombre)
+        if futuro in pendientes:
+            # Si termina bien después del plazo, se revierte entonces.
+            futuro.add_done_callback(
+                lambda f, tramo=tramo: f.exception() is None and _compensar(tramo, {})
+            )
+        elif informe[tramo.nombre]['estado'] == 'completado':
+            _compensar(tramo, informe[tramo.nombre])
+    if diario is not None:
+        diario.anotar({tramo.nombre: informe[tramo.nombre] for tramo in tramos})
+    raise OperacionFallida(informe)
+
+
+# --- Operaciones de cliente ---
+# `olt` y `router` son Dispositivos (None: el equipo configurado en settings).
+# `diario` se pasa a ejecutar_en_paralelo(); suspender y reactivar (ONU o
+# secret) se pueden repetir tal cual, así que no necesitan `reanudar`.
+
+def aprovisionar_cliente(nombre, onu_sn, plan_servicio, pppoe_password='password_generada',
+                         interfaz=operaciones.INTERFAZ_PON_POR_DEFECTO, olt=None, router=None, diario=None):
+    return ejecutar_en_paralelo([
+        Tramo('olt',
+              lambda: operaciones.preconfigurar_onu(onu_sn, interfaz, olt=olt),
+              lambda: operaciones.eliminar_onu(onu_sn, olt=olt),
+              lambda: operaciones.preconfigurar_onu(onu_sn, interfaz, olt=olt, reanudar=True)),
+        Tramo('mikrotik',
+              lambda: operaciones.crear_secret(nombre, pppoe_password, plan_servicio, router=router),
+              lambda: operaciones.eliminar_secret(nombre, router=router),
+              lambda: operaciones.crear_secret(nombre, pppoe_password, plan_servicio, router=router, reanudar=True)),
+    ], diario=diario)
+
+
+def desactivar_cliente(nombre, onu_sn, olt=None, router=None, diario=None):
+    return ejecutar_en_paralelo([
+        Tramo('mikrotik',
+              lambda: operaciones.deshabilitar_secret(nombre, router=router),
+              lambda: operaciones.habilitar_secret(nombre, router=router)),
+        Tramo('olt',
+              lambda: operaciones.suspender_onu(onu_sn, olt=olt),
+              lambda: operaciones.reactivar_onu(onu_sn, olt=olt)),
+    ], diario=diario)
+
+
+def reconectar_cliente(nombre, onu_sn, olt=None, router=None, diario=None):
+    return ejecutar_en_paralelo([
+        Tramo('mikrotik',
+              lambda: operaciones.habilitar_secret(nombre, router=router),
+              lambda: operaciones.deshabilitar_secret(nombre, router=router)),
+        Tramo('olt',
+              lambda: operaciones.reactivar_onu(onu_sn, olt=olt),
+              lambda: operaciones.suspender_onu(onu_sn, olt=olt)),
+    ], diario=diario)
+
+
+def eliminar_cliente(nombre, onu_sn, olt=None, router=None, diario=None):
+    eliminado = {}
+
+    def eliminar_secret():
+        eliminado['secret'] = operaciones.eliminar_secret(nombre, router=router)
+
+    def restaurar_secret():
+        if eliminado.get('secret'):
+            operaciones.restaurar_secret(eliminado['secret'], router=router)
+
+    def eliminar_onu(reanudar=False):
+        # La interfaz original queda en el diario para restaurar la ONU allí.
+        eliminado['interfaz'] = operaciones.retirar_onu(onu_sn, olt=olt, reanudar=reanudar)
+        return {'interfaz': eliminado['interfaz']}
+
+    def restaurar_onu():
+        anotado = diario.registro('olt') if diario is not None else None
+        interfaz = eliminado.get('interfaz') or ((anotado or {}).get('datos') or {}).get('interfaz')
+        if interfaz is None:
+            raise ValueError(f'No se conoce la interfaz en la que estaba la ONU {onu_sn}.')
+        operaciones.preconfigurar_onu(onu_sn, interfaz, olt=olt)
+
+    return ejecutar_en_paralelo([
+        Tramo('mikrotik', eliminar_secret, restaurar_secret),
+        Tramo('olt', eliminar_onu, restaurar_onu, lambda: eliminar_onu(reanudar=True)),
+    ], diario=diario)
+
+
+def migrar_onu(onu_sn, origen, destino, interfaz=operaciones.INTERFAZ_PON_POR_DEFECTO,
+               interfaz_origen=operaciones.INTERFAZ_PON_POR_DEFECTO, diario=None):
+    """
+    Mueve una ONU de la OLT `origen` a la OLT `destino`: la baja en el origen
+    y la pre-configuración en el destino se hacen a la vez, cada una en su
+    propia sesión. Si una falla se deshace la otra.
+    """
+    return ejecutar_en_paralelo([
+        Tramo('olt_origen',
+              lambda: operaciones.eliminar_onu(onu_sn, olt=origen),
+              lambda: operaciones.preconfigurar_onu(onu_sn, interfaz_origen, olt=origen),
+              lambda: operaciones.eliminar_onu(onu_sn, olt=origen, reanudar=True)),
+        Tramo('olt_destino',
+              lambda: operaciones.preconfigurar_onu(onu_sn, interfaz, olt=destino),
+              lambda: operaciones.eliminar_onu(onu_sn, olt=destino),
+              lambda: operaciones.preconfigurar_onu(onu_sn, interfaz, olt=destino, reanudar=True)),
+    ], diario=diario)
@@ -0,0 +1,171 @@
+# gestion_red/orquestacion_async.py
+# Versión asyncio de gestion_red.orquestacion: los tramos son corrutinas que
+# corren como tareas del bucle de eventos en lugar de ocupar un hilo cada uno.
+
+import asyncio
+import logging
+import time
+
+from django.conf import settings
+
+from . import operaciones_async as operaciones
+from .orquestacion import EquiposNoDisponibles, OperacionFallida, Tramo, _completado, no_disponible
+from .pool import PLAZO, plazo, sin_plazo
+
+# Tareas de compensación tardía en curso (el bucle solo guarda referencias débiles).
+_compensaciones = set()
+
+
+async def _medir(ejecutar):
+    inicio = time.monotonic()
+    datos = await ejecutar()
+    return round(time.monotonic() - inicio, 3), datos
+
+
+async def _compensar(tramo, informe):
+    if tramo.compensar is None:
+        informe['compensacion'] = 'sin acción de compensación'
+        return
+    try:
+        with sin_plazo():
+            await tramo.compensar()
+        informe['compensacion'] = 'ok'
+        logging.info(f"Tramo {tramo.nombre} revertido.")
+    except Exception as e:
+        informe['compensacion'] = f'error: {e}'
+        logging.error(f"No se pudo revertir el tramo {tramo.nombre}: {e}")
+
+
+def _compensar_al_terminar(tramo):
+    def callback(tarea):
+        if tarea.cancelled() or tarea.exception() is not None:
+            return
+        compensacion = asyncio.get_running_loop().create_task(_compensar(tramo, {}))
+        _compensaciones.add(compensacion)
+        compensacion.add_done_callback(_compensaciones.discard)
+    return callback
+
+
+async def ejecutar_en_paralelo(tramos, timeout=None, diario=None):
+    """
+    Igual que orquestacion.ejecutar_en_paralelo(), con `ejecutar`,
+    `compensar` y `reanudar` de cada tramo devolviendo corrutinas y
+    `diario.anotar` también una corrutina. El diario tiene el mismo formato
+    que el de la versión con hilos, así que una operación interrumpida se
+    puede reanudar con cualquiera de las dos. Los tramos que siguen en curso
+    al agotarse el plazo no se cancelan (pueden estar a mitad de un script):
+    si terminan bien, se revierten entonces.
+    """
+    timeout = timeout or getattr(settings, 'OPERACION_TIMEOUT', 30)
+    informe = {}
+    if diario is not None:
+        for tramo in tramos:
+            registro = diario.registro(tramo.nombre)
+            if registro is not None and registro['estado'] == 'completado' and 'compensacion' not in registro:
+                informe[tramo.nombre] = registro
+    lanzar = [tramo for tramo in tramos if tramo.nombre not in informe]
+    if diario is not None:
+        inciertos = {tramo.nombre for tramo in lanzar if diario.registro(tramo.nombre) is not None}
+        await diario.anotar({tramo.nombre: {'estado': 'en_curso'} for tramo in lanzar})
+    else:
+        inciertos = set()
+
+    with plazo(timeout):
+        # Cada tarea hereda el contexto de quien lanzó la operación, plazo incluido.
+        tareas = {
+            asyncio.ensure_future(_medir(
+                tramo.reanudar if tramo.nombre in inciertos and tramo.reanudar else tramo.ejecutar
+            )): tramo
+            for tramo in lanzar
+        }
+        _, pendientes = await asyncio.wait(tareas, timeout=max(PLAZO.get() - time.monotonic(), 0))
+
+    fallo = False
+    solo_no_disponibles = True
+    for tarea, tramo in tareas.items():
+        if tarea in pendientes:
+            informe[tramo.nombre] = {'estado': 'plazo_agotado', 'error': f'Sin respuesta tras {timeout}s.'}
+            fallo = True
+        elif tarea.exception() is not None:
+            informe[tramo.nombre] = {'estado': 'fallido', 'error': str(tarea.exception())}
+            fallo = True
+            solo_no_disponibles = solo_no_disponibles and no_disponible(tarea.exception())
+        else:
+            informe[tramo.nombre] = _completado(*tarea.result())
+
+    if diario is not None:
+        await diario.anotar({tramo.nombre: informe[tramo.nombre] for tramo in lanzar})
+    if not fallo:
+        return informe
+    if diario is not None and solo_no_disponibles:
+        raise EquiposNoDisponibles(informe)
+
+    tarea_de = {tramo.nombre: tarea for tarea, tramo in tareas.items()}
+    compensaciones = []
+    for tramo in tramos:
+        tarea = tarea_de.get(tramo.nombre)
+        if tarea in pendientes:
+            tarea.add_done_callback(_compensar_al_terminar(tramo))
+        elif informe[tramo.nombre]['estado'] == 'completado':
+            compensaciones.append(_compensar(tramo, informe[tramo.nombre]))
+    await asyncio.gather(*compensaciones)
+    if diario is not None:
+        await diario.anotar({tramo.nombre: informe[tramo.nombre] for tramo in tramos})
+    raise OperacionFallida(informe)
+
+
+# --- Operaciones de cliente ---
+# `olt` y `router` son Dispositivos (None: el equipo configurado en settings);
+# `diario`, como en orquestacion.
+
+async def aprovisionar_cliente(nombre, onu_sn, plan_servicio, pppoe_password='password_generada',
+                               interfaz=operaciones.INTERFAZ_PON_POR_DEFECTO, olt=None, router=None, diario=None):
+    return await ejecutar_en_paralelo([
+        Tramo('olt',
+              lambda: operaciones.preconfigurar_onu(onu_sn, interfaz, olt=olt),
+              lambda: operaciones.eliminar_onu(onu_sn, olt=olt),
+              lambda: operaciones.preconfigurar_onu(onu_sn, interfaz, olt=olt, reanudar=True)),
+        Tramo('mikrotik',
+              lambda: operaciones.crear_secret(nombre, pppoe_password, plan_servicio, router=router),
+              lambda: operaciones.eliminar_secret(nombre, router=router),
+              lambda: operaciones.crear_secret(nombre, pppoe_password, plan_servicio, router=router, reanudar=True)),
+    ], diario=diario)
+
+
+async def desactivar_cliente(nombre, onu_sn, olt=None, router=None, diario=None):
+    return await ejecutar_en_paralelo([
+        Tramo('mikrotik',
+              lambda: operaciones.deshabilitar_secret(nombre, router=router),
+              lambda: operaciones.habilitar_secret(nombre, router=router)),
+        Tramo('olt',
+              lambda: operaciones.suspender_onu(onu_sn, olt=olt),
+              lambda: operaciones.reactivar_onu(onu_sn, olt=olt)),
+    ], diario=diario)
+
+
+async def reconectar_cliente(nombre, onu_sn, olt=None, router=None, diario=None):
+    return await ejecutar_en_paralelo([
+        Tramo('mikrotik',
+              lambda: operaciones.habilitar_secret(nombre, router=router),
+              lambda: operaciones.deshabilitar_secret(nombre, router=router)),
+        Tramo('olt',
+              lambda: operaciones.reactivar_onu(onu_sn, olt=olt),
+              lambda: operaciones.suspender_onu(onu_sn, olt=olt)),
+    ], diario=diario)
+
+
+async def migrar_onu(onu_sn, origen, destino, interfaz=operaciones.INTERFAZ_PON_POR_DEFECTO,
+                     interfaz_origen=operaciones.INTERFAZ_PON_POR_DEFECTO, diario=None):
+    """
+    Igual que orquestacion.migrar_onu().
+    """
+    return await ejecutar_en_paralelo([
+        Tramo('olt_origen',
+              lambda: operaciones.eliminar_onu(onu_sn, olt=origen),
+              lambda: operaciones.preconfigurar_onu(onu_sn, interfaz_origen, olt=origen),
+              lambda: operaciones.eliminar_onu(onu_sn, olt=origen, reanudar=True)),
+        Tramo('olt_destino',
+              lambda: operaciones.preconfigurar_onu(onu_sn, interfaz, olt=destino),
+              lambda: operaciones.eliminar_onu(onu_sn, olt=destino),
+              lambda: operaciones.preconfigurar_onu(onu_sn, interfaz, olt=destino, reanudar=True)),
+    ], diario=diario)
@@ -0,0 +1,488 @@
+# gestion_red/pool.py
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Prioridades de quien pide una conexión: un número menor pasa antes.
+INTERACTIVA = 0     # un operador esperando la respuesta
+SEGUNDO_PLANO = 1   # trabajos encolados, monitoreo
+LOTE = 2            # lotes y reconciliaciones masivas
+
+NOMBRES_PRIORIDAD = {INTERACTIVA: 'interactiva', SEGUNDO_PLANO: 'segundo_plano', LOTE: 'lote'}
+
+# Prioridad de las operaciones del contexto actual. Las peticiones web la
+# elevan a INTERACTIVA (ver gestion_red.middleware).
+PRIORIDAD = contextvars.ContextVar('prioridad', default=SEGUNDO_PLANO)
+
+
+@contextmanager
+def prioridad(nivel):
+    """
+    Ejecuta el bloque con la prioridad `nivel` para las conexiones que pida.
+    """
+    token = PRIORIDAD.set(nivel)
+    try:
+        yield
+    finally:
+        PRIORIDAD.reset(token)
+
+
+# Instante (time.monotonic) en el que vence el plazo de las operaciones del
+# contexto actual, o None si no hay plazo. Lo respetan la espera en el pool,
+# la apertura de conexiones y cada comando a los equipos.
+PLAZO = contextvars.ContextVar('plazo', default=None)
+
+
+class PlazoAgotado(Exception):
+    """
+    Se agotó el plazo de la operación en curso (ver `plazo`).
+    """
+
+
+@contextmanager
+def plazo(segundos):
+    """
+    Ejecuta el bloque con un plazo de `segundos` para todas sus llamadas a
+    los equipos. Un plazo anidado nunca alarga el de fuera.
+    """
+    limite = time.monotonic() + segundos
+    actual = PLAZO.get()
+    token = PLAZO.set(limite if actual is None else min(actual, limite))
+    try:
+        yield
+    finally:
+        PLAZO.reset(token)
+
+
+@contextmanager
+def sin_plazo():
+    """
+    Ejecuta el bloque sin el plazo del contexto: para deshacer lo ya hecho
+    aunque quien lo pidió haya dejado de esperar.
+    """
+    token = PLAZO.set(None)
+    try:
+        yield
+    finally:
+        PLAZO.reset(token)
+
+
+def tiempo_restante(maximo=None):
+    """
+    Segundos que puede durar la siguiente espera: `maximo` (None: sin
+    límite propio), recortado a lo que queda del plazo del contexto. Lanza
+    PlazoAgotado si el plazo ya venció.
+    """
+    limite = PLAZO.get()
+    if limite is None:
+        return maximo
+    restante = limite - time.monotonic()
+    if restante <= 0:
+        raise PlazoAgotado('Se agotó el plazo de la operación.')
+    return restante if maximo is None else min(maximo, restante)
+
+
+def con_prioridad(nivel, funcion):
+    """
+    Envuelve `funcion` para que se ejecute con la prioridad `nivel` y con el
+    contexto de quien la envuelve (p. ej. la medición de la petición); útil
+    al enviarla a otro hilo, que no hereda el contexto.
+    """
+    contexto = contextvars.copy_context()
+
+    def ejecutar(*args, **kwargs):
+        with prioridad(nivel):
+            return funcion(*args, **kwargs)
+
+    def envoltorio(*args, **kwargs):
+        # Una copia por llamada: el envoltorio puede correr en varios hilos a la vez.
+        return contexto.copy().run(ejecutar, *args, **kwargs)
+    return envoltorio
+
+
+class PoolTimeout(Exception):
+    """
+    No se obtuvo una conexión libre del pool dentro del tiempo de espera.
+    """
+
+
+class PoolSaturado(PoolTimeout):
+    """
+    La cola de espera del pool está llena: se rechaza la petición en lugar
+    de acumular más esperas sobre el equipo.
+    """
+
+
+class CircuitoAbierto(PoolTimeout):
+    """
+    El equipo falló repetidamente y su circuito está abierto: se rechaza la
+    petición al instante en lugar de esperar a que venza la conexión.
+    """
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones seguro para usar desde varios hilos.
+
+    Las conexiones ociosas se reutilizan (la más reciente primero). Antes de
+    prestar una conexión que lleva más de `keepalive` segundos sin usarse se
+    la sondea con `validar`; si la sonda falla, o si superó `max_inactividad`,
+    se descarta y se crea una nueva en su lugar.
+
+    `tamano` limita las conexiones simultáneas al equipo. Cuando están todas
+    en uso, las peticiones esperan en una cola ordenada por prioridad (y por
+    orden de llegada dentro de cada prioridad); si ya hay `cola_maxima`
+    esperando se rechazan con PoolSaturado.
+
+    Con `circuito` (gestion_red.circuito.Circuito), las conexiones que no se
+    pueden abrir y las que se devuelven rotas cuentan como fallos del
+    equipo; con el circuito abierto `acquire` falla al instante, y mientras
+    no esté cerrado se sondea toda conexión ociosa antes de prestarla.
+    """
+
+    def __init__(self, crear, validar, cerrar, tamano=4, timeout=10,
+                 keepalive=30, max_inactividad=300, nombre='pool', cola_maxima=None, circuito=None):
+        self._crear = crear
+        self._validar = validar
+        self._cerrar = cerrar
+        self.tamano = tamano
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self.max_inactividad = max_inactividad
+        self.nombre = nombre
+        self.cola_maxima = cola_maxima
+        self.circuito = circuito
+
+        self._cond = threading.Condition()
+        self._libres = []  # [(conexion, ultimo_uso)], la más reciente al final
+        self._total = 0    # conexiones vivas: libres + prestadas + creándose
+        self._cola = []    # montículo de esperas: (prioridad, turno)
+        self._turnos = itertools.count()
+        self._expulsadas = set()  # esperas desplazadas por otras más prioritarias
+        self._cerrado = False  # tras close_all las conexiones devueltas se cierran
+
+        # Métricas acumuladas desde que se creó el pool.
+        self._prestadas = 0
+        self._esperas = 0
+        self._espera_total = 0.0
+        self._espera_maxima = 0.0
+        self._rechazadas = 0
+        self._agotadas = 0
+
+    def acquire(self, timeout=None, prioridad=None):
+        """
+        Presta una conexión sana. Si el pool está lleno espera su turno según
+        `prioridad` (por defecto la del contexto, ver PRIORIDAD) como máximo
+        `timeout` segundos (por defecto el del pool, y nunca más allá del
+        plazo del contexto).
+        """
+        prioridad = PRIORIDAD.get() if prioridad is None else prioridad
+        self._permitir()
+        espera = tiempo_restante(self.timeout if timeout is None else timeout)
+        inicio = time.monotonic()
+        limite = inicio + espera
+        vencidas = []
+        turno = None
+        with self._cond:
+            while True:
+                turno, prestamo = self._intentar(turno, prioridad, inicio, vencidas)
+                if prestamo is not None:
+                    conexion, ultimo_uso = prestamo
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self._abandonar(turno, espera)
+                self._cond.wait(restante)
+
+        for vieja in vencidas:
+            self._cerrar_silencioso(vieja)
+
+        if conexion is not None and self._hay_que_sondear(ultimo_uso):
+            if not self._sondear(conexion):
+                logging.info(f"{self.nombre}: conexión ociosa sin respuesta, se reemplaza.")
+                self._cerrar_silencioso(conexion)
+                conexion = None
+            else:
+                self._exito()
+
+        if conexion is None:
+            try:
+                conexion = self._crear()
+            except BaseException as e:
+                with self._cond:
+                    self._total -= 1
+                    self._cond.notify_all()
+                self._fallo(e)
+                raise
+            self._exito()
+        return conexion
+
+    def release(self, conexion, rota=False, error=None):
+        """
+        Devuelve una conexión al pool. Si `rota` es True se cierra y se libera
+        su lugar para que otra petición abra una nueva; `error` es lo que la
+        rompió, si se sabe (un plazo agotado no cuenta contra el circuito).
+        """
+        if rota:
+            self._fallo(error)
+            self._cerrar_silencioso(conexion)
+            with self._cond:
+                self._total -= 1
+                self._cond.notify_all()
+            return
+        self._exito()
+        with self._cond:
+            cerrado = self._cerrado
+            if cerrado:
+                self._total -= 1
+            else:
+                self._libres.append((conexion, time.monotonic()))
+            self._cond.notify_all()
+        if cerrado:
+            self._cerrar_silencioso(conexion)
+
+    def close_all(self):
+        """
+        Cierra todas las conexiones ociosas y marca el pool como cerrado: las
+        prestadas se cierran al devolverse en lugar de volver al pool (p. ej.
+        tras reemplazarlo porque cambiaron las credenciales del equipo).
+        """
+        with self._cond:
+            self._cerrado = True
+            libres, self._libres = self._libres, []
+            self._total -= len(libres)
+            self._cond.notify_all()
+        for conexion, _ in libres:
+            self._cerrar_silencioso(conexion)
+
+    def _intentar(self, turno, prioridad, inicio, vencidas):
+        """
+        Un intento de obtener lugar en el pool, con el lock tomado. Devuelve
+        `(turno, prestamo)`: `prestamo` es None si hay que seguir esperando
+        (ya en la cola con `turno`) o `(conexion, ultimo_uso)`, con conexion
+        None si hay que crear una nueva. Las conexiones vencidas se agregan a
+        `vencidas` para cerrarlas fuera del lock.
+        """
+        if turno in self._expulsadas:
+            self._expulsadas.discard(turno)
+            self._rechazar()
+        ahora = time.monotonic()
+        # Las más antiguas están al principio de la lista.
+        while self._libres and ahora - self._libres[0][1] > self.max_inactividad:
+            vencidas.append(self._libres.pop(0)[0])
+            self._total -= 1
+        hay_lugar = self._libres or self._total < self.tamano
+        if hay_lugar and (not self._cola or self._cola[0] == turno):
+            if turno is not None:
+                heapq.heappop(self._cola)
+                self._registrar_espera(ahora - inicio)
+                # Puede quedar lugar para el siguiente de la cola.
+                self._notificar()
+            self._prestadas += 1
+            if self._libres:
+                return turno, self._libres.pop()
+            self._total += 1
+            return turno, (None, None)
+        if turno is None:
+            if self.cola_maxima is not None and len(self._cola) >= self.cola_maxima:
+                # Cola llena: se rechaza la espera menos prioritaria (la más
+                # reciente de la peor prioridad), que puede ser la nueva.
+                peor = max(self._cola)
+                if peor[0] <= prioridad:
+                    self._rechazar()
+                self._cola.remove(peor)
+                heapq.heapify(self._cola)
+                self._expulsadas.add(peor)
+                self._notificar()
+            turno = (prioridad, next(self._turnos))
+            heapq.heappush(self._cola, turno)
+        return turno, None
+
+    def _abandonar(self, turno, espera):
+        # Se agotó el tiempo de espera: se sale de la cola y se avisa al resto.
+        self._cola.remove(turno)
+        heapq.heapify(self._cola)
+        self._agotadas += 1
+        self._notificar()
+        raise PoolTimeout(
+            f"{self.nombre}: no hay conexiones libres tras {espera:.1f}s "
+            f"({self._total}/{self.tamano} en uso)."
+        )
+
+    def _permitir(self):
+        if self.circuito is not None:
+            self.circuito.permitir()
+
+    def _hay_que_sondear(self, ultimo_uso):
+        # Con el circuito sin cerrar, la conexión ociosa hace de sonda del equipo.
+        if self.circuito is not None and not self.circuito.cerrado:
+            return True
+        return time.monotonic() - ultimo_uso > self.keepalive
+
+    def _exito(self):
+        if self.circuito is not None:
+            self.circuito.exito()
+
+    def _fallo(self, error=None):
+        # Un plazo vencido es del que llama, no una falla del equipo.
+        if self.circuito is not None and not isinstance(error, (PlazoAgotado, PoolTimeout)):
+            self.circuito.fallo(error)
+
+    def _notificar(self):
+        self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            en_espera = {nombre: 0 for nombre in NOMBRES_PRIORIDAD.values()}
+            for prioridad, _ in self._cola:
+                nombre = NOMBRES_PRIORIDAD.get(prioridad, str(prioridad))
+                en_espera[nombre] = en_espera.get(nombre, 0) + 1
+            return {
+                'nombre': self.nombre,
+                'tamano': self.tamano,
+                'abiertas': self._total,
+                'libres': len(self._libres),
+                'en_uso': self._total - len(self._libres),
+                'en_espera': len(self._cola),
+                'en_espera_por_prioridad': en_espera,
+                'cola_maxima': self.cola_maxima,
+                'prestadas': self._prestadas,
+                'esperas': self._esperas,
+                'espera_media': round(self._espera_total / self._esperas, 3) if self._esperas else 0.0,
+                'espera_maxima': round(self._espera_maxima, 3),
+                'rechazadas': self._rechazadas,
+                'agotadas': self._agotadas,
+                'circuito': self.circuito.stats() if self.circuito is not None else None,
+            }
+
+    def _rechazar(self):
+        self._rechazadas += 1
+        raise PoolSaturado(
+            f"{self.nombre}: {len(self._cola)} peticiones esperando, "
+            f"se rechaza esta ({self._total}/{self.tamano} en uso)."
+        )
+
+    def _registrar_espera(self, segundos):
+        self._esperas += 1
+        self._espera_total += segundos
+        self._espera_maxima = max(self._espera_maxima, segundos)
+
+    def _sondear(self, conexion):
+        try:
+            return bool(self._validar(conexion))
+        except Exception:
+            return False
+
+    def _cerrar_silencioso(self, conexion):
+        try:
+            self._cerrar(conexion)
+        except Exception as e:
+            logging.debug(f"{self.nombre}: error al cerrar conexión: {e}")
+
+
+class ConnectionPoolAsync(ConnectionPool):
+    """
+    Variante asyncio de ConnectionPool, con la misma política (límite por
+    equipo, cola por prioridad, rechazo por saturación) y las mismas
+    métricas. `crear`, `validar` y `cerrar` son corrutinas, y `acquire`,
+    `release` y `close_all` también. Debe usarse siempre desde el mismo
+    bucle de eventos.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._acond = asyncio.Condition()
+
+    async def acquire(self, timeout=None, prioridad=None):
+        prioridad = PRIORIDAD.get() if prioridad is None else prioridad
+        self._permitir()
+        espera = tiempo_restante(self.timeout if timeout is None else timeout)
+        inicio = time.monotonic()
+        limite = inicio + espera
+        vencidas = []
+        turno = None
+        async with self._acond:
+            while True:
+                turno, prestamo = self._intentar(turno, prioridad, inicio, vencidas)
+                if prestamo is not None:
+                    conexion, ultimo_uso = prestamo
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self._abandonar(turno, espera)
+                try:
+                    await asyncio.wait_for(self._acond.wait(), restante)
+                except asyncio.TimeoutError:
+                    pass
+
+        for vieja in vencidas:
+            await self._cerrar_silencioso(vieja)
+
+        if conexion is not None and self._hay_que_sondear(ultimo_uso):
+            if not await self._sondear(conexion):
+                logging.info(f"{self.nombre}: conexión ociosa sin respuesta, se reemplaza.")
+                await self._cerrar_silencioso(conexion)
+                conexion = None
+            else:
+                self._exito()
+
+        if conexion is None:
+            try:
+                conexion = await self._crear()
+            except BaseException as e:
+                async with self._acond:
+                    self._total -= 1
+                    self._notificar()
+                self._fallo(e)
+                raise
+            self._exito()
+        return conexion
+
+    async def release(self, conexion, rota=False, error=None):
+        if rota:
+            self._fallo(error)
+            await self._cerrar_silencioso(conexion)
+            async with self._acond:
+                self._total -= 1
+                self._notificar()
+            return
+        self._exito()
+        async with self._acond:
+            cerrado = self._cerrado
+            if cerrado:
+                self._total -= 1
+            else:
+                self._libres.append((conexion, time.monotonic()))
+            self._notificar()
+        if cerrado:
+            await self._cerrar_silencioso(conexion)
+
+    async def close_all(self):
+        async with self._acond:
+            self._cerrado = True
+            libres, self._libres = self._libres, []
+            self._total -= len(libres)
+            self._notificar()
+        for conexion, _ in libres:
+            await self._cerrar_silencioso(conexion)
+
+    def _notificar(self):
+        self._acond.notify_all()
+
+    async def _sondear(self, conexion):
+        try:
+            return bool(await self._validar(conexion))
+        except Exception:
+            return False
+
+    async def _cerrar_silencioso(self, conexion):
+        try:
+            await self._cerrar(conexion)
+        except Exception as e:
+            logging.debug(f"{self.nombre}: error al cerrar conexión: {e}")
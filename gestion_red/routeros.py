@@ -0,0 +1,97 @@
+# gestion_red/routeros.py
+
+import re
+
+from librouteros.exceptions import TrapError
+from librouteros.protocol import parse_word
+
+UPTIME = re.compile(r'(\d+)([wdhms])')
+SEGUNDOS = {'w': 604800, 'd': 86400, 'h': 3600, 'm': 60, 's': 1}
+
+
+def uptime_a_segundos(uptime):
+    """
+    Convierte un uptime de RouterOS ("1w2d3h4m5s") a segundos.
+    """
+    return sum(int(n) * SEGUNDOS[unidad] for n, unidad in UPTIME.findall(str(uptime or '')))
+
+
+def segundos_a_uptime(segundos):
+    segundos = int(segundos)
+    partes = []
+    for unidad in 'wdhms':
+        cantidad, segundos = divmod(segundos, SEGUNDOS[unidad])
+        if cantidad:
+            partes.append(f'{cantidad}{unidad}')
+    return ''.join(partes) or '0s'
+
+
+def _parsear(words):
+    tag = None
+    fila = {}
+    for word in words:
+        if word.startswith('.tag='):
+            tag = word[len('.tag='):]
+        else:
+            key, value = parse_word(word)
+            fila[key] = value
+    return tag, fila
+
+
+def seguir_tabla(api, ruta, proplist=None):
+    """
+    Sigue una tabla de RouterOS (p. ej. '/ppp/active') sobre una conexión
+    dedicada. Genera primero ('snapshot', filas) con el contenido completo y
+    después ('cambio', fila) por cada alta o modificación, o ('baja', fila)
+    cuando el router marca la fila con `.dead`.
+
+    `listen` se lanza antes que `print` en la misma conexión (con tags), así
+    ningún cambio ocurrido durante la carga inicial se pierde: se aplica
+    justo después del snapshot.
+    """
+    extra = (f'=.proplist={",".join(proplist)}',) if proplist else ()
+    api.protocol.writeSentence(f'{ruta}/listen', '.tag=escucha')
+    api.protocol.writeSentence(f'{ruta}/print', '.tag=snapshot', *extra)
+
+    snapshot = []
+    pendientes = []
+    while True:
+        reply_word, words = api.protocol.readSentence()
+        tag, fila = _parsear(words)
+        if reply_word == '!trap':
+            raise TrapError(message=str(fila.get('message', '')), category=fila.get('category'))
+        if reply_word != '!re' and not (tag == 'snapshot' and reply_word == '!done'):
+            continue
+
+        if tag == 'snapshot':
+            if reply_word == '!re':
+                snapshot.append(fila)
+                continue
+            yield 'snapshot', snapshot
+            for evento in pendientes:
+                yield evento
+            pendientes = None
+        elif tag == 'escucha':
+            evento = ('baja' if fila.get('.dead') else 'cambio', fila)
+            if pendientes is None:
+                yield evento
+            else:
+                pendientes.append(evento)
+
+
+def seguir_periodico(api, comandos, intervalo):
+    """
+    Lanza a la vez varios `print` con `interval` sobre una conexión dedicada
+    (`comandos` es {tag: ruta}, p. ej. {'recursos': '/system/resource'}) y
+    genera (tag, fila) por cada fila que el router reenvía en cada
+    intervalo. Una sola conexión sirve todas las lecturas periódicas.
+    """
+    for tag, ruta in comandos.items():
+        api.protocol.writeSentence(f'{ruta}/print', f'.tag={tag}', f'=interval={intervalo}')
+    while True:
+        reply_word, words = api.protocol.readSentence()
+        tag, fila = _parsear(words)
+        if reply_word == '!trap':
+            raise TrapError(message=str(fila.get('message', '')), category=fila.get('category'))
+        if reply_word == '!re':
+            yield tag, fila
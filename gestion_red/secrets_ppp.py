@@ -0,0 +1,109 @@
+# gestion_red/secrets_ppp.py
+
+from .tablas_routeros import TablaSeguida, seguir
+
+
+class EspejoSecrets(TablaSeguida):
+    """
+    Copia en memoria de /ppp/secret: nombre -> .id, perfil, servicio y si
+    está deshabilitado (sin contraseñas). Se carga con un snapshot, se
+    mantiene al día con los eventos de `listen` y, además, cada escritura
+    que hace la aplicación la actualiza en el acto. Así las operaciones no
+    necesitan buscar el .id en el router antes de modificar un secret.
+    """
+    RUTA = '/ppp/secret'
+    CAMPOS = ('.id', 'name', 'profile', 'service', 'disabled')
+    DESCRIPCION = 'secrets'
+    HILO = 'espejo-secrets'
+
+    # Escrituras hechas por la aplicación (el evento de listen llega después y no cambia nada).
+
+    def registrar(self, secret_id, nombre, perfil=None, servicio=None, deshabilitado=False):
+        self.aplicar({'.id': secret_id, 'name': nombre, 'profile': perfil, 'service': servicio, 'disabled': deshabilitado})
+
+    def actualizar(self, secret_id, deshabilitado):
+        self.aplicar({'.id': secret_id, 'disabled': deshabilitado})
+
+    def quitar(self, secret_id):
+        self.aplicar({'.id': secret_id, '.dead': True})
+
+    def secret(self, nombre):
+        """
+        Devuelve el secret de `nombre` ({id, nombre, perfil, servicio,
+        deshabilitado}), o None si no está o si el espejo todavía no está
+        sincronizado con el router.
+        """
+        with self._lock:
+            if not self.sincronizado:
+                return None
+            entrada = self._por_nombre.get(nombre)
+            return dict(entrada) if entrada is not None else None
+
+    def secrets(self, nombres):
+        """
+        Secrets de varios clientes ({nombre: secret o None}). Devuelve un
+        diccionario vacío si el espejo aún no está sincronizado.
+        """
+        with self._lock:
+            if not self.sincronizado:
+                return {}
+            return {
+                nombre: dict(self._por_nombre[nombre]) if nombre in self._por_nombre else None
+                for nombre in nombres
+            }
+
+    def ids(self):
+        """
+        {nombre: .id} de todos los secrets, o None si no está sincronizado.
+        """
+        with self._lock:
+            if not self.sincronizado:
+                return None
+            return {nombre: entrada['id'] for nombre, entrada in self._por_nombre.items()}
+
+    @staticmethod
+    def _entrada(fila):
+        return {
+            'id': fila.get('.id'),
+            'nombre': fila.get('name'),
+            'perfil': fila.get('profile'),
+            'servicio': fila.get('service'),
+            'deshabilitado': fila.get('disabled') in (True, 'true', 'yes'),
+        }
+
+    def _combinar(self, anterior, fila):
+        return self._entrada({**self._fila(anterior), **fila})
+
+    @staticmethod
+    def _fila(entrada):
+        return {
+            '.id': entrada['id'],
+            'name': entrada['nombre'],
+            'profile': entrada['perfil'],
+            'service': entrada['servicio'],
+            'disabled': entrada['deshabilitado'],
+        }
+
+
+def iniciar_espejo(router=None):
+    """
+    Devuelve el espejo de /ppp/secret de `router` (None: el MikroTik de
+    settings), arrancando la primera vez el hilo que lo mantiene al día.
+    """
+    return seguir(EspejoSecrets, router)
+
+
+def estado_secret(nombre, router=None):
+    """
+    Secret PPP de un cliente según el espejo de su router, sin consultar al
+    router. None si no existe o si el espejo aún no está sincronizado.
+    """
+    return iniciar_espejo(router).secret(nombre)
+
+
+def estados_secrets(nombres, router=None):
+    """
+    Secrets PPP de varios clientes de un mismo router. Devuelve un
+    diccionario vacío si el espejo aún no está sincronizado.
+    """
+    return iniciar_espejo(router).secrets(nombres)
@@ -0,0 +1,81 @@
+# gestion_red/sesiones_ppp.py
+
+import time
+
+from .routeros import segundos_a_uptime, uptime_a_segundos
+from .tablas_routeros import TablaSeguida, seguir
+
+
+class IndiceSesiones(TablaSeguida):
+    """
+    Índice en memoria de las sesiones PPP activas: nombre -> address, uptime,
+    caller-id. Se carga con un snapshot de /ppp/active y se mantiene al día
+    con los eventos de `listen`, así que consultarlo no cuesta ninguna ida y
+    vuelta al router.
+    """
+    RUTA = '/ppp/active'
+    CAMPOS = ('.id', 'name', 'address', 'uptime', 'caller-id')
+    DESCRIPCION = 'sesiones activas'
+    HILO = 'indice-ppp'
+
+    def estado(self, nombre):
+        """
+        Devuelve el estado de la sesión de `nombre`, o None si el índice
+        todavía no está sincronizado con el router.
+        """
+        return self.estados([nombre]).get(nombre) if self.sincronizado else None
+
+    def estados(self, nombres):
+        ahora = time.time()
+        with self._lock:
+            if not self.sincronizado:
+                return {}
+            return {nombre: self._publicar(self._por_nombre.get(nombre), ahora) for nombre in nombres}
+
+    @staticmethod
+    def _entrada(fila):
+        return {
+            'nombre': fila.get('name'),
+            'address': fila.get('address'),
+            'caller_id': fila.get('caller-id'),
+            # Se guarda el instante de conexión para no depender de eventos de uptime.
+            'desde': time.time() - uptime_a_segundos(fila.get('uptime')),
+        }
+
+    def _combinar(self, anterior, fila):
+        return {**anterior, 'address': fila.get('address', anterior['address'])}
+
+    @staticmethod
+    def _publicar(entrada, ahora):
+        if entrada is None:
+            return {'online': False}
+        return {
+            'online': True,
+            'address': entrada['address'],
+            'caller_id': entrada['caller_id'],
+            'uptime': segundos_a_uptime(ahora - entrada['desde']),
+        }
+
+
+def iniciar_indice(router=None):
+    """
+    Devuelve el índice de sesiones de `router` (None: el MikroTik de
+    settings), arrancando la primera vez el hilo que lo mantiene al día.
+    """
+    return seguir(IndiceSesiones, router)
+
+
+def estado_sesion(nombre, router=None):
+    """
+    Estado de la sesión PPP de un cliente según el índice de su router, o
+    None si aún no está sincronizado.
+    """
+    return iniciar_indice(router).estado(nombre)
+
+
+def estados_sesiones(nombres, router=None):
+    """
+    Estado de las sesiones PPP de varios clientes de un mismo router.
+    Devuelve un diccionario vacío si el índice aún no está sincronizado.
+    """
+    return iniciar_indice(router).estados(nombres)
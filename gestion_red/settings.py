@@ -53,6 +53,9 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'gestion_red.middleware.prioridad_interactiva',
+    'gestion_red.middleware.tiempos_servidor',
+    'gestion_red.middleware.plazo_peticion',
 ]
 
 ROOT_URLCONF = 'gestion_red.urls'
@@ -136,7 +139,96 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MIKROTIK_IP = '192.168.88.1'  # IP de tu MikroTik
 MIKROTIK_USER = 'admin'
 MIKROTIK_PASSWORD = 'Admin123!'
+MIKROTIK_PORT = 8728
 
 OLT_IP = '192.168.1.10'       # IP de tu OLT
 OLT_USER = 'admin'
-OLT_PASSWORD = 'tu_contraseña_olt'
\ No newline at end of file
+OLT_PASSWORD = 'tu_contraseña_olt'
+OLT_PORT = 23
+
+# Pool de conexiones a la API de MikroTik (por proceso)
+MIKROTIK_POOL_SIZE = 4         # Conexiones simultáneas como máximo
+MIKROTIK_POOL_TIMEOUT = 10     # Segundos esperando una conexión libre
+MIKROTIK_POOL_KEEPALIVE = 30   # Sondear conexiones ociosas más antiguas que esto
+MIKROTIK_POOL_MAX_IDLE = 300   # Descartar conexiones ociosas más antiguas que esto
+MIKROTIK_POOL_QUEUE_MAX = 20   # Peticiones esperando por router; más allá se rechazan las menos prioritarias
+
+# Sesiones Telnet persistentes con la OLT (por proceso)
+OLT_TIMEOUT = 10               # Segundos para conectar y para esperar cada prompt
+OLT_SESSION_POOL_SIZE = 2      # Sesiones VTY abiertas como máximo
+OLT_SESSION_TIMEOUT = 30       # Segundos esperando una sesión libre
+OLT_SESSION_KEEPALIVE = 60     # Sondear sesiones ociosas más antiguas que esto
+OLT_SESSION_MAX_IDLE = 540     # Cerrar antes del idle-timeout de la OLT (10 min)
+OLT_SESSION_QUEUE_MAX = 10     # Peticiones esperando por OLT; más allá se rechazan las menos prioritarias
+# Los límites de sesiones son por proceso: con varios workers web, el total
+# por equipo es workers x límite (ajustable por equipo en Dispositivo.max_sesiones).
+
+# Cortacircuitos por equipo (por proceso, compartido por los pools síncrono y async)
+CIRCUITO_UMBRAL = 5     # Fallas seguidas de conexión tras las que se deja de intentar con el equipo
+CIRCUITO_ESPERA = 30    # Segundos con el circuito abierto antes de dejar pasar una petición de prueba
+PLAZO_PETICION = 60     # Segundos que una petición web puede pasar en los equipos en total; None: sin plazo
+
+# Trabajos en segundo plano (cola en la base de datos, sin broker externo)
+TRABAJOS_EN_PROCESO = True         # Ejecutarlos en el propio proceso web; si es False, usar `manage.py procesar_trabajos --continuo`
+TRABAJOS_MAX_WORKERS = 4           # Trabajos simultáneos por proceso
+TRABAJOS_ABANDONADOS_TRAS = 120    # Segundos sin latido tras los que un trabajo en curso se considera abandonado
+TRABAJOS_LATIDO = 20               # Segundos entre latidos de un trabajo en curso
+TRABAJOS_INTERVALO = 5             # Segundos entre revisiones de la cola (reintentos y trabajos de un proceso caído)
+TRABAJOS_REINTENTO_ESPERA = 15     # Segundos hasta el primer reintento si un equipo no está disponible; se duplica en cada uno
+TRABAJOS_REINTENTO_ESPERA_MAX = 600    # Tope de la espera entre reintentos
+TRABAJOS_REINTENTOS_MAX = 50       # Reintentos tras los que el trabajo se da por fallido
+
+# Cabecera Idempotency-Key en la API
+IDEMPOTENCIA_TTL = 86400            # Segundos que se guarda la respuesta de cada clave
+IDEMPOTENCIA_ESPERA = 30            # Segundos que un reintento espera a la petición original en curso
+IDEMPOTENCIA_EN_CURSO_MAX = 600     # Segundos tras los que una petición en curso se da por abandonada
+
+# Cortes masivos (suspensión / reconexión por facturación)
+CORTE_TAMANO_LOTE = 200     # Clientes por lote; activo se actualiza al terminar cada lote
+CORTE_MAX_PARALELO = 4      # Equipos trabajando a la vez dentro de un lote
+
+# Snapshot del dashboard
+# Con un backend compartido (memcached, redis, base de datos) todos los workers
+# leen el mismo snapshot y solo uno consulta al router por intervalo.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+DASHBOARD_POLL_INTERVAL = 15    # Segundos entre lecturas del MikroTik
+DASHBOARD_MAX_STALENESS = 60    # Segundos tras los que el snapshot se marca como desactualizado
+DASHBOARD_PUSH_INTERVAL = 2     # Segundos entre lecturas en vivo (una sola lectura por router y proceso)
+DASHBOARD_SSE_KEEPALIVE = 15    # Segundos sin datos tras los que se envía un ping al navegador
+
+# Historial de tráfico por cliente (manage.py recolectar_trafico --continuo)
+TRAFICO_INTERVALO = 60      # Segundos entre lecturas de los contadores de todas las sesiones
+TRAFICO_RETENCION = {       # Días que se conserva cada nivel
+    'muestras': 2,
+    300: 14,                # resúmenes de 5 minutos
+    3600: 180,              # resúmenes de 1 hora
+    86400: 1825,            # resúmenes de 1 día
+}
+
+# Potencia óptica de las ONUs (manage.py barrer_onus --continuo)
+OPTICA_INTERVALO = 900      # Segundos entre barridos de todas las OLTs
+ONU_RX_MIN = -27.0          # dBm; por debajo, enlace de fibra débil
+ONU_RX_MAX = -8.0           # dBm; por encima, ONU saturada
+
+# Medición de las llamadas a los equipos (/metrics, Server-Timing)
+OPERACION_LENTA = 1.0           # Segundos a partir de los que una llamada va al registro 'gestion_red.lentas'
+METRICAS_IPS_PERMITIDAS = None  # Lista de IPs que pueden leer /metrics; None: cualquiera
+
+# Índice de sesiones PPP activas y espejo de /ppp/secret (alimentados por `listen`)
+PPP_RESINCRONIZACION = 3600 # Segundos entre recargas completas de /ppp/active y /ppp/secret (los eventos de listen las mantienen al día)
+PPP_KEEPALIVE = 60          # Segundos de silencio tras los que TCP sondea al router para detectar una conexión caída
+PPP_INDICE_REINTENTO = 5    # Segundos de espera antes de reconectar tras un error
+
+# Lista de clientes
+CLIENTES_POR_PAGINA = 50
+CLIENTES_CACHE_FILAS = 86400    # Segundos que se guarda en caché cada fila renderizada
+CLIENTES_EXPORTACION_LOTE = 2000    # Filas por consulta al exportar
+CLIENTES_IMPORTACION_LOTE = 1000    # Filas por bulk_create al importar
+
+# Operaciones sobre OLT y MikroTik en paralelo
+ORQUESTACION_MAX_WORKERS = 8    # Tramos simultáneos por proceso
+OPERACION_TIMEOUT = 30          # Segundos de plazo común para todos los tramos de una operación
@@ -0,0 +1,749 @@
+# gestion_red/simuladores.py
+# Equipos simulados para desarrollo y benchmarks: un MikroTik que habla el
+# protocolo de la API de RouterOS (el mismo que librouteros) y una OLT ZTE
+# con su CLI por Telnet. Guardan estado (secrets, sesiones PPP, ONUs), así
+# que las operaciones reales de gestion_red funcionan contra ellos sin
+# cambios. Ambos admiten latencia por comando y fallos inyectados (errores
+# del equipo o cortes de conexión) con la probabilidad indicada.
+
+import logging
+import random
+import re
+import socket
+import socketserver
+import threading
+import time
+import zlib
+from collections import Counter
+
+from librouteros.protocol import decode_length, determine_length, encode_sentence
+
+from .telnet import IAC, SB, SE, WILL, ECHO, SGA
+
+
+class _Servidor(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, direccion, simulador):
+        self.simulador = simulador
+        super().__init__(direccion, _Manejador)
+
+
+class _Manejador(socketserver.BaseRequestHandler):
+    def handle(self):
+        self.server.simulador._atender(self.request)
+
+
+class _Simulador:
+    """
+    Base de los simuladores: servidor TCP en un hilo, latencia por comando
+    (`latencia` segundos más hasta `variacion` al azar) y fallos inyectados
+    (`prob_error` responde con un error del equipo, `prob_corte` cierra la
+    conexión sin responder). `puerto=0` elige un puerto libre.
+    """
+
+    tipo = None
+
+    def __init__(self, host='127.0.0.1', puerto=0, usuario='admin', password='admin',
+                 latencia=0.0, variacion=0.0, prob_error=0.0, prob_corte=0.0, semilla=None):
+        self.host = host
+        self.puerto = puerto
+        self.usuario = usuario
+        self.password = password
+        self.latencia = latencia
+        self.variacion = variacion
+        self.prob_error = prob_error
+        self.prob_corte = prob_corte
+        self.comandos = Counter()
+        self._azar = random.Random(semilla)
+        self._lock = threading.RLock()
+        self._servidor = None
+        self._conexiones = set()
+
+    def iniciar(self):
+        """
+        Empieza a aceptar conexiones en segundo plano. Devuelve el puerto.
+        """
+        self._servidor = _Servidor((self.host, self.puerto), self)
+        self.puerto = self._servidor.server_address[1]
+        threading.Thread(
+            target=self._servidor.serve_forever, name=f'simulador-{self.tipo}-{self.puerto}', daemon=True,
+        ).start()
+        logging.info(f'Simulador {self.tipo} escuchando en {self.host}:{self.puerto}.')
+        return self.puerto
+
+    def detener(self):
+        if self._servidor is None:
+            return
+        self._servidor.shutdown()
+        self._servidor.server_close()
+        self._servidor = None
+        with self._lock:
+            conexiones = list(self._conexiones)
+        for sock in conexiones:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        self.iniciar()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.detener()
+
+    def _atender(self, sock):
+        with self._lock:
+            self._conexiones.add(sock)
+        try:
+            self._sesion(sock)
+        except (OSError, EOFError):
+            pass
+        finally:
+            with self._lock:
+                self._conexiones.discard(sock)
+
+    def _sesion(self, sock):
+        raise NotImplementedError
+
+    def _demorar(self):
+        demora = self.latencia + (self._azar.uniform(0, self.variacion) if self.variacion else 0)
+        if demora > 0:
+            time.sleep(demora)
+
+    def _sortear_fallo(self):
+        """
+        Devuelve 'corte', 'error' o None según las probabilidades configuradas.
+        """
+        sorteo = self._azar.random()
+        if sorteo < self.prob_corte:
+            return 'corte'
+        if sorteo < self.prob_corte + self.prob_error:
+            return 'error'
+        return None
+
+    def _contar(self, comando):
+        with self._lock:
+            self.comandos[comando] += 1
+
+
+# --- MikroTik (API de RouterOS) ---
+
+def _normalizar(valor):
+    # librouteros envía yes/no; RouterOS responde true/false.
+    return {'yes': 'true', 'no': 'false'}.get(str(valor), str(valor))
+
+
+def _condicion(fila, expresion):
+    # "?=name=x" y "?name=x" comparan; "?name" exige la propiedad y "?-name" su ausencia.
+    if expresion.startswith('='):
+        nombre, _, valor = expresion[1:].partition('=')
+        return _normalizar(fila.get(nombre)) == _normalizar(valor)
+    if expresion.startswith('-'):
+        return expresion[1:] not in fila
+    if expresion[:1] in '<>':
+        nombre, _, valor = expresion[1:].partition('=')
+        try:
+            actual, limite = float(fila.get(nombre)), float(valor)
+        except (TypeError, ValueError):
+            return False
+        return actual < limite if expresion[0] == '<' else actual > limite
+    nombre, signo, valor = expresion.partition('=')
+    if not signo:
+        return nombre in fila
+    return _normalizar(fila.get(nombre)) == _normalizar(valor)
+
+
+def _cumple(fila, consulta):
+    # Las consultas de RouterOS son una pila: cada "?cond" apila un
+    # resultado y "?#" combina los de arriba ("|" o, "&" y, "!" negación).
+    pila = []
+    for palabra in consulta:
+        if palabra.startswith('?#'):
+            for operador in palabra[2:]:
+                if operador == '!' and pila:
+                    pila.append(not pila.pop())
+                elif operador in '|&' and len(pila) >= 2:
+                    b, a = pila.pop(), pila.pop()
+                    pila.append(a or b if operador == '|' else a and b)
+        else:
+            pila.append(_condicion(fila, palabra[1:]))
+    return all(pila)
+
+
+def _respuesta(reply, datos=None, tag=None):
+    palabras = [reply, *(f'={clave}={valor}' for clave, valor in (datos or {}).items())]
+    if tag is not None:
+        palabras.append(f'.tag={tag}')
+    return palabras
+
+
+def _trap(mensaje, tag=None, categoria=None):
+    datos = {'message': mensaje} if categoria is None else {'category': categoria, 'message': mensaje}
+    return [_respuesta('!trap', datos, tag), _respuesta('!done', tag=tag)]
+
+
+class _ConexionApi:
+    """
+    Una conexión de cliente a la API. Las respuestas de comandos en curso
+    (`interval`, `listen`) se escriben desde otros hilos, por eso la
+    escritura lleva lock.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.archivo = sock.makefile('rb')
+        self.autenticado = False
+        self.en_curso = {}  # tag -> threading.Event para cancelarlo
+        self._lock = threading.Lock()
+
+    def _leer(self, cantidad):
+        datos = self.archivo.read(cantidad)
+        if len(datos) < cantidad:
+            raise EOFError
+        return datos
+
+    def leer_sentencia(self):
+        palabras = []
+        while True:
+            byte = self._leer(1)
+            if byte == b'\x00':
+                return palabras
+            byte += self._leer(determine_length(byte))
+            palabras.append(self._leer(decode_length(byte)).decode('utf-8', errors='replace'))
+
+    def enviar(self, *sentencias):
+        datos = b''.join(encode_sentence(*palabras, encoding='utf-8') for palabras in sentencias)
+        with self._lock:
+            self.sock.sendall(datos)
+
+    def cancelar_todo(self):
+        for evento in self.en_curso.values():
+            evento.set()
+        self.en_curso.clear()
+
+
+class SimuladorMikrotik(_Simulador):
+    """
+    MikroTik simulado. Atiende /login, print (con .proplist, consultas,
+    count-only e interval), add/set/remove y listen sobre /ppp/secret y
+    /ppp/active, /interface (con contadores de las sesiones PPPoE) y
+    /system/resource, /system/health y /system/identity.
+
+    Con `sesiones_automaticas` cada secret habilitado tiene su sesión en
+    /ppp/active: aparece al crearlo o habilitarlo y cae al deshabilitarlo o
+    borrarlo, como si los clientes se reconectaran al instante.
+    """
+
+    tipo = 'mikrotik'
+    RUTAS_EDITABLES = ('/ppp/secret', '/ppp/active')
+
+    def __init__(self, *args, identidad='MikroTik-sim', sesiones_automaticas=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.identidad = identidad
+        self.sesiones_automaticas = sesiones_automaticas
+        self._tablas = {ruta: {} for ruta in self.RUTAS_EDITABLES}
+        self._oyentes = {ruta: {} for ruta in self.RUTAS_EDITABLES}  # ruta -> {(conexion, tag): None}
+        self._ultimo_id = 0
+        self._inicio = time.time()
+
+    # Estado
+
+    def _nuevo_id(self):
+        self._ultimo_id += 1
+        return f'*{self._ultimo_id:X}'
+
+    def _notificar(self, ruta, fila):
+        fila = {clave: valor for clave, valor in fila.items() if not clave.startswith('_')}
+        for conexion, tag in list(self._oyentes[ruta]):
+            try:
+                conexion.enviar(_respuesta('!re', fila, tag))
+            except OSError:
+                self._oyentes[ruta].pop((conexion, tag), None)
+
+    def _guardar(self, ruta, fila):
+        self._tablas[ruta][fila['.id']] = fila
+        self._notificar(ruta, fila)
+
+    def _borrar(self, ruta, id_):
+        fila = self._tablas[ruta].pop(id_)
+        self._notificar(ruta, {'.id': id_, '.dead': 'true'})
+        return fila
+
+    def conectar_sesion(self, nombre, caller_id=None):
+        """
+        Abre la sesión PPPoE de `nombre` en /ppp/active (si no la tiene).
+        """
+        with self._lock:
+            if any(s['name'] == nombre for s in self._tablas['/ppp/active'].values()):
+                return
+            crc = zlib.crc32(nombre.encode())
+            self._guardar('/ppp/active', {
+                '.id': self._nuevo_id(),
+                'name': nombre,
+                'service': 'pppoe',
+                'caller-id': caller_id or ':'.join(f'{(crc >> s) & 0xFF:02X}' for s in (0, 8, 16, 24, 0, 8)),
+                'address': f'10.{(crc >> 16) & 0xFF}.{(crc >> 8) & 0xFF}.{crc & 0xFF or 1}',
+                'uptime': '0s',
+                'encoding': '',
+                'session-id': f'0x{crc & 0xFFFFFF:X}',
+                'radius': 'false',
+                '_inicio': time.time(),
+            })
+
+    def desconectar_sesion(self, nombre):
+        with self._lock:
+            for id_, sesion in list(self._tablas['/ppp/active'].items()):
+                if sesion['name'] == nombre:
+                    self._borrar('/ppp/active', id_)
+
+    def _sincronizar_sesion(self, secret):
+        if not self.sesiones_automaticas:
+            return
+        if secret is not None and secret.get('disabled') != 'true':
+            self.conectar_sesion(secret['name'])
+        elif secret is not None:
+            self.desconectar_sesion(secret['name'])
+
+    def _filas(self, ruta):
+        # Filas visibles de una ruta, con los campos calculados al momento.
+        ahora = time.time()
+        if ruta == '/ppp/secret':
+            return [dict(fila) for fila in self._tablas[ruta].values()]
+        if ruta == '/ppp/active':
+            return [
+                {**{k: v for k, v in fila.items() if not k.startswith('_')},
+                 'uptime': f'{int(ahora - fila["_inicio"])}s'}
+                for fila in self._tablas[ruta].values()
+            ]
+        if ruta == '/interface':
+            filas = [{'.id': '*1', 'name': 'ether1', 'type': 'ether', 'running': 'true',
+                      'rx-byte': '0', 'tx-byte': '0', 'rx-packet': '0', 'tx-packet': '0'}]
+            for fila in self._tablas['/ppp/active'].values():
+                # Tráfico constante por cliente (entre 10 y 500 kB/s de bajada).
+                tasa = 10000 + zlib.crc32(fila['name'].encode()) % 490000
+                segundos = ahora - fila['_inicio']
+                filas.append({
+                    '.id': f'*{0x100000 + int(fila[".id"][1:], 16):X}',
+                    'name': f'<pppoe-{fila["name"]}>',
+                    'type': 'pppoe-in',
+                    'running': 'true',
+                    'rx-byte': str(int(segundos * tasa / 8)),
+                    'tx-byte': str(int(segundos * tasa)),
+                    'rx-packet': str(int(segundos * tasa / 8 / 600)),
+                    'tx-packet': str(int(segundos * tasa / 1200)),
+                })
+            return filas
+        if ruta == '/system/resource':
+            return [{
+                'uptime': f'{int(ahora - self._inicio)}s',
+                'version': '7.14 (stable)',
+                'free-memory': str(900_000_000 - 100_000 * len(self._tablas['/ppp/active'])),
+                'total-memory': '1073741824',
+                'cpu-load': str(min(100, 2 + len(self._tablas['/ppp/active']) // 50 + self._azar.randint(0, 5))),
+                'board-name': 'CCR-sim',
+            }]
+        if ruta == '/system/health':
+            return [
+                {'.id': '*1', 'name': 'temperature', 'value': str(40 + self._azar.randint(0, 5)), 'type': 'C'},
+                {'.id': '*2', 'name': 'voltage', 'value': '24.1', 'type': 'V'},
+            ]
+        if ruta == '/system/identity':
+            return [{'name': self.identidad}]
+        return None
+
+    # Protocolo
+
+    def _sesion(self, sock):
+        conexion = _ConexionApi(sock)
+        try:
+            while True:
+                palabras = conexion.leer_sentencia()
+                if not palabras:
+                    continue
+                if not self._procesar(conexion, palabras):
+                    return
+        finally:
+            conexion.cancelar_todo()
+            with self._lock:
+                for oyentes in self._oyentes.values():
+                    for clave in [clave for clave in oyentes if clave[0] is conexion]:
+                        del oyentes[clave]
+
+    def _procesar(self, conexion, palabras):
+        """
+        Atiende una sentencia. Devuelve False si hay que cerrar la conexión.
+        """
+        comando, *resto = palabras
+        tag = None
+        atributos = {}
+        consulta = []
+        for palabra in resto:
+            if palabra.startswith('.tag='):
+                tag = palabra[len('.tag='):]
+            elif palabra.startswith('='):
+                clave, _, valor = palabra[1:].partition('=')
+                atributos[clave] = valor
+            elif palabra.startswith('?'):
+                consulta.append(palabra)
+        self._contar(comando)
+
+        if comando == '/login':
+            if atributos.get('name') == self.usuario and atributos.get('password') == self.password:
+                conexion.autenticado = True
+                conexion.enviar(_respuesta('!done', tag=tag))
+            else:
+                conexion.enviar(*_trap('invalid user name or password (6)', tag))
+            return True
+        if not conexion.autenticado:
+            conexion.enviar(_respuesta('!fatal') + ['not logged in'])
+            return False
+        if comando == '/quit':
+            conexion.enviar(['!fatal', 'session terminated on request'])
+            return False
+        if comando == '/cancel':
+            evento = conexion.en_curso.pop(atributos.get('tag'), None)
+            if evento is not None:
+                evento.set()
+                self._dejar_de_escuchar(conexion, atributos['tag'])
+                conexion.enviar(*_trap('interrupted', atributos['tag'], categoria=2))
+            conexion.enviar(_respuesta('!done', tag=tag))
+            return True
+
+        ruta, _, accion = comando.rpartition('/')
+        en_curso = accion == 'listen' or (accion == 'print' and 'interval' in atributos)
+        if not en_curso:
+            self._demorar()
+            fallo = self._sortear_fallo()
+            if fallo == 'corte':
+                return False
+            if fallo == 'error':
+                conexion.enviar(*_trap('failure: simulated failure', tag))
+                return True
+
+        with self._lock:
+            respuesta = self._ejecutar(conexion, ruta, accion, atributos, consulta, tag)
+        if respuesta:
+            conexion.enviar(*respuesta)
+        return True
+
+    def _ejecutar(self, conexion, ruta, accion, atributos, consulta, tag):
+        filas = self._filas(ruta)
+        if filas is None:
+            return _trap('no such command prefix', tag, categoria=0)
+
+        if accion == 'print':
+            filas = [fila for fila in filas if _cumple(fila, consulta)]
+            if 'count-only' in atributos:
+                return [_respuesta('!done', {'ret': len(filas)}, tag)]
+            campos = [c for c in atributos.get('.proplist', '').split(',') if c]
+            if campos:
+                filas = [{c: fila[c] for c in campos if c in fila} for fila in filas]
+            if 'interval' in atributos:
+                self._periodico(conexion, ruta, atributos, consulta, tag)
+                return None
+            return [*(_respuesta('!re', fila, tag) for fila in filas), _respuesta('!done', tag=tag)]
+
+        if accion == 'listen':
+            if ruta not in self._oyentes:
+                return _trap('no such command', tag, categoria=0)
+            self._oyentes[ruta][conexion, tag] = None
+            conexion.en_curso[tag] = threading.Event()
+            return None
+
+        if ruta not in self._tablas or accion not in ('add', 'set', 'remove'):
+            return _trap('no such command', tag, categoria=0)
+        tabla = self._tablas[ruta]
+
+        if accion == 'add':
+            if ruta != '/ppp/secret':
+                return _trap('failure: cannot add', tag)
+            if not atributos.get('name'):
+                return _trap('failure: name must be set', tag)
+            if any(fila['name'] == atributos['name'] for fila in tabla.values()):
+                return _trap('failure: secret with the same name already exists', tag)
+            fila = {'.id': self._nuevo_id(), 'service': 'any', 'profile': 'default', 'disabled': 'false'}
+            fila.update({clave: _normalizar(valor) for clave, valor in atributos.items()})
+            self._guardar(ruta, fila)
+            self._sincronizar_sesion(fila)
+            return [_respuesta('!done', {'ret': fila['.id']}, tag)]
+
+        ids = [id_ for id_ in atributos.pop('.id', '').split(',') if id_]
+        if not ids or any(id_ not in tabla for id_ in ids):
+            return _trap('no such item', tag)
+        for id_ in ids:
+            if accion == 'remove':
+                fila = self._borrar(ruta, id_)
+                if ruta == '/ppp/secret' and self.sesiones_automaticas:
+                    self.desconectar_sesion(fila['name'])
+            else:
+                fila = {**tabla[id_], **{clave: _normalizar(valor) for clave, valor in atributos.items()}}
+                self._guardar(ruta, fila)
+                if ruta == '/ppp/secret':
+                    self._sincronizar_sesion(fila)
+        return [_respuesta('!done', tag=tag)]
+
+    def _dejar_de_escuchar(self, conexion, tag):
+        with self._lock:
+            for oyentes in self._oyentes.values():
+                oyentes.pop((conexion, tag), None)
+
+    def _periodico(self, conexion, ruta, atributos, consulta, tag):
+        # "print =interval=N": repite las filas cada N segundos hasta /cancel.
+        intervalo = max(float(atributos['interval']), 0.05)
+        campos = [c for c in atributos.get('.proplist', '').split(',') if c]
+        cancelado = threading.Event()
+        conexion.en_curso[tag] = cancelado
+
+        def repetir():
+            while not cancelado.is_set():
+                with self._lock:
+                    filas = [fila for fila in self._filas(ruta) if _cumple(fila, consulta)]
+                if campos:
+                    filas = [{c: fila[c] for c in campos if c in fila} for fila in filas]
+                try:
+                    conexion.enviar(*(_respuesta('!re', fila, tag) for fila in filas))
+                except OSError:
+                    return
+                cancelado.wait(intervalo)
+
+        threading.Thread(target=repetir, name=f'simulador-mikrotik-{tag}', daemon=True).start()
+
+
+# --- OLT ZTE (CLI por Telnet) ---
+
+PUERTO_PON = re.compile(r'(\d+/\d+/\d+)')
+PRECONFIGURAR = re.compile(r'^onu pre-config-mode serial-number (\S+)$')
+SERVICIO = re.compile(r'^(no )?onu service (\S+)$')
+BORRAR = re.compile(r'^no onu (\S+)$')
+CAMBIAR_PUERTO = re.compile(r'^pon port change onu (\S+) to (\S+)$')
+ESTADO_PUERTO = re.compile(r'^show gpon onu state gpon-olt_(\d+/\d+/\d+)$')
+POTENCIA_PUERTO = re.compile(r'^show pon power onu-rx gpon-olt_(\d+/\d+/\d+)$')
+BUSCAR_SN = re.compile(r'^show gpon onu by sn (\S+)$')
+
+ENTRADA_INVALIDA = "%Error 20200: Invalid input detected at '^' marker."
+ONUS_POR_PUERTO = 128
+
+
+class SimuladorOlt(_Simulador):
+    """
+    OLT ZTE simulada. Reproduce el login (Username:/Password:), el prompt
+    `HOST#` con sus modos `(config)` y `(config-if)`, y los comandos que
+    usa gestion_red: preconfigurar, suspender, reactivar, borrar y cambiar
+    de puerto una ONU, y las consultas de baseinfo, estado y potencia por
+    puerto PON. Los errores se devuelven como líneas `%Error`.
+
+    `max_sesiones` limita las sesiones VTY simultáneas, como la OLT real.
+    """
+
+    tipo = 'olt'
+
+    def __init__(self, *args, nombre='ZXAN', max_sesiones=16, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.nombre = nombre
+        self.max_sesiones = max_sesiones
+        self.sesiones = 0
+        self.onus = {}  # sn -> {'puerto', 'indice', 'servicio'}
+
+    def agregar_onu(self, onu_sn, puerto='1/1/1', servicio=True):
+        with self._lock:
+            return self._agregar(onu_sn, puerto, servicio)
+
+    def _agregar(self, onu_sn, puerto, servicio=True):
+        ocupados = {onu['indice'] for onu in self.onus.values() if onu['puerto'] == puerto}
+        libres = [i for i in range(1, ONUS_POR_PUERTO + 1) if i not in ocupados]
+        if not libres:
+            return False
+        self.onus[onu_sn] = {'puerto': puerto, 'indice': libres[0], 'servicio': servicio}
+        return True
+
+    @staticmethod
+    def potencia(onu_sn):
+        # Potencia fija por ONU, entre -15 y -29 dBm: alguna queda fuera de rango.
+        return -15 - (zlib.crc32(onu_sn.encode()) % 1400) / 100
+
+    def _sesion(self, sock):
+        with self._lock:
+            if self.max_sesiones and self.sesiones >= self.max_sesiones:
+                sock.sendall(b'\r\n%Error 20017: The number of VTY users has reached the limit.\r\n')
+                return
+            self.sesiones += 1
+        try:
+            self._conversar(sock, _LineasTelnet(sock))
+        finally:
+            with self._lock:
+                self.sesiones -= 1
+
+    def _conversar(self, sock, lineas):
+        sock.sendall(bytes((IAC, WILL, ECHO, IAC, WILL, SGA)) + b'\r\n\r\nUsername:')
+        for _ in range(3):
+            usuario = lineas.leer()
+            sock.sendall(b'\r\nPassword:')
+            password = lineas.leer()
+            if usuario == self.usuario and password == self.password:
+                break
+            sock.sendall(b'\r\n%Error 20203: Invalid username or password.\r\n\r\nUsername:')
+        else:
+            return
+
+        estado = {'modo': '', 'puerto': None}
+        sock.sendall(f'\r\n\r\n{self.nombre}#'.encode('ascii'))
+        while True:
+            comando = lineas.leer().strip()
+            if comando in ('quit', 'logout') or (comando == 'exit' and not estado['modo']):
+                return
+            salida = ''
+            if comando:
+                self._contar(comando.split(' ', 1)[0])
+                self._demorar()
+                fallo = self._sortear_fallo()
+                if fallo == 'corte':
+                    return
+                if fallo == 'error':
+                    salida = '%Error 20500: Simulated failure.'
+                else:
+                    with self._lock:
+                        salida = self._ejecutar(comando, estado)
+            respuesta = comando + '\r\n' + (salida.replace('\n', '\r\n') + '\r\n' if salida else '')
+            sock.sendall(f'{respuesta}{self.nombre}{estado["modo"]}#'.encode('ascii', errors='replace'))
+
+    def _ejecutar(self, comando, estado):
+        modo = estado['modo']
+        if comando.startswith('terminal length'):
+            return ''
+        if comando == 'configure terminal':
+            estado['modo'] = '(config)'
+            return 'Enter configuration commands, one per line.  End with CTRL/Z.'
+        if comando == 'end':
+            estado['modo'] = ''
+            return ''
+        if comando == 'exit':
+            estado['modo'] = '(config)' if modo == '(config-if)' else ''
+            return ''
+        if comando == 'show gpon onu baseinfo':
+            return self._baseinfo()
+        match = ESTADO_PUERTO.match(comando)
+        if match:
+            return self._estados(match.group(1))
+        match = POTENCIA_PUERTO.match(comando)
+        if match:
+            return self._potencias(match.group(1))
+        match = BUSCAR_SN.match(comando)
+        if match:
+            onu = self.onus.get(match.group(1))
+            if onu is None:
+                return '%Code 32310-GPONSRV : No related information to show.'
+            return f'SearchResult\n-----------------\ngpon-onu_{onu["puerto"]}:{onu["indice"]}'
+
+        if modo == '(config)' and comando.startswith('interface '):
+            match = PUERTO_PON.search(comando)
+            if not match:
+                return ENTRADA_INVALIDA
+            estado['modo'], estado['puerto'] = '(config-if)', match.group(1)
+            return ''
+        match = PRECONFIGURAR.match(comando)
+        if match and modo == '(config-if)':
+            if match.group(1) in self.onus:
+                return '%Error 20207: The ONU already exists.'
+            if not self._agregar(match.group(1), estado['puerto']):
+                return '%Error 20208: No free ONU index on this port.'
+            return ''
+        if modo != '(config)':
+            return ENTRADA_INVALIDA
+        match = SERVICIO.match(comando)
+        if match:
+            onu = self.onus.get(match.group(2))
+            if onu is None:
+                return '%Error 20209: The ONU does not exist.'
+            onu['servicio'] = not match.group(1)
+            return ''
+        match = BORRAR.match(comando)
+        if match:
+            if self.onus.pop(match.group(1), None) is None:
+                return '%Error 20209: The ONU does not exist.'
+            return ''
+        match = CAMBIAR_PUERTO.match(comando)
+        if match:
+            onu_sn, destino = match.groups()
+            puerto = PUERTO_PON.search(destino)
+            if onu_sn not in self.onus:
+                return '%Error 20209: The ONU does not exist.'
+            if not puerto:
+                return ENTRADA_INVALIDA
+            anterior = self.onus.pop(onu_sn)
+            if not self._agregar(onu_sn, puerto.group(1), anterior['servicio']):
+                self.onus[onu_sn] = anterior
+                return '%Error 20208: No free ONU index on this port.'
+            return ''
+        return ENTRADA_INVALIDA
+
+    def _ordenadas(self, puerto=None):
+        return sorted(
+            ((onu['puerto'], onu['indice'], sn, onu) for sn, onu in self.onus.items()
+             if puerto is None or onu['puerto'] == puerto),
+        )
+
+    def _baseinfo(self):
+        lineas = ['OnuIndex                 Type          Mode   AuthInfo          State',
+                  '-------------------------------------------------------------------------']
+        lineas += [
+            f'gpon-onu_{puerto}:{indice:<10} ZTE-F601      sn     SN:{sn}  {"ready" if onu["servicio"] else "disable"}'
+            for puerto, indice, sn, onu in self._ordenadas()
+        ]
+        return '\n'.join(lineas)
+
+    def _estados(self, puerto):
+        lineas = ['OnuIndex   Admin State  OMCC State  Phase State  Channel',
+                  '--------------------------------------------------------']
+        lineas += [
+            f'{puerto}:{indice:<6} {"enable" if onu["servicio"] else "disable":<12} '
+            f'{"enable" if onu["servicio"] else "disable":<11} {"working" if onu["servicio"] else "offline":<12} 1(GPON)'
+            for puerto, indice, sn, onu in self._ordenadas(puerto)
+        ]
+        return '\n'.join(lineas)
+
+    def _potencias(self, puerto):
+        lineas = ['Onu                  Rx power', '--------------------------------']
+        lineas += [
+            f'gpon-onu_{puerto}:{indice:<8} {f"{self.potencia(sn):.3f}(dbm)" if onu["servicio"] else "N/A"}'
+            for puerto, indice, sn, onu in self._ordenadas(puerto)
+        ]
+        return '\n'.join(lineas)
+
+
+class _LineasTelnet:
+    """
+    Lee líneas de un cliente Telnet descartando la negociación de opciones
+    (IAC ...) y los retornos de carro.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = bytearray()
+
+    def leer(self):
+        while b'\n' not in self.buffer:
+            datos = self.sock.recv(4096)
+            if not datos:
+                raise EOFError
+            self.buffer += datos
+        linea, _, resto = bytes(self.buffer).partition(b'\n')
+        self.buffer = bytearray(resto)
+        return self._limpiar(linea).decode('ascii', errors='replace').rstrip('\r')
+
+    @staticmethod
+    def _limpiar(datos):
+        limpio = bytearray()
+        i = 0
+        while i < len(datos):
+            if datos[i] != IAC:
+                limpio.append(datos[i])
+                i += 1
+            elif i + 1 < len(datos) and datos[i + 1] == SB:
+                fin = datos.find(bytes((IAC, SE)), i)
+                i = len(datos) if fin == -1 else fin + 2
+            else:
+                i += 3
+        return bytes(limpio)
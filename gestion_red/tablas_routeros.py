@@ -0,0 +1,179 @@
+# gestion_red/tablas_routeros.py
+# Copias en memoria de tablas de RouterOS (p. ej. /ppp/active o
+# /ppp/secret) que un hilo por router mantiene al día con `listen`.
+
+import logging
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .connect import connect_mikrotik_dedicada
+from .routeros import seguir_tabla
+
+
+class TablaSeguida:
+    """
+    Copia en memoria de una tabla de RouterOS, por .id y por nombre. Se
+    carga con un snapshot y se mantiene al día con los eventos de `listen`
+    (ver seguir()).
+
+    Las subclases fijan RUTA, CAMPOS (proplist) y cómo se traduce una fila:
+    `_entrada(fila)` devuelve la entrada (un dict con 'nombre') y
+    `_combinar(anterior, fila)` aplica un evento parcial, que solo trae los
+    campos que cambiaron.
+    """
+    RUTA = None
+    CAMPOS = ()
+    DESCRIPCION = 'filas'  # para los logs
+    HILO = 'tabla'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_id = {}
+        self._por_nombre = {}
+        self.sincronizado = False
+        self.actualizado = None
+
+    def cargar(self, filas):
+        por_id = {fila['.id']: self._entrada(fila) for fila in filas if '.id' in fila}
+        with self._lock:
+            self._por_id = por_id
+            self._por_nombre = {e['nombre']: e for e in por_id.values()}
+            self.sincronizado = True
+            self.actualizado = time.time()
+
+    def aplicar(self, fila):
+        with self._lock:
+            anterior = self._por_id.pop(fila.get('.id'), None)
+            if anterior is not None:
+                self._por_nombre.pop(anterior['nombre'], None)
+            entrada = None
+            if fila.get('.dead'):
+                pass
+            elif 'name' in fila:
+                entrada = self._entrada(fila)
+            elif anterior is not None:
+                entrada = self._combinar(anterior, fila)
+            if entrada is not None:
+                self._por_id[fila['.id']] = entrada
+                self._por_nombre[entrada['nombre']] = entrada
+            self.actualizado = time.time()
+
+    def invalidar(self):
+        with self._lock:
+            self.sincronizado = False
+
+    def __len__(self):
+        return len(self._por_id)
+
+    @staticmethod
+    def _entrada(fila):
+        raise NotImplementedError
+
+    def _combinar(self, anterior, fila):
+        raise NotImplementedError
+
+
+_tablas = {}
+_hilos_pid = {}
+_hilos_lock = threading.Lock()
+
+
+def _mantener_viva(sock):
+    """
+    Sin eventos la lectura de `listen` espera hasta la próxima recarga
+    completa; para no tardar tanto en notar un router caído se activa el
+    keepalive de TCP, que lo sondea tras PPP_KEEPALIVE segundos en silencio.
+    """
+    sock.settimeout(getattr(settings, 'PPP_RESINCRONIZACION', 3600))
+    keepalive = getattr(settings, 'PPP_KEEPALIVE', 60)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for opcion, valor in (('TCP_KEEPIDLE', keepalive), ('TCP_KEEPINTVL', max(keepalive // 4, 1)), ('TCP_KEEPCNT', 4)):
+        if hasattr(socket, opcion):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, opcion), valor)
+
+
+def _releer(router):
+    """
+    Vuelve a leer el router de la base de datos antes de cada conexión, para
+    que el hilo siga al equipo si cambian su host, puerto o credenciales.
+    Devuelve None si el router se borró.
+    """
+    try:
+        return type(router)._default_manager.filter(pk=router.pk).first()
+    finally:
+        # El hilo vive lo que el proceso: no se queda con una conexión abierta.
+        connection.close()
+
+
+def _bucle(tabla, router, clave):
+    reintento = getattr(settings, 'PPP_INDICE_REINTENTO', 5)
+    resincronizacion = getattr(settings, 'PPP_RESINCRONIZACION', 3600)
+    while True:
+        api = None
+        recargar = False
+        nombre = router or 'MikroTik'
+        try:
+            if router is not None:
+                actual = _releer(router)
+                if actual is None:
+                    logging.info(f'Router {nombre} borrado: se deja de seguir {tabla.RUTA}.')
+                    tabla.invalidar()
+                    with _hilos_lock:
+                        _tablas.pop(clave, None)
+                        _hilos_pid.pop(clave, None)
+                    return
+                router = actual
+            api = connect_mikrotik_dedicada(dispositivo=router)
+            _mantener_viva(api.protocol.transport.sock)
+            limite = time.monotonic() + resincronizacion
+            for tipo, datos in seguir_tabla(api, tabla.RUTA, proplist=tabla.CAMPOS):
+                if tipo == 'snapshot':
+                    tabla.cargar(datos)
+                    logging.info(f'{tabla.RUTA} de {nombre} cargada: {len(tabla)} {tabla.DESCRIPCION}.')
+                else:
+                    tabla.aplicar(datos)
+                if time.monotonic() >= limite:
+                    recargar = True
+                    break
+        except TimeoutError:
+            # Nada cambió durante PPP_RESINCRONIZACION segundos.
+            recargar = True
+        except Exception as e:
+            logging.warning(f'Escucha de {tabla.RUTA} de {nombre} interrumpida: {e}')
+        finally:
+            if api is not None:
+                api.close()
+        if recargar:
+            # Recarga completa por si se perdió algún evento; mientras tanto
+            # la copia sigue sirviendo y el snapshot nuevo la reemplaza.
+            continue
+        tabla.invalidar()
+        time.sleep(reintento)
+
+
+def seguir(clase, router=None):
+    """
+    Devuelve la copia de la tabla `clase` (una subclase de TablaSeguida) de
+    `router` (None: el MikroTik de settings), arrancando la primera vez en
+    el proceso el hilo que la mantiene al día. El hilo relee el router en
+    cada reconexión y termina si se borra.
+    """
+    clave = (clase, router.pk if router is not None else None)
+    with _hilos_lock:
+        tabla = _tablas.get(clave)
+        if tabla is None:
+            tabla = _tablas[clave] = clase()
+        if _hilos_pid.get(clave) != os.getpid():
+            threading.Thread(
+                target=_bucle,
+                args=(tabla, router, clave),
+                name=f'{clase.HILO}-{clave[1] or "default"}',
+                daemon=True,
+            ).start()
+            _hilos_pid[clave] = os.getpid()
+        return tabla
@@ -0,0 +1,213 @@
+# gestion_red/telnet.py
+# Cliente Telnet mínimo para la CLI de las OLT, en sustitución de telnetlib
+# (eliminado en Python 3.13). La negociación de opciones vive en
+# ProtocoloTelnet, que no hace E/S, y la comparten el cliente síncrono
+# (sockets) y el asíncrono (asyncio).
+
+import asyncio
+import re
+import socket
+import time
+
+IAC = 255
+DONT = 254
+DO = 253
+WONT = 252
+WILL = 251
+SB = 250
+SE = 240
+
+ECHO = 1
+SGA = 3  # suppress go-ahead
+
+# Opciones que aceptamos si el servidor las ofrece; el resto se rechaza.
+OPCIONES_ACEPTADAS = {ECHO, SGA}
+
+_DATOS, _IAC, _OPCION, _SUB, _SUB_IAC = range(5)
+
+
+class ProtocoloTelnet:
+    """
+    Máquina de estados Telnet sin E/S: `recibir()` toma los bytes llegados
+    del socket y devuelve solo los datos de la aplicación; las respuestas a
+    la negociación de opciones quedan en `pendiente` para que el cliente las
+    envíe. Las secuencias partidas entre dos lecturas se completan en la
+    siguiente.
+    """
+
+    def __init__(self):
+        self._estado = _DATOS
+        self._verbo = None
+        self.pendiente = bytearray()
+
+    def recibir(self, datos):
+        salida = bytearray()
+        for byte in datos:
+            if self._estado == _DATOS:
+                if byte == IAC:
+                    self._estado = _IAC
+                elif byte != 0:
+                    salida.append(byte)
+            elif self._estado == _IAC:
+                if byte == IAC:
+                    salida.append(IAC)
+                    self._estado = _DATOS
+                elif byte in (DO, DONT, WILL, WONT):
+                    self._verbo = byte
+                    self._estado = _OPCION
+                elif byte == SB:
+                    self._estado = _SUB
+                else:
+                    # Comandos de dos bytes (NOP, GA...): se ignoran.
+                    self._estado = _DATOS
+            elif self._estado == _OPCION:
+                self._responder(self._verbo, byte)
+                self._estado = _DATOS
+            elif self._estado == _SUB:
+                if byte == IAC:
+                    self._estado = _SUB_IAC
+            elif self._estado == _SUB_IAC:
+                self._estado = _DATOS if byte == SE else _SUB
+        return bytes(salida)
+
+    def _responder(self, verbo, opcion):
+        if verbo == DO:
+            self.pendiente += bytes((IAC, WILL if opcion == SGA else WONT, opcion))
+        elif verbo == WILL:
+            self.pendiente += bytes((IAC, DO if opcion in OPCIONES_ACEPTADAS else DONT, opcion))
+
+    def tomar_pendiente(self):
+        pendiente, self.pendiente = bytes(self.pendiente), bytearray()
+        return pendiente
+
+    @staticmethod
+    def escapar(datos):
+        return datos.replace(bytes((IAC,)), bytes((IAC, IAC)))
+
+
+def _buscar(buffer, patrones):
+    # Devuelve (indice, match) del patrón que aparece antes en el buffer; a
+    # igual posición gana el primero de la lista.
+    encontrado = (-1, None)
+    for indice, patron in enumerate(patrones):
+        if isinstance(patron, bytes):
+            patron = re.compile(re.escape(patron))
+        match = patron.search(buffer)
+        if match and (encontrado[1] is None or match.start() < encontrado[1].start()):
+            encontrado = (indice, match)
+    return encontrado
+
+
+class ClienteTelnet:
+    """
+    Cliente Telnet síncrono con la misma interfaz que usábamos de telnetlib:
+    `write`, `read_until`, `expect` y `close`.
+    """
+
+    def __init__(self, host, puerto=23, timeout=10):
+        self._socket = socket.create_connection((host, puerto), timeout)
+        self._protocolo = ProtocoloTelnet()
+        self._buffer = b''
+
+    def write(self, datos):
+        self._socket.sendall(ProtocoloTelnet.escapar(datos))
+
+    def _leer(self, limite):
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            return False
+        self._socket.settimeout(restante)
+        try:
+            datos = self._socket.recv(4096)
+        except socket.timeout:
+            return False
+        if not datos:
+            raise EOFError("La conexión Telnet se cerró.")
+        self._buffer += self._protocolo.recibir(datos)
+        respuesta = self._protocolo.tomar_pendiente()
+        if respuesta:
+            self._socket.sendall(respuesta)
+        return True
+
+    def expect(self, patrones, timeout=None):
+        """
+        Lee hasta que aparezca alguno de los `patrones` (regex compiladas o
+        bytes). Devuelve `(indice, match, datos)` con los datos hasta el final
+        del match, o `(-1, None, datos_leidos)` si se agota el tiempo.
+        """
+        limite = time.monotonic() + (timeout if timeout is not None else 3600)
+        while True:
+            indice, match = _buscar(self._buffer, patrones)
+            if match:
+                datos, self._buffer = self._buffer[:match.end()], self._buffer[match.end():]
+                return indice, match, datos
+            if not self._leer(limite):
+                datos, self._buffer = self._buffer, b''
+                return -1, None, datos
+
+    def read_until(self, texto, timeout=None):
+        return self.expect([texto], timeout)[2]
+
+    def close(self):
+        self._socket.close()
+
+
+class ClienteTelnetAsync:
+    """
+    Cliente Telnet sobre asyncio con la misma interfaz que ClienteTelnet,
+    pero con corrutinas. Se abre con `await ClienteTelnetAsync.abrir(...)`.
+    """
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._protocolo = ProtocoloTelnet()
+        self._buffer = b''
+
+    @classmethod
+    async def abrir(cls, host, puerto=23, timeout=10):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, puerto), timeout)
+        return cls(reader, writer)
+
+    async def write(self, datos):
+        self._writer.write(ProtocoloTelnet.escapar(datos))
+        await self._writer.drain()
+
+    async def _leer(self):
+        datos = await self._reader.read(4096)
+        if not datos:
+            raise EOFError("La conexión Telnet se cerró.")
+        self._buffer += self._protocolo.recibir(datos)
+        respuesta = self._protocolo.tomar_pendiente()
+        if respuesta:
+            self._writer.write(respuesta)
+            await self._writer.drain()
+
+    async def expect(self, patrones, timeout=None):
+        """
+        Igual que ClienteTelnet.expect().
+        """
+        limite = time.monotonic() + (timeout if timeout is not None else 3600)
+        while True:
+            indice, match = _buscar(self._buffer, patrones)
+            if match:
+                datos, self._buffer = self._buffer[:match.end()], self._buffer[match.end():]
+                return indice, match, datos
+            restante = limite - time.monotonic()
+            try:
+                if restante <= 0:
+                    raise asyncio.TimeoutError
+                await asyncio.wait_for(self._leer(), restante)
+            except asyncio.TimeoutError:
+                datos, self._buffer = self._buffer, b''
+                return -1, None, datos
+
+    async def read_until(self, texto, timeout=None):
+        return (await self.expect([texto], timeout))[2]
+
+    async def close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except OSError:
+            pass
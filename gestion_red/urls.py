@@ -18,9 +18,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from api.views import metricas_api
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('clientes.urls')),
     path('accounts/', include('django.contrib.auth.urls')), # <-- Agrega esta línea
     path('api/', include('api.urls')),
+    path('metrics', metricas_api, name='metricas'),
 ]
\ No newline at end of file